@@ -1,11 +1,15 @@
 ﻿from datetime import datetime, timedelta
 import uuid
 import re
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from app import schemas
 from app.schemas.user import UserCreate, UserUpdate, UserInDB
-from app.database import get_sessions_collection, get_photos_collection, get_users_collection, get_user_uploads_collection
+from app.database import (
+    get_sessions_collection, get_photos_collection, get_users_collection, get_user_uploads_collection,
+    get_upload_tickets_collection
+)
 from bson import ObjectId
+from pymongo.errors import BulkWriteError
 
 def sanitize_session_id(session_id: str) -> str:
     """Sanitize session ID to prevent NoSQL injection"""
@@ -64,12 +68,12 @@ async def create_session(session: schemas.SessionCreate):
     
     return session_dict
 
-async def increment_photo_count(session_id: str):
+async def increment_photo_count(session_id: str, amount: int = 1):
     sessions_collection = get_sessions_collection()
-    # Use $inc operator to increment photo_count by 1
+    # Use $inc operator to increment photo_count
     await sessions_collection.update_one(
         {"session_id": session_id},
-        {"$inc": {"photo_count": 1}}
+        {"$inc": {"photo_count": amount}}
     )
     return await get_session(session_id)
 
@@ -93,6 +97,64 @@ async def create_photo(photo: schemas.PhotoCreate):
     
     return photo_dict
 
+async def create_photos(photos: List[schemas.PhotoCreate]) -> Tuple[List[dict], List[schemas.PhotoCreate]]:
+    """Insert a batch of photos in one round trip
+
+    Returns the created records and the photos rejected because the same
+    content was stored in the session concurrently (unique content_hash).
+    """
+    if not photos:
+        return [], []
+    photos_collection = get_photos_collection()
+    
+    uploaded_at = datetime.utcnow()
+    photo_dicts = [dict(photo.dict(), uploaded_at=uploaded_at) for photo in photos]
+    
+    rejected = set()
+    try:
+        await photos_collection.insert_many(photo_dicts, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            if error.get("code") != 11000:
+                raise
+            rejected.add(error["index"])
+    
+    created = []
+    for index, photo_dict in enumerate(photo_dicts):
+        if index not in rejected:
+            photo_dict["id"] = str(photo_dict["_id"])
+            created.append(photo_dict)
+    return created, [photos[index] for index in sorted(rejected)]
+
+async def get_photos_by_content_hashes(session_id: str, content_hashes: List[str]) -> Dict[str, dict]:
+    """Photos in a session with any of the given content hashes, keyed by hash"""
+    sanitized_id = sanitize_session_id(session_id)
+    photos_collection = get_photos_collection()
+    cursor = photos_collection.find({"session_id": sanitized_id, "content_hash": {"$in": content_hashes}})
+    photos = {}
+    for photo in await cursor.to_list(length=len(content_hashes)):
+        photo["id"] = str(photo["_id"])
+        photos[photo["content_hash"]] = photo
+    return photos
+
+async def get_photo_by_content_hash(session_id: str, content_hash: str):
+    """Find a photo in a session with identical content (see create_photo)"""
+    sanitized_id = sanitize_session_id(session_id)
+    photos_collection = get_photos_collection()
+    photo = await photos_collection.find_one({"session_id": sanitized_id, "content_hash": content_hash})
+    if photo:
+        photo["id"] = str(photo["_id"])
+    return photo
+
+async def get_photo_by_filename(session_id: str, filename: str):
+    """Find a photo in a session by its storage public id"""
+    sanitized_id = sanitize_session_id(session_id)
+    photos_collection = get_photos_collection()
+    photo = await photos_collection.find_one({"session_id": sanitized_id, "filename": filename})
+    if photo:
+        photo["id"] = str(photo["_id"])
+    return photo
+
 async def get_photos_by_session(session_id: str):
     sanitized_id = sanitize_session_id(session_id)
     photos_collection = get_photos_collection()
@@ -246,8 +308,8 @@ async def get_user_upload_stats(session_id: str, user_identifier: str) -> Option
     return user_upload
 
 
-async def create_or_update_user_upload(session_id: str, user_identifier: str, user_ip: str = None, user_agent: str = None) -> dict:
-    """Create new user upload record or increment existing one"""
+async def create_or_update_user_upload(session_id: str, user_identifier: str, user_ip: str = None, user_agent: str = None, count: int = 1) -> dict:
+    """Create new user upload record or increment existing one by count"""
     user_uploads_collection = get_user_uploads_collection()
     
     # Try to find existing record
@@ -261,7 +323,7 @@ async def create_or_update_user_upload(session_id: str, user_identifier: str, us
         await user_uploads_collection.update_one(
             {"_id": existing_upload["_id"]},
             {
-                "$inc": {"upload_count": 1},
+                "$inc": {"upload_count": count},
                 "$set": {"last_upload_at": datetime.utcnow()}
             }
         )
@@ -274,7 +336,7 @@ async def create_or_update_user_upload(session_id: str, user_identifier: str, us
             "user_identifier": user_identifier,
             "user_ip": user_ip,
             "user_agent": user_agent,
-            "upload_count": 1,
+            "upload_count": count,
             "first_upload_at": datetime.utcnow(),
             "last_upload_at": datetime.utcnow(),
             "is_active": True
@@ -307,3 +369,40 @@ async def update_session_photos_per_user_limit(session_id: str, new_limit: int)
         {"$set": {"photos_per_user_limit": new_limit}}
     )
     return result.modified_count > 0
+
+
+# Direct upload tickets (see app/utils/direct_upload.py)
+async def create_upload_ticket(ticket: dict) -> dict:
+    """Store a ticket reserving one upload until ticket["expires_at"]"""
+    upload_tickets_collection = get_upload_tickets_collection()
+    ticket["created_at"] = datetime.utcnow()
+    result = await upload_tickets_collection.insert_one(ticket)
+    ticket["_id"] = result.inserted_id
+    return ticket
+
+
+async def count_active_upload_tickets(session_id: str, user_identifier: str) -> int:
+    """Number of unexpired tickets a user holds in a session"""
+    upload_tickets_collection = get_upload_tickets_collection()
+    return await upload_tickets_collection.count_documents({
+        "session_id": session_id,
+        "user_identifier": user_identifier,
+        "expires_at": {"$gt": datetime.utcnow()}
+    })
+
+
+async def get_upload_ticket(session_id: str, ticket_id: str) -> Optional[dict]:
+    """Get an unexpired ticket of a session"""
+    upload_tickets_collection = get_upload_tickets_collection()
+    return await upload_tickets_collection.find_one({
+        "ticket_id": ticket_id,
+        "session_id": session_id,
+        "expires_at": {"$gt": datetime.utcnow()}
+    })
+
+
+async def delete_upload_ticket(ticket_id: str) -> bool:
+    """Delete a ticket; False if it was already gone (e.g. confirmed concurrently)"""
+    upload_tickets_collection = get_upload_tickets_collection()
+    result = await upload_tickets_collection.delete_one({"ticket_id": ticket_id})
+    return result.deleted_count > 0
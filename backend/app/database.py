@@ -1,13 +1,35 @@
 ﻿from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
 import os
 from dotenv import load_dotenv
 
+from app.utils.metrics import metrics_enabled
+from app.utils.mongo_monitoring import create_event_listeners
+
 load_dotenv()
 
 MONGODB_URL = os.getenv("MONGODB_URL")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "qr_photo_app")
 
-client = AsyncIOMotorClient(MONGODB_URL)
+# Pool settings are per process; with 4 uvicorn workers the deployment opens
+# up to 4 * MONGODB_MAX_POOL_SIZE connections.
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "25"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "10000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+
+client = AsyncIOMotorClient(
+    MONGODB_URL,
+    maxPoolSize=MONGODB_MAX_POOL_SIZE,
+    minPoolSize=MONGODB_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+    connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    event_listeners=create_event_listeners() if metrics_enabled() else [],
+)
 database = client[DATABASE_NAME]
 
 def get_database():
@@ -24,3 +46,26 @@ def get_users_collection():
 
 def get_user_uploads_collection():
     return database.user_uploads
+
+def get_upload_tickets_collection():
+    return database.upload_tickets
+
+async def ensure_indexes():
+    """Create the indexes the app relies on (no-op when they already exist)"""
+    # One stored photo per distinct content in a session. Legacy photos
+    # without a content_hash are left out of the index.
+    await get_photos_collection().create_index(
+        [("session_id", ASCENDING), ("content_hash", ASCENDING)],
+        name="session_content_hash",
+        unique=True,
+        partialFilterExpression={"content_hash": {"$type": "string"}}
+    )
+    # Direct upload tickets are looked up by id and counted per guest; MongoDB
+    # drops them once expired (the app also filters on expires_at, since the
+    # TTL monitor only runs once a minute)
+    await get_upload_tickets_collection().create_index("ticket_id", name="ticket_id", unique=True)
+    await get_upload_tickets_collection().create_index(
+        [("session_id", ASCENDING), ("user_identifier", ASCENDING)],
+        name="session_user"
+    )
+    await get_upload_tickets_collection().create_index("expires_at", name="expires_at", expireAfterSeconds=0)
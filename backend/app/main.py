@@ -1,24 +1,46 @@
 ﻿from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from fastapi.responses import RedirectResponse, StreamingResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.responses import RedirectResponse, StreamingResponse, Response
 import os
 from os import getenv
 import io
+import asyncio
+import hashlib
 import cloudinary
 import cloudinary.uploader
 import uuid
 from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 import traceback
-from starlette.requests import Request
+from starlette.datastructures import Headers
+from starlette.requests import ClientDisconnect, Request
+from email.utils import formatdate
 
 from app import crud, schemas, utils
-from app.database import get_database, get_photos_collection
+from app.database import get_database, get_photos_collection, ensure_indexes
 from app.utils.user_identifier import generate_user_identifier, get_user_ip, get_user_agent
 from app.utils.zip_generator import create_photos_zip, create_empty_session_zip
 from app.utils.logger import safe_log
+from app.utils.health import health_monitor
+from app.utils.thumbnails import thumbnail_pipeline, destroy_thumbnails
+from app.utils.normalization import image_normalizer
+from app.utils.images import IMAGE_VERIFY_ENABLED, InvalidImageError, verify_image
+from app.utils.process_pool import process_pool
+from app.utils.resumable import (
+    TUS_EXTENSIONS, TUS_VERSION, check_tus_resumable, parse_upload_metadata, resumable_upload_store
+)
+from app.utils.direct_upload import (
+    DIRECT_UPLOADS_ENABLED, DIRECT_UPLOAD_TICKET_TTL_SECONDS,
+    delivery_url, gallery_thumbnail_url, sign_upload, stored_asset, upload_url, verify_upload
+)
+from app.utils.idempotency import (
+    IDEMPOTENCY_HEADER, REPLAYED_HEADER, idempotency_store, run_idempotent, validate_idempotency_key
+)
+from app.utils.timing import record_since_request_start, span, timed
+from app.utils.serialization import FastJSONResponse, StaticJSONResponse, encode_static, loads as json_loads
 from app.auth import (
     oauth, create_access_token, get_current_user, require_authentication,
     get_current_user_optional, get_google_user_info, generate_user_id, GOOGLE_CLIENT_ID, exchange_code_for_token,
@@ -26,7 +48,12 @@ from app.auth import (
 )
 from app.schemas.user import UserCreate, UserResponse, Token
 from app.websocket_manager import websocket_manager
-from app.middleware.rate_limiter import create_rate_limit_middleware, api_rate_limiter
+from app.middleware.admission import upload_admission
+from app.middleware.rate_limiter import api_rate_limiter
+from app.middleware.pipeline import RequestPipelineMiddleware
+from app.utils.metrics import (
+    metrics_collector, metrics_authorized, metrics_enabled, metrics_token_missing, mark_process_dead, render_metrics
+)
 
 # Initialize Cloudinary
 cloudinary.config(
@@ -36,7 +63,10 @@ cloudinary.config(
 )
 
 # Initialize FastAPI
-app = FastAPI(title="QR PhotoShare API", version="1.0.0")
+app = FastAPI(title="QR PhotoShare API", version="1.0.0", default_response_class=FastJSONResponse)
+
+# Constant response bodies, encoded once
+ROOT_RESPONSE_BODY = encode_static({"message": "QR PhotoShare API", "status": "healthy"})
 
 # CORS configuration
 def get_allowed_origins():
@@ -66,144 +96,49 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
+    allow_methods=["GET", "HEAD", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
     allow_headers=[
         "Authorization",
         "Content-Type", 
-        "Accept"
+        "Accept",
+        "X-Request-ID",
+        "Idempotency-Key",
+        # Resumable uploads
+        "Tus-Resumable",
+        "Upload-Length",
+        "Upload-Offset",
+        "Upload-Metadata"
     ],
-    expose_headers=["X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset"],
+    expose_headers=["X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset", "X-Request-ID", REPLAYED_HEADER,
+                    "Location", "Tus-Resumable", "Upload-Offset", "Upload-Length", "Upload-Expires", "Retry-After"],
     max_age=86400,  # 24 hours
 )
 
-# Add endpoint-specific rate limiting middleware
-async def endpoint_rate_limit_middleware(request: Request, call_next):
-    """Endpoint-specific rate limiting middleware"""
-    # Skip rate limiting for certain paths
-    skip_paths = ["/health", "/docs", "/openapi.json", "/favicon.ico", "/"]
-    if request.url.path in skip_paths:
-        response = await call_next(request)
-        return response
-    
-    # Try to extract user ID from JWT token for authenticated rate limiting
-    user_id = None
-    auth_header = request.headers.get("authorization")
-    if auth_header and auth_header.startswith("Bearer "):
-        try:
-            from jose import jwt
-            from app.auth import SECRET_KEY, ALGORITHM
-            token = auth_header.split(" ")[1]
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            user_id = payload.get("sub")
-        except Exception:
-            # Invalid token, treat as anonymous
-            pass
-    
-    # Get endpoint-specific limits with user context
-    max_requests, window_seconds = api_rate_limiter.get_limits_for_endpoint(
-        request.url.path, request.method, user_id
-    )
-    
-    # Check rate limit with user context
-    is_allowed, info = api_rate_limiter.limiter.is_allowed(request, max_requests, window_seconds, user_id)
-    
-    # Record analytics
-    api_rate_limiter.record_request(request.url.path, user_id, blocked=not is_allowed)
-    
-    if not is_allowed:
-        return JSONResponse(
-            status_code=429,
-            content=info,
-            headers={
-                "Retry-After": str(info.get("retry_after", window_seconds)),
-                "X-RateLimit-Limit": str(max_requests),
-                "X-RateLimit-Window": str(window_seconds)
-            }
-        )
-    
-    # Process request
-    response = await call_next(request)
-    
-    # Add rate limit headers to response
-    response.headers["X-RateLimit-Limit"] = str(info["limit"])
-    response.headers["X-RateLimit-Remaining"] = str(info["remaining"])
-    response.headers["X-RateLimit-Reset"] = str(info["reset_time"])
-    
-    return response
-
-app.middleware("http")(endpoint_rate_limit_middleware)
+# Rate limiting, security headers and request metrics in one pure-ASGI pass
+app.add_middleware(RequestPipelineMiddleware)
 
 @app.get("/")
 async def root():
-    return {"message": "QR PhotoShare API", "status": "healthy"}
+    return StaticJSONResponse(ROOT_RESPONSE_BODY)
 
 @app.get("/health")
 async def health_check():
     """Basic health check endpoint for load balancers"""
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus scrape endpoint (bearer token, see METRICS_TOKEN)"""
+    # 404 rather than 401 so the endpoint is not advertised
+    if not metrics_enabled() or not metrics_authorized(request.headers.get("authorization")):
+        raise HTTPException(status_code=404, detail="Not Found")
+    body, content_type = render_metrics()
+    return Response(content=body, headers={"Content-Type": content_type})
+
 @app.get("/health/detailed")
 async def detailed_health_check():
-    """Comprehensive health check with all dependencies"""
-    try:
-        health_status = {
-            "status": "healthy",
-            "timestamp": datetime.utcnow().isoformat(),
-            "version": "1.0.0",
-            "environment": os.getenv("NODE_ENV", "development"),
-            "services": {}
-        }
-        
-        # Test database connection
-        try:
-            from app.database import get_database
-            db = get_database()
-            start_time = datetime.utcnow()
-            await db.admin.command('ping')
-            response_time = (datetime.utcnow() - start_time).total_seconds() * 1000
-            health_status["services"]["database"] = {
-                "status": "healthy",
-                "response_time_ms": round(response_time, 2)
-            }
-        except Exception as e:
-            health_status["services"]["database"] = {
-                "status": "unhealthy",
-                "error": str(e)
-            }
-            health_status["status"] = "degraded"
-        
-        # Test Cloudinary connection
-        try:
-            start_time = datetime.utcnow()
-            cloudinary.api.ping()
-            response_time = (datetime.utcnow() - start_time).total_seconds() * 1000
-            health_status["services"]["cloudinary"] = {
-                "status": "healthy",
-                "response_time_ms": round(response_time, 2)
-            }
-        except Exception as e:
-            health_status["services"]["cloudinary"] = {
-                "status": "unhealthy",
-                "error": str(e)
-            }
-            health_status["status"] = "degraded"
-        
-        # System resources
-        import psutil
-        health_status["system"] = {
-            "cpu_percent": psutil.cpu_percent(),
-            "memory_percent": psutil.virtual_memory().percent,
-            "disk_percent": psutil.disk_usage('/').percent
-        }
-        
-        return health_status
-        
-    except Exception as e:
-        return {
-            "status": "unhealthy",
-            "timestamp": datetime.utcnow().isoformat(),
-            "error": str(e)
-        }
+    """Comprehensive health check with all dependencies (latest background snapshot)"""
+    return StaticJSONResponse(health_monitor.body)
 
 @app.get("/health/ready")
 async def readiness_check():
@@ -212,7 +147,7 @@ async def readiness_check():
         # Test critical dependencies
         from app.database import get_database
         db = get_database()
-        await db.admin.command('ping')
+        await db.command('ping')
         return {"status": "ready"}
     except Exception:
         raise HTTPException(status_code=503, detail="Service not ready")
@@ -245,8 +180,24 @@ async def startup_db_client():
     safe_log(f"📊 MongoDB: {'✅ Configured' if os.getenv('MONGODB_URL') else '❌ Not configured'}", 'info')
     safe_log(f"☁️ Cloudinary: {'✅ Configured' if os.getenv('CLOUDINARY_CLOUD_NAME') else '❌ Not configured'}", 'info')
     safe_log(f"🔐 Google OAuth: {'✅ Configured' if os.getenv('GOOGLE_CLIENT_ID') else '❌ Not configured'}", 'info')
+    if metrics_enabled() and metrics_token_missing():
+        safe_log("📈 Metrics: ❌ METRICS_TOKEN not set, /metrics answers 404 and Prometheus cannot scrape", 'warning')
+    
+    # Resolve rate limit policy against the registered routes once
+    api_rate_limiter.compile_policy(app.routes)
+    health_monitor.start()
+    # Spawn the CPU worker processes now rather than on the first upload
+    process_pool.warm_up()
+    # Index builds need MongoDB; don't hold up startup while it is unreachable
+    asyncio.create_task(create_indexes())
     safe_log("✅ FastAPI startup complete!", 'info')
 
+async def create_indexes():
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        safe_log(f"Failed to create database indexes: {e}", 'error')
+
 # Global exception handler for production
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -277,7 +228,9 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    pass
+    await health_monitor.stop()
+    process_pool.stop()
+    mark_process_dead()
 
 # WebSocket endpoints
 @app.websocket("/ws/{session_id}")
@@ -285,8 +238,14 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
     """WebSocket endpoint for real-time notifications (owners only)"""
     try:
         # Get authentication token from query parameters
-        query_params = dict(websocket.query_params)
-        token = query_params.get('token')
+        token = websocket.query_params.get('token')
+        
+        # Anonymous sockets never receive notifications, so refuse them before
+        # touching the database or keeping any per-connection state
+        if not token:
+            safe_log("Rejected anonymous WebSocket connection to session %s", 'debug', session_id)
+            await websocket.close(code=1008, reason="Authentication required")
+            return
         
         # Validate session exists
         db_session = await crud.get_session(session_id=session_id)
@@ -294,47 +253,39 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
             await websocket.close(code=1008, reason="Session not found")
             return
         
-        user = None
-        user_id = None
-        
-        # Validate JWT token if provided
-        if token:
-            user = await validate_websocket_token(token)
-            if user:
-                user_id = user.get('user_id')
-                # Verify user is the session owner
-                if user_id != db_session.get('owner_id'):
-                    await websocket.close(code=1003, reason="Not session owner")
-                    return
-            else:
-                await websocket.close(code=1008, reason="Invalid token")
-                return
-        else:
-            # Anonymous connection - allow but don't store for notifications
-            safe_log(f"Anonymous WebSocket connection to session {session_id}", 'debug')
+        # Validate JWT token
+        user = await validate_websocket_token(token)
+        if not user:
+            await websocket.close(code=1008, reason="Invalid token")
+            return
         
-        # Connect with user_id if authenticated and is session owner
+        user_id = user.get('user_id')
+        # Verify user is the session owner
+        if user_id != db_session.get('owner_id'):
+            await websocket.close(code=1003, reason="Not session owner")
+            return
+        
+        # Connect as the session owner
         await websocket_manager.connect(websocket, session_id, user_id)
         
         # Send welcome message
-        message_type = "owner_connected" if user_id else "connected"
         welcome_data = {
-            "type": message_type,
+            "type": "owner_connected",
             "session_id": session_id,
             "message": "Connected to session notifications",
-            "authenticated": bool(user_id)
+            "authenticated": True
         }
         await websocket_manager.send_enhanced_message(welcome_data, websocket)
         
         try:
-            while True:
+            # Ends once the writer has closed a connection it could not write to
+            while websocket_manager.is_connected(websocket):
                 # Keep connection alive and handle any incoming messages
                 data = await websocket.receive_text()
                 
                 # Parse message for potential heartbeat
                 try:
-                    import json
-                    message = json.loads(data)
+                    message = json_loads(data)
                     if message.get("type") == "ping":
                         # Update heartbeat timestamp
                         websocket_manager.update_heartbeat(websocket)
@@ -345,12 +296,12 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                     elif message.get("type") == "ack":
                         # Handle message acknowledgments
                         sequence = message.get("sequence")
-                        safe_log(f"Received acknowledgment for sequence {sequence}", 'debug')
+                        safe_log("Received acknowledgment for sequence %s", 'debug', sequence)
                     else:
                         # Echo back other messages (for testing/debugging)
                         echo_data = {"type": "echo", "message": f"Received: {data}"}
                         await websocket_manager.send_enhanced_message(echo_data, websocket)
-                except json.JSONDecodeError:
+                except ValueError:
                     # Handle non-JSON messages
                     echo_data = {"type": "echo", "message": f"Received non-JSON: {data}"}
                     await websocket_manager.send_enhanced_message(echo_data, websocket)
@@ -386,7 +337,7 @@ async def google_login():
 async def google_callback(code: str = None, error: str = None):
     """Handle Google OAuth2 callback"""
     try:
-        safe_log(f"OAuth callback received - code: {'YES' if code else 'NO'}, error: {error}", 'debug')
+        safe_log("OAuth callback received - code: %s, error: %s", 'debug', 'YES' if code else 'NO', error)
         
         if error:
             safe_log(f"OAuth error from Google: {error}", 'error')
@@ -476,11 +427,7 @@ async def create_session(current_user: UserResponse = Depends(get_current_user))
             # Create anonymous session (fallback)
             db_session = await crud.create_session(session=session_create)
         
-        # Convert ObjectId to string for JSON serialization
-        if "_id" in db_session:
-            db_session["_id"] = str(db_session["_id"])
-            
-        return db_session
+        return FastJSONResponse(db_session)
     except Exception as e:
         safe_log(f"Error creating session: {e}", 'error')
         safe_log(traceback.format_exc(), 'error')
@@ -493,10 +440,7 @@ async def get_session(session_id: str):
         if not db_session:
             raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
         
-        # Convert ObjectId to string for JSON serialization
-        if "_id" in db_session:
-            db_session["_id"] = str(db_session["_id"])
-        return db_session
+        return FastJSONResponse(db_session)
     except HTTPException:
         raise
     except Exception as e:
@@ -513,7 +457,7 @@ async def get_qr_code(session_id: str):
         
         # Generate QR code with the session URL
         qr_data = f"{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/session/{session_id}"
-        qr_code = utils.generate_qr_code(qr_data)
+        qr_code = await process_pool.run(utils.generate_qr_code, qr_data)
         
         return {"qr_code": qr_code, "session_url": qr_data}
     except HTTPException:
@@ -523,12 +467,243 @@ async def get_qr_code(session_id: str):
         safe_log(traceback.format_exc(), 'error')
         raise HTTPException(status_code=500, detail=f"Failed to generate QR code: {str(e)}")
 
+# Upload bodies are read (and hashed) in chunks of this size
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+
+# Batch uploads: files per request, and storage uploads in flight per request
+BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", "10"))
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "4"))
+
+# Content hashes are unique per session, so another guest's copy cannot be
+# stored twice; they are told instead of being handed that guest's photo
+ALREADY_IN_SESSION_DETAIL = "This photo is already in this session"
+# A batch file whose content appeared earlier in the batch, where it failed
+REPEATED_IN_BATCH_DETAIL = "Repeated in batch; the earlier copy failed to upload"
+
+def existing_photo_record(photo: dict) -> dict:
+    """An already stored photo as returned to the guest who uploaded it"""
+    return {key: value for key, value in photo.items() if key != "user_identifier"}
+
+def duplicate_upload_response(photo: dict) -> FastJSONResponse:
+    """Upload response for content that is already stored in the session"""
+    return FastJSONResponse({
+        "filename": photo["filename"],
+        "url": photo["url"],
+        "thumbnail_url": photo.get("thumbnail_url"),
+        "photo": existing_photo_record(photo),
+        "duplicate": True
+    })
+
+def request_user_id(request: Request):
+    """User id the request pipeline resolved from the JWT, if any"""
+    return getattr(request.state, "user_id", None)
+
+async def run_admitted(request: Request, handler, weight: int = 1) -> Response:
+    """Run an upload handler once admission control grants it `weight` slots
+
+    Called after the body has been received, so client transfer time never
+    counts against the upload limit.
+    """
+    async with upload_admission.admit(priority=request_user_id(request) is not None, weight=weight):
+        return await handler()
+
+async def run_upload(session_id: str, request: Request, handler, weight: int = 1) -> Response:
+    """Run an upload handler under admission control, honouring the Idempotency-Key header"""
+    admitted_handler = lambda: run_admitted(request, handler, weight)
+    idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+    if idempotency_key is None:
+        return await admitted_handler()
+    
+    # Keys are scoped to the route, session and guest, so one client can
+    # never be answered with another client's response
+    validate_idempotency_key(idempotency_key)
+    try:
+        uuid.UUID(session_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid session ID format")
+    scope = f"{request.url.path}:{generate_user_identifier(request, session_id)}:{idempotency_key}"
+    return await run_idempotent(idempotency_store, scope, admitted_handler)
+
+def validate_upload_filename(filename: str, content_type: str) -> str:
+    """Check an upload's filename and declared content type; returns the sanitized filename"""
+    # Validate and sanitize filename
+    if not filename or len(filename) > 255:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    
+    # Sanitize filename - remove dangerous characters
+    import string
+    valid_chars = f"-_.() {string.ascii_letters}{string.digits}"
+    sanitized_filename = ''.join(c for c in filename if c in valid_chars)
+    if not sanitized_filename:
+        raise HTTPException(status_code=400, detail="Filename contains only invalid characters")
+    
+    # Check for dangerous extensions
+    dangerous_extensions = ['.exe', '.bat', '.cmd', '.scr', '.pif', '.com', '.jar', '.js', '.php', '.asp']
+    file_lower = sanitized_filename.lower()
+    if any(file_lower.endswith(ext) for ext in dangerous_extensions):
+        raise HTTPException(status_code=400, detail="File extension not allowed")
+    
+    # Validate that it's an image file
+    allowed_content_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']
+    if content_type not in allowed_content_types:
+        raise HTTPException(status_code=400, detail=f"Invalid file type. Allowed types: {allowed_content_types}")
+    
+    return sanitized_filename
+
+async def read_upload_file(file: UploadFile) -> Tuple[bytes, str]:
+    """Read and validate one uploaded image; returns (contents, SHA-256 hex digest)"""
+    # Check if file is provided
+    if not file:
+        raise HTTPException(status_code=400, detail="No file provided")
+    
+    # Read file content in chunks, hashing as it is read
+    MAX_FILE_SIZE = MAX_UPLOAD_FILE_SIZE
+    with span("read_body"):
+        digest = hashlib.sha256()
+        chunks = []
+        file_size = 0
+        while True:
+            chunk = await file.read(UPLOAD_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            file_size += len(chunk)
+            # File size validation (10MB limit)
+            if file_size > MAX_FILE_SIZE:
+                raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_FILE_SIZE//1024//1024}MB")
+            digest.update(chunk)
+            chunks.append(chunk)
+        contents = b"".join(chunks)
+        content_hash = digest.hexdigest()
+    safe_log("File size: %s bytes", 'debug', file_size)
+    
+    if file_size == 0:
+        raise HTTPException(status_code=400, detail="Empty file provided")
+    
+    validate_upload_filename(file.filename, file.content_type)
+    
+    # Magic number validation (file signature check)
+    @timed("magic_number")
+    def validate_image_magic_number(file_content: bytes) -> bool:
+        """Validate file content using magic numbers/file signatures"""
+        if len(file_content) < 12:
+            return False
+        
+        # JPEG: FF D8 FF
+        if file_content[:3] == b'\xFF\xD8\xFF':
+            return True
+        # PNG: 89 50 4E 47 0D 0A 1A 0A
+        elif file_content[:8] == b'\x89\x50\x4E\x47\x0D\x0A\x1A\x0A':
+            return True
+        # GIF: 47 49 46 38 (GIF8)
+        elif file_content[:4] == b'GIF8':
+            return True
+        # WebP: RIFF....WEBP
+        elif file_content[:4] == b'RIFF' and file_content[8:12] == b'WEBP':
+            return True
+        return False
+    
+    if not validate_image_magic_number(contents):
+        raise HTTPException(status_code=400, detail="File content does not match expected image format")
+    
+    # Decode the whole image, off the event loop, to reject truncated or
+    # corrupt files and decompression bombs before anything is stored
+    if IMAGE_VERIFY_ENABLED:
+        with span("verify_image"):
+            try:
+                await verify_image(contents)
+            except InvalidImageError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+            except Exception as e:
+                # The pool itself failed (e.g. a worker was killed); the
+                # magic number check passed, so don't turn guests away
+                safe_log("Image verification unavailable: %s", 'error', e)
+    
+    return contents, content_hash
+
+async def finish_photo_upload(
+    db_session: dict,
+    db_photo: dict,
+    result: dict,
+    thumbnail_fields: dict,
+    user_identifier: str,
+    user_ip: str = None,
+    user_agent: str = None
+) -> FastJSONResponse:
+    """Count a stored photo against the session and the guest, and notify the owner"""
+    session_id = db_session["session_id"]
+    
+    # Increment photo count (legacy - keep for backward compatibility)
+    with span("photo_count"):
+        try:
+            await crud.increment_photo_count(session_id)
+            safe_log("Photo count incremented for session: %s", 'debug', session_id)
+        except Exception as count_error:
+            safe_log(f"Error incrementing photo count: {count_error}", 'error')
+            safe_log(traceback.format_exc(), 'error')
+    
+    # Record user upload for per-user tracking
+    with span("user_upload_record"):
+        try:
+            await crud.create_or_update_user_upload(
+                session_id=session_id,
+                user_identifier=user_identifier,
+                user_ip=user_ip,
+                user_agent=user_agent
+            )
+            safe_log("User upload recorded for: %s", 'debug', user_identifier)
+        except Exception as user_error:
+            safe_log(f"Error recording user upload: {user_error}", 'error')
+            safe_log(traceback.format_exc(), 'error')
+    
+    metrics_collector.record_photo_upload()
+    
+    # Send real-time notification to session owner only
+    with span("notify"):
+        try:
+            # Get session owner
+            if db_session.get("owner_id"):
+                # Get updated session photo count
+                photos = await crud.get_photos_by_session(session_id=session_id)
+                photo_count = len(photos)
+    
+                await websocket_manager.notify_photo_uploaded(session_id, db_session["owner_id"], {
+                    "filename": result["public_id"],
+                    "url": result["secure_url"],
+                    "thumbnail_url": thumbnail_fields.get("thumbnail_url"),
+                    "upload_count": photo_count,
+                    "uploaded_by": user_identifier[:8] + "..."  # Show partial identifier
+                })
+                safe_log("WebSocket notification sent to owner %s for session %s", 'debug', db_session['owner_id'], session_id)
+            else:
+                safe_log("No owner found for session %s, skipping notification", 'debug', session_id)
+        except Exception as ws_error:
+            safe_log(f"WebSocket notification error: {ws_error}", 'error')
+            safe_log(traceback.format_exc(), 'error')
+    
+    return FastJSONResponse({
+        "filename": result["public_id"], 
+        "url": result["secure_url"], 
+        "thumbnail_url": thumbnail_fields.get("thumbnail_url"),
+        "photo": db_photo
+    })
+
 @app.post("/sessions/{session_id}/photos")
 async def upload_photo(
     session_id: str,
     file: UploadFile = File(..., description="Image file (max 10MB)"),
     request: Request = None
 ):
+    # Multipart parsing happens before the endpoint body runs
+    record_since_request_start("request_parse")
+    return await run_upload(session_id, request, lambda: store_photo_upload(session_id, file, request))
+
+async def store_photo_upload(session_id: str, file: UploadFile, request: Request, user_identifier: str = None) -> FastJSONResponse:
+    """Validate, store and record one uploaded photo
+
+    user_identifier overrides the one derived from the request (resumable
+    uploads keep the identity of the client that started them).
+    """
     try:
         # Validate session ID format (UUID)
         try:
@@ -536,196 +711,731 @@ async def upload_photo(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid session ID format")
             
-        safe_log(f"Attempting to upload photo for session: {session_id}", 'debug')
-        safe_log(f"File details: {file.filename}, {file.content_type}", 'debug')
+        safe_log("Attempting to upload photo for session: %s", 'debug', session_id)
+        safe_log("File details: %s, %s", 'debug', file.filename, file.content_type)
         
         # Check if session exists
-        db_session = await crud.get_session(session_id=session_id)
+        with span("session_lookup"):
+            db_session = await crud.get_session(session_id=session_id)
         if not db_session:
             raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
         
-        safe_log(f"Session found: {db_session}", 'debug')
+        safe_log("Session found: %s", 'debug', db_session)
         
         # Check if session is active
         if not db_session.get("is_active", True):
             raise HTTPException(status_code=400, detail="Session is inactive")
         
         # Generate user identifier for this anonymous user
-        user_identifier = generate_user_identifier(request, session_id)
+        user_identifier = user_identifier or generate_user_identifier(request, session_id)
         user_ip = get_user_ip(request)
         user_agent = get_user_agent(request)
         
-        safe_log(f"User identifier: {user_identifier}", 'debug')
+        safe_log("User identifier: %s", 'debug', user_identifier)
         
         # Get user's current upload count
-        user_upload_stats = await crud.get_user_upload_stats(session_id, user_identifier)
+        with span("user_stats_lookup"):
+            user_upload_stats = await crud.get_user_upload_stats(session_id, user_identifier)
         current_user_uploads = user_upload_stats["upload_count"] if user_upload_stats else 0
         
         # Check per-user photo limit
         photos_per_user_limit = db_session.get("photos_per_user_limit", 10)
         
-        safe_log(f"User uploads: {current_user_uploads}, Per-user limit: {photos_per_user_limit}", 'debug')
+        safe_log("User uploads: %s, Per-user limit: %s", 'debug', current_user_uploads, photos_per_user_limit)
         
-        if current_user_uploads >= photos_per_user_limit:
+        # Enforced after the duplicate check, so retrying an upload that
+        # already went through is answered even at the limit
+        limit_reached = current_user_uploads >= photos_per_user_limit
+        
+        contents, content_hash = await read_upload_file(file)
+        file_size = len(contents)
+        
+        # Identical content already stored in this session: a retried upload
+        # by this guest gets the existing photo instead of storing it again
+        with span("dedup_lookup"):
+            existing_photo = await crud.get_photo_by_content_hash(session_id, content_hash)
+        if existing_photo:
+            safe_log("Duplicate upload of %s in session %s", 'debug', content_hash, session_id)
+            metrics_collector.record_duplicate_upload(file_size)
+            if existing_photo.get("user_identifier") != user_identifier:
+                raise HTTPException(status_code=409, detail=ALREADY_IN_SESSION_DETAIL)
+            return duplicate_upload_response(existing_photo)
+        
+        if limit_reached:
             raise HTTPException(
                 status_code=400, 
                 detail=f"You have reached your photo limit ({photos_per_user_limit} photos per user). You have uploaded {current_user_uploads} photos."
             )
         
-        # Check if file is provided
-        if not file:
-            raise HTTPException(status_code=400, detail="No file provided")
+        # Stored bytes may differ from what the client sent; content_hash
+        # stays that of the original, so retries still match
+        with span("normalize"):
+            contents = await image_normalizer.normalize(contents)
         
-        # Read file content properly
-        contents = await file.read()
-        file_size = len(contents)
-        safe_log(f"File size: {file_size} bytes", 'debug')
+        # Thumbnails render in the process pool while the original uploads
+        thumbnail_job = thumbnail_pipeline.render(contents)
+        folder_name = f"qr_sessions/{session_id}"
+        public_id = f"{uuid.uuid4()}_{file.filename.split('.')[0]}"
         
-        # File size validation (10MB limit)
-        MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-        if file_size == 0:
-            raise HTTPException(status_code=400, detail="Empty file provided")
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_FILE_SIZE//1024//1024}MB")
-        
-        # Validate and sanitize filename
-        if not file.filename or len(file.filename) > 255:
-            raise HTTPException(status_code=400, detail="Invalid filename")
-        
-        # Sanitize filename - remove dangerous characters
-        import string
-        valid_chars = f"-_.() {string.ascii_letters}{string.digits}"
-        sanitized_filename = ''.join(c for c in file.filename if c in valid_chars)
-        if not sanitized_filename:
-            raise HTTPException(status_code=400, detail="Filename contains only invalid characters")
-        
-        # Check for dangerous extensions
-        dangerous_extensions = ['.exe', '.bat', '.cmd', '.scr', '.pif', '.com', '.jar', '.js', '.php', '.asp']
-        file_lower = sanitized_filename.lower()
-        if any(file_lower.endswith(ext) for ext in dangerous_extensions):
-            raise HTTPException(status_code=400, detail="File extension not allowed")
-        
-        # Validate that it's an image file
-        allowed_content_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']
-        if file.content_type not in allowed_content_types:
-            raise HTTPException(status_code=400, detail=f"Invalid file type. Allowed types: {allowed_content_types}")
-        
-        # Magic number validation (file signature check)
-        def validate_image_magic_number(file_content: bytes) -> bool:
-            """Validate file content using magic numbers/file signatures"""
-            if len(file_content) < 12:
-                return False
-            
-            # JPEG: FF D8 FF
-            if file_content[:3] == b'\xFF\xD8\xFF':
-                return True
-            # PNG: 89 50 4E 47 0D 0A 1A 0A
-            elif file_content[:8] == b'\x89\x50\x4E\x47\x0D\x0A\x1A\x0A':
-                return True
-            # GIF: 47 49 46 38 (GIF8)
-            elif file_content[:4] == b'GIF8':
-                return True
-            # WebP: RIFF....WEBP
-            elif file_content[:4] == b'RIFF' and file_content[8:12] == b'WEBP':
-                return True
-            return False
+        # Upload to Cloudinary
+        with span("storage_upload"):
+            try:
+                safe_log("Uploading to Cloudinary...", 'debug')
+                # Upload to Cloudinary with folder structure
+                result = await asyncio.to_thread(
+                    cloudinary.uploader.upload,
+                    contents,
+                    folder=folder_name,
+                    public_id=public_id,
+                    resource_type="image"
+                )
+                safe_log("Cloudinary upload result: %s", 'debug', result)
+                
+            except Exception as cloudinary_error:
+                safe_log(f"Cloudinary upload error: {cloudinary_error}", 'error')
+                safe_log(traceback.format_exc(), 'error')
+                if thumbnail_job is not None:
+                    # Nothing will store the renditions; free the pool slot
+                    thumbnail_job.cancel()
+                raise HTTPException(status_code=500, detail=f"Failed to upload to Cloudinary: {str(cloudinary_error)}")
+        
+        # Store thumbnails next to the original; galleries fall back to the original without them
+        thumbnail_fields = {}
+        if thumbnail_job is not None:
+            try:
+                with span("thumbnails"):
+                    thumbnail_fields = await thumbnail_pipeline.store(thumbnail_job, folder_name, public_id)
+            except Exception as thumbnail_error:
+                safe_log(f"Thumbnail generation error: {thumbnail_error}", 'error')
+                safe_log(traceback.format_exc(), 'error')
         
-        if not validate_image_magic_number(contents):
-            raise HTTPException(status_code=400, detail="File content does not match expected image format")
+        # Save photo record to database
+        with span("db_insert"):
+            try:
+                photo_data = schemas.PhotoCreate(
+                    filename=result["public_id"], 
+                    session_id=session_id,
+                    url=result["secure_url"],
+                    user_identifier=user_identifier,
+                    content_hash=content_hash,
+                    **thumbnail_fields
+                )
+                db_photo = await crud.create_photo(photo=photo_data)
+                safe_log("Photo record created: %s", 'debug', db_photo)
+                
+            except DuplicateKeyError:
+                # A concurrent upload of the same content won the insert;
+                # drop our copy from storage and answer with theirs
+                db_photo = None
+            except Exception as db_error:
+                safe_log(f"Database error: {db_error}", 'error')
+                safe_log(traceback.format_exc(), 'error')
+                raise HTTPException(status_code=500, detail=f"Failed to save photo record: {str(db_error)}")
+        
+        if db_photo is None:
+            try:
+                await asyncio.to_thread(cloudinary.uploader.destroy, result["public_id"])
+            except Exception as e:
+                safe_log(f"Failed to delete duplicate {result['public_id']} from Cloudinary: {e}", 'error')
+            await destroy_thumbnails(thumbnail_fields)
+            existing_photo = await crud.get_photo_by_content_hash(session_id, content_hash)
+            if not existing_photo:
+                raise HTTPException(status_code=500, detail="Failed to save photo record")
+            metrics_collector.record_duplicate_upload(file_size)
+            if existing_photo.get("user_identifier") != user_identifier:
+                raise HTTPException(status_code=409, detail=ALREADY_IN_SESSION_DETAIL)
+            return duplicate_upload_response(existing_photo)
+        
+        return await finish_photo_upload(
+            db_session, db_photo, result, thumbnail_fields, user_identifier, user_ip, user_agent
+        )
         
-        # Upload to Cloudinary
+    except HTTPException:
+        raise
+    except Exception as e:
+        safe_log(f"General upload error: {e}", 'error')
+        safe_log(traceback.format_exc(), 'error')
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+# Resumable uploads (tus protocol); see app/utils/resumable.py
+def tus_headers(upload: dict) -> dict:
+    return {
+        "Tus-Resumable": TUS_VERSION,
+        "Upload-Offset": str(upload["offset"]),
+        "Upload-Length": str(upload["length"]),
+        "Upload-Expires": formatdate(upload["expires_at"], usegmt=True),
+        "Cache-Control": "no-store"
+    }
+
+async def load_resumable_upload(session_id: str, upload_id: str) -> dict:
+    # The random upload id is the client's handle; it is not tied to the
+    # client's IP, which may change when the guest's network does
+    upload = await resumable_upload_store.get(upload_id)
+    if not upload or upload["session_id"] != session_id:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+@app.options("/sessions/{session_id}/uploads")
+async def describe_resumable_uploads(session_id: str):
+    """tus discovery: supported protocol version, extensions and maximum size"""
+    return Response(status_code=204, headers={
+        "Tus-Resumable": TUS_VERSION,
+        "Tus-Version": TUS_VERSION,
+        "Tus-Extension": TUS_EXTENSIONS,
+        "Tus-Max-Size": str(MAX_UPLOAD_FILE_SIZE)
+    })
+
+@app.post("/sessions/{session_id}/uploads", status_code=201)
+async def create_resumable_upload(session_id: str, request: Request):
+    """Start a resumable upload; the photo is stored once all bytes have arrived"""
+    try:
+        check_tus_resumable(request.headers.get("tus-resumable"))
         try:
-            safe_log("Uploading to Cloudinary...", 'debug')
-            # Upload to Cloudinary with folder structure
-            folder_name = f"qr_sessions/{session_id}"
-            result = cloudinary.uploader.upload(
-                contents,
-                folder=folder_name,
-                public_id=f"{uuid.uuid4()}_{file.filename.split('.')[0]}",
-                resource_type="image"
-            )
-            safe_log(f"Cloudinary upload result: {result}", 'debug')
-            
-        except Exception as cloudinary_error:
-            safe_log(f"Cloudinary upload error: {cloudinary_error}", 'error')
-            safe_log(traceback.format_exc(), 'error')
-            raise HTTPException(status_code=500, detail=f"Failed to upload to Cloudinary: {str(cloudinary_error)}")
+            uuid.UUID(session_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid session ID format")
         
-        # Save photo record to database
         try:
-            photo_data = schemas.PhotoCreate(
-                filename=result["public_id"], 
-                session_id=session_id,
-                url=result["secure_url"],
-                user_identifier=user_identifier
+            length = int(request.headers.get("upload-length", ""))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Upload-Length header is required")
+        if length <= 0:
+            raise HTTPException(status_code=400, detail="Empty file provided")
+        if length > MAX_UPLOAD_FILE_SIZE:
+            raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_UPLOAD_FILE_SIZE//1024//1024}MB")
+        metadata = parse_upload_metadata(request.headers.get("upload-metadata"))
+        
+        db_session = await crud.get_session(session_id=session_id)
+        if not db_session:
+            raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+        if not db_session.get("is_active", True):
+            raise HTTPException(status_code=400, detail="Session is inactive")
+        
+        # Refuse up front rather than after the guest has sent every byte
+        user_identifier = generate_user_identifier(request, session_id)
+        user_upload_stats = await crud.get_user_upload_stats(session_id, user_identifier)
+        current_user_uploads = user_upload_stats["upload_count"] if user_upload_stats else 0
+        photos_per_user_limit = db_session.get("photos_per_user_limit", 10)
+        if current_user_uploads >= photos_per_user_limit:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"You have reached your photo limit ({photos_per_user_limit} photos per user). You have uploaded {current_user_uploads} photos."
             )
-            db_photo = await crud.create_photo(photo=photo_data)
-            safe_log(f"Photo record created: {db_photo}", 'debug')
-            
-        except Exception as db_error:
-            safe_log(f"Database error: {db_error}", 'error')
-            safe_log(traceback.format_exc(), 'error')
-            raise HTTPException(status_code=500, detail=f"Failed to save photo record: {str(db_error)}")
         
-        # Increment photo count (legacy - keep for backward compatibility)
+        upload = await resumable_upload_store.create(session_id, user_identifier, length, metadata)
+        upload["offset"] = 0
+        safe_log("Resumable upload %s created for session %s (%s bytes)", 'debug', upload["id"], session_id, length)
+        return Response(status_code=201, headers={
+            "Location": f"/sessions/{session_id}/uploads/{upload['id']}",
+            **tus_headers(upload)
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        safe_log(f"Error creating resumable upload: {e}", 'error')
+        safe_log(traceback.format_exc(), 'error')
+        raise HTTPException(status_code=500, detail=f"Failed to create upload: {str(e)}")
+
+@app.head("/sessions/{session_id}/uploads/{upload_id}")
+async def get_resumable_upload_offset(session_id: str, upload_id: str, request: Request):
+    """Report how many bytes of a resumable upload are stored"""
+    check_tus_resumable(request.headers.get("tus-resumable"))
+    upload = await load_resumable_upload(session_id, upload_id)
+    return Response(status_code=200, headers=tus_headers(upload))
+
+@app.patch("/sessions/{session_id}/uploads/{upload_id}")
+async def append_resumable_upload(session_id: str, upload_id: str, request: Request):
+    """Append bytes at Upload-Offset; the request completing the upload stores the photo"""
+    try:
+        check_tus_resumable(request.headers.get("tus-resumable"))
+        if request.headers.get("content-type") != "application/offset+octet-stream":
+            raise HTTPException(status_code=415, detail="Content-Type must be application/offset+octet-stream")
         try:
-            await crud.increment_photo_count(session_id)
-            safe_log(f"Photo count incremented for session: {session_id}", 'debug')
-        except Exception as count_error:
-            safe_log(f"Error incrementing photo count: {count_error}", 'error')
-            safe_log(traceback.format_exc(), 'error')
+            offset = int(request.headers.get("upload-offset", ""))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Upload-Offset header is required")
         
-        # Record user upload for per-user tracking
+        upload = await load_resumable_upload(session_id, upload_id)
         try:
-            await crud.create_or_update_user_upload(
-                session_id=session_id,
-                user_identifier=user_identifier,
-                user_ip=user_ip,
-                user_agent=user_agent
-            )
-            safe_log(f"User upload recorded for: {user_identifier}", 'debug')
-        except Exception as user_error:
-            safe_log(f"Error recording user upload: {user_error}", 'error')
-            safe_log(traceback.format_exc(), 'error')
+            upload["offset"] = await resumable_upload_store.append(upload, offset, request.stream())
+        except ClientDisconnect:
+            # The client is gone; what arrived is kept for the next attempt
+            safe_log("Resumable upload %s interrupted", 'debug', upload_id)
+            return Response(status_code=204)
         
-        # Convert ObjectId to string
-        if "_id" in db_photo:
-            db_photo["_id"] = str(db_photo["_id"])
+        if upload["offset"] < upload["length"]:
+            return Response(status_code=204, headers=tus_headers(upload))
         
-        # Send real-time notification to session owner only
+        # All bytes are here: run the assembled file through the regular upload path
+        part = await asyncio.to_thread(open, resumable_upload_store.part_path(upload_id), "rb")
         try:
-            # Get session owner
-            if db_session.get("owner_id"):
-                # Get updated session photo count
-                photos = await crud.get_photos_by_session(session_id=session_id)
-                photo_count = len(photos)
-                
-                await websocket_manager.notify_photo_uploaded(session_id, db_session["owner_id"], {
-                    "filename": result["public_id"],
-                    "url": result["secure_url"],
-                    "upload_count": photo_count,
-                    "uploaded_by": user_identifier[:8] + "..."  # Show partial identifier
-                })
-                safe_log(f"WebSocket notification sent to owner {db_session['owner_id']} for session {session_id}", 'debug')
-            else:
-                safe_log(f"No owner found for session {session_id}, skipping notification", 'debug')
-        except Exception as ws_error:
-            safe_log(f"WebSocket notification error: {ws_error}", 'error')
-            safe_log(traceback.format_exc(), 'error')
+            photo_file = UploadFile(
+                part,
+                size=upload["length"],
+                filename=upload["filename"],
+                headers=Headers({"content-type": upload["content_type"]})
+            )
+            try:
+                response = await run_admitted(request, lambda: store_photo_upload(
+                    session_id, photo_file, request, user_identifier=upload["user_identifier"]
+                ))
+            except HTTPException as e:
+                # Rejected content can never succeed; server errors can be retried
+                # with an empty PATCH at the final offset
+                if e.status_code < 500:
+                    await resumable_upload_store.remove(upload_id)
+                raise
+        finally:
+            await asyncio.to_thread(part.close)
+        
+        await resumable_upload_store.remove(upload_id)
+        for name, value in tus_headers(upload).items():
+            response.headers[name] = value
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        safe_log(f"Error appending to resumable upload: {e}", 'error')
+        safe_log(traceback.format_exc(), 'error')
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@app.delete("/sessions/{session_id}/uploads/{upload_id}", status_code=204)
+async def cancel_resumable_upload(session_id: str, upload_id: str, request: Request):
+    """Abandon a resumable upload and discard its stored bytes"""
+    check_tus_resumable(request.headers.get("tus-resumable"))
+    await load_resumable_upload(session_id, upload_id)
+    await resumable_upload_store.remove(upload_id)
+    return Response(status_code=204, headers={"Tus-Resumable": TUS_VERSION})
+
+# Direct-to-storage uploads; see app/utils/direct_upload.py
+async def discard_direct_upload(public_id: str):
+    """Delete a directly uploaded file that will not be recorded"""
+    try:
+        await asyncio.to_thread(cloudinary.uploader.destroy, public_id)
+    except Exception as e:
+        safe_log(f"Failed to delete direct upload {public_id} from Cloudinary: {e}", 'error')
+
+async def recorded_direct_upload(session_id: str, public_id: str, request: Request) -> Optional[FastJSONResponse]:
+    """Response for a retried confirmation of an upload that is already recorded
+
+    Only the guest who uploaded the photo gets its record back.
+    """
+    existing_photo = await crud.get_photo_by_filename(session_id, public_id)
+    if not existing_photo:
+        return None
+    if existing_photo.get("user_identifier") != generate_user_identifier(request, session_id):
+        raise HTTPException(status_code=409, detail=ALREADY_IN_SESSION_DETAIL)
+    return duplicate_upload_response(existing_photo)
+
+@app.post("/sessions/{session_id}/photos/direct", status_code=201)
+async def create_direct_upload(session_id: str, upload: schemas.DirectUploadRequest, request: Request):
+    """Reserve one upload and return signed parameters for sending the file straight to storage"""
+    try:
+        if not DIRECT_UPLOADS_ENABLED:
+            raise HTTPException(status_code=404, detail="Direct uploads are disabled")
+        try:
+            uuid.UUID(session_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid session ID format")
         
-        return {
-            "filename": result["public_id"], 
-            "url": result["secure_url"], 
-            "photo": db_photo
+        if upload.size <= 0:
+            raise HTTPException(status_code=400, detail="Empty file provided")
+        if upload.size > MAX_UPLOAD_FILE_SIZE:
+            raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_UPLOAD_FILE_SIZE//1024//1024}MB")
+        sanitized_filename = validate_upload_filename(upload.filename, upload.content_type)
+        
+        db_session = await crud.get_session(session_id=session_id)
+        if not db_session:
+            raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+        if not db_session.get("is_active", True):
+            raise HTTPException(status_code=400, detail="Session is inactive")
+        
+        # Unconfirmed tickets count against the limit until they expire
+        user_identifier = generate_user_identifier(request, session_id)
+        with span("user_stats_lookup"):
+            user_upload_stats, reserved_uploads = await asyncio.gather(
+                crud.get_user_upload_stats(session_id, user_identifier),
+                crud.count_active_upload_tickets(session_id, user_identifier)
+            )
+        current_user_uploads = user_upload_stats["upload_count"] if user_upload_stats else 0
+        photos_per_user_limit = db_session.get("photos_per_user_limit", 10)
+        if current_user_uploads + reserved_uploads >= photos_per_user_limit:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"You have reached your photo limit ({photos_per_user_limit} photos per user). You have uploaded {current_user_uploads} photos and have {reserved_uploads} uploads in progress."
+            )
+        
+        # The full path is signed as the public id, so the stored file lands
+        # exactly where the ticket says regardless of the account's folder mode
+        public_id = f"qr_sessions/{session_id}/{uuid.uuid4()}_{sanitized_filename.split('.')[0]}"
+        expires_at = datetime.utcnow() + timedelta(seconds=DIRECT_UPLOAD_TICKET_TTL_SECONDS)
+        ticket = await crud.create_upload_ticket({
+            "ticket_id": uuid.uuid4().hex,
+            "session_id": session_id,
+            "user_identifier": user_identifier,
+            "user_ip": get_user_ip(request),
+            "user_agent": get_user_agent(request),
+            "public_id": public_id,
+            "expires_at": expires_at
+        })
+        safe_log("Direct upload ticket %s issued for session %s", 'debug', ticket["ticket_id"], session_id)
+        
+        return FastJSONResponse({
+            "ticket_id": ticket["ticket_id"],
+            "upload_url": upload_url(),
+            "fields": sign_upload(public_id),
+            "confirm_url": f"/sessions/{session_id}/photos/direct/{ticket['ticket_id']}",
+            "expires_at": expires_at.isoformat() + "Z",
+            "max_file_size": MAX_UPLOAD_FILE_SIZE
+        }, status_code=201)
+    except HTTPException:
+        raise
+    except Exception as e:
+        safe_log(f"Error creating direct upload: {e}", 'error')
+        safe_log(traceback.format_exc(), 'error')
+        raise HTTPException(status_code=500, detail=f"Failed to create upload: {str(e)}")
+
+@app.post("/sessions/{session_id}/photos/direct/{ticket_id}")
+async def confirm_direct_upload(
+    session_id: str,
+    ticket_id: str,
+    upload: schemas.DirectUploadConfirm,
+    request: Request
+):
+    """Record a photo the client uploaded to storage with a direct upload ticket"""
+    try:
+        if not DIRECT_UPLOADS_ENABLED:
+            raise HTTPException(status_code=404, detail="Direct uploads are disabled")
+        
+        # Storage signs public_id and version with our API secret, so a valid
+        # signature proves the file was stored
+        if not verify_upload(upload.public_id, upload.version, upload.signature):
+            raise HTTPException(status_code=400, detail="Invalid upload signature")
+        
+        with span("ticket_lookup"):
+            ticket = await crud.get_upload_ticket(session_id, ticket_id)
+        if not ticket:
+            # A retried confirmation of an upload that is already recorded
+            recorded = await recorded_direct_upload(session_id, upload.public_id, request)
+            if recorded:
+                return recorded
+            raise HTTPException(status_code=404, detail="Upload ticket not found or expired")
+        if upload.public_id != ticket["public_id"]:
+            raise HTTPException(status_code=400, detail="Upload does not match the ticket")
+        
+        db_session = await crud.get_session(session_id=session_id)
+        if not db_session:
+            await discard_direct_upload(upload.public_id)
+            raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+        
+        # The signature does not cover size or dimensions, so they are read
+        # back from storage rather than taken from the client
+        with span("storage_lookup"):
+            asset = await asyncio.to_thread(stored_asset, upload.public_id)
+        if asset is None:
+            await crud.delete_upload_ticket(ticket_id)
+            raise HTTPException(status_code=400, detail="Upload not found in storage")
+        if asset.get("bytes", 0) > MAX_UPLOAD_FILE_SIZE:
+            await crud.delete_upload_ticket(ticket_id)
+            await discard_direct_upload(upload.public_id)
+            raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_UPLOAD_FILE_SIZE//1024//1024}MB")
+        
+        # Claim the ticket; a concurrent confirmation of the same upload loses here
+        if not await crud.delete_upload_ticket(ticket_id):
+            recorded = await recorded_direct_upload(session_id, upload.public_id, request)
+            if recorded:
+                return recorded
+            raise HTTPException(status_code=409, detail="Upload is already being confirmed")
+        
+        # The ticket reserved this upload, but regular uploads may have used
+        # up the limit since it was issued
+        user_identifier = ticket["user_identifier"]
+        user_upload_stats = await crud.get_user_upload_stats(session_id, user_identifier)
+        current_user_uploads = user_upload_stats["upload_count"] if user_upload_stats else 0
+        photos_per_user_limit = db_session.get("photos_per_user_limit", 10)
+        if current_user_uploads >= photos_per_user_limit:
+            await discard_direct_upload(upload.public_id)
+            raise HTTPException(
+                status_code=400, 
+                detail=f"You have reached your photo limit ({photos_per_user_limit} photos per user). You have uploaded {current_user_uploads} photos."
+            )
+        
+        result = {
+            "public_id": upload.public_id,
+            "secure_url": delivery_url(upload.public_id, upload.version, asset.get("format") or upload.format)
         }
+        thumbnail_fields = {"thumbnail_url": gallery_thumbnail_url(upload.public_id, upload.version)}
         
+        with span("db_insert"):
+            try:
+                photo_data = schemas.PhotoCreate(
+                    filename=upload.public_id,
+                    session_id=session_id,
+                    url=result["secure_url"],
+                    user_identifier=user_identifier,
+                    width=asset.get("width"),
+                    height=asset.get("height"),
+                    **thumbnail_fields
+                )
+                db_photo = await crud.create_photo(photo=photo_data)
+            except Exception as db_error:
+                # Hand the reservation back so the client can retry the confirmation
+                ticket.pop("_id", None)
+                await crud.create_upload_ticket(ticket)
+                safe_log(f"Database error: {db_error}", 'error')
+                safe_log(traceback.format_exc(), 'error')
+                raise HTTPException(status_code=500, detail=f"Failed to save photo record: {str(db_error)}")
+        
+        return await finish_photo_upload(
+            db_session, db_photo, result, thumbnail_fields,
+            user_identifier, ticket.get("user_ip"), ticket.get("user_agent")
+        )
     except HTTPException:
         raise
     except Exception as e:
-        safe_log(f"General upload error: {e}", 'error')
+        safe_log(f"Error confirming direct upload: {e}", 'error')
         safe_log(traceback.format_exc(), 'error')
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+@app.post("/sessions/{session_id}/photos/batch")
+async def upload_photo_batch(
+    session_id: str,
+    files: List[UploadFile] = File(..., description="Image files (max 10MB each)"),
+    request: Request = None
+):
+    """Upload several photos in one request"""
+    record_since_request_start("request_parse")
+    return await run_upload(session_id, request, lambda: store_photo_batch(session_id, files, request), weight=len(files))
+
+async def store_photo_batch(session_id: str, files: List[UploadFile], request: Request) -> FastJSONResponse:
+    """Validate a batch once, store its photos concurrently and record them together"""
+    try:
+        # Validate session ID format (UUID)
+        try:
+            uuid.UUID(session_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid session ID format")
+        
+        if not files:
+            raise HTTPException(status_code=400, detail="No files provided")
+        if len(files) > BATCH_UPLOAD_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"Too many files. Maximum is {BATCH_UPLOAD_MAX_FILES} per batch")
+        
+        safe_log("Attempting to upload %s photos for session: %s", 'debug', len(files), session_id)
+        
+        # Check if session exists
+        with span("session_lookup"):
+            db_session = await crud.get_session(session_id=session_id)
+        if not db_session:
+            raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+        
+        # Check if session is active
+        if not db_session.get("is_active", True):
+            raise HTTPException(status_code=400, detail="Session is inactive")
+        
+        user_identifier = generate_user_identifier(request, session_id)
+        user_ip = get_user_ip(request)
+        user_agent = get_user_agent(request)
+        
+        with span("user_stats_lookup"):
+            user_upload_stats = await crud.get_user_upload_stats(session_id, user_identifier)
+        current_user_uploads = user_upload_stats["upload_count"] if user_upload_stats else 0
+        photos_per_user_limit = db_session.get("photos_per_user_limit", 10)
+        
+        # Every file is validated before anything is stored
+        uploads = []
+        for file in files:
+            try:
+                contents, content_hash = await read_upload_file(file)
+            except HTTPException as e:
+                raise HTTPException(status_code=e.status_code, detail=f"{file.filename}: {e.detail}")
+            uploads.append((file, contents, content_hash))
+        
+        # Content already in the session, or repeated within the batch, is not stored again
+        with span("dedup_lookup"):
+            existing_photos = await crud.get_photos_by_content_hashes(session_id, [upload[2] for upload in uploads])
+        duplicates = []
+        failed = []
+        new_uploads = []
+        # Files repeating one of new_uploads; reported once that is stored
+        repeated = []
+        seen_hashes = set()
+        for file, contents, content_hash in uploads:
+            if content_hash in existing_photos or content_hash in seen_hashes:
+                metrics_collector.record_duplicate_upload(len(contents))
+                existing_photo = existing_photos.get(content_hash)
+                if existing_photo is None:
+                    repeated.append((file, content_hash))
+                    continue
+                if existing_photo.get("user_identifier") == user_identifier:
+                    duplicates.append(existing_photo_record(existing_photo))
+                else:
+                    failed.append({"filename": file.filename, "detail": ALREADY_IN_SESSION_DETAIL})
+                continue
+            seen_hashes.add(content_hash)
+            new_uploads.append((file, contents, content_hash))
+        
+        if current_user_uploads + len(new_uploads) > photos_per_user_limit:
+            raise HTTPException(
+                status_code=400,
+                detail=f"This batch would exceed your photo limit ({photos_per_user_limit} photos per user). You have uploaded {current_user_uploads} photos."
+            )
+        
+        # Upload to Cloudinary, a bounded number of files at a time
+        folder_name = f"qr_sessions/{session_id}"
+        semaphore = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+        
+        async def store_file(file: UploadFile, contents: bytes, content_hash: str) -> schemas.PhotoCreate:
+            async with semaphore:
+                public_id = f"{uuid.uuid4()}_{file.filename.split('.')[0]}"
+                contents = await image_normalizer.normalize(contents)
+                thumbnail_job = thumbnail_pipeline.render(contents)
+                try:
+                    result = await asyncio.to_thread(
+                        cloudinary.uploader.upload,
+                        contents,
+                        folder=folder_name,
+                        public_id=public_id,
+                        resource_type="image"
+                    )
+                except BaseException:
+                    if thumbnail_job is not None:
+                        # Nothing will store the renditions; free the pool slot
+                        thumbnail_job.cancel()
+                    raise
+                thumbnail_fields = {}
+                if thumbnail_job is not None:
+                    try:
+                        thumbnail_fields = await thumbnail_pipeline.store(thumbnail_job, folder_name, public_id)
+                    except Exception as thumbnail_error:
+                        safe_log(f"Thumbnail generation error: {thumbnail_error}", 'error')
+                return schemas.PhotoCreate(
+                    filename=result["public_id"],
+                    session_id=session_id,
+                    url=result["secure_url"],
+                    user_identifier=user_identifier,
+                    content_hash=content_hash,
+                    **thumbnail_fields
+                )
+        
+        with span("storage_upload"):
+            outcomes = await asyncio.gather(*(store_file(*upload) for upload in new_uploads), return_exceptions=True)
+        
+        stored_photos = []
+        for (file, _, _), outcome in zip(new_uploads, outcomes):
+            if isinstance(outcome, Exception):
+                safe_log(f"Cloudinary upload error for {file.filename}: {outcome}", 'error')
+                failed.append({"filename": file.filename, "detail": "Failed to upload to Cloudinary"})
+            else:
+                stored_photos.append(outcome)
+        
+        if not stored_photos and not duplicates:
+            if failed and all(entry["detail"] == ALREADY_IN_SESSION_DETAIL for entry in failed):
+                raise HTTPException(status_code=409, detail=ALREADY_IN_SESSION_DETAIL)
+            raise HTTPException(status_code=500, detail="Failed to upload photos to Cloudinary")
+        
+        # Save all photo records in one insert
+        with span("db_insert"):
+            try:
+                created_photos, conflicting_photos = await crud.create_photos(stored_photos)
+            except Exception as db_error:
+                safe_log(f"Database error: {db_error}", 'error')
+                safe_log(traceback.format_exc(), 'error')
+                raise HTTPException(status_code=500, detail=f"Failed to save photo records: {str(db_error)}")
+        
+        # Concurrent uploads of the same content won those inserts; drop our copies
+        winners = {}
+        if conflicting_photos:
+            for photo in conflicting_photos:
+                try:
+                    await asyncio.to_thread(cloudinary.uploader.destroy, photo.filename)
+                except Exception as e:
+                    safe_log(f"Failed to delete duplicate {photo.filename} from Cloudinary: {e}", 'error')
+                await destroy_thumbnails(photo.dict())
+                metrics_collector.record_duplicate_upload(0)
+            winners = await crud.get_photos_by_content_hashes(session_id, [photo.content_hash for photo in conflicting_photos])
+            for photo in conflicting_photos:
+                winner = winners.get(photo.content_hash)
+                if winner is None:
+                    continue
+                if winner.get("user_identifier") == user_identifier:
+                    duplicates.append(existing_photo_record(winner))
+                else:
+                    filename = next(file.filename for file, _, content_hash in new_uploads if content_hash == photo.content_hash)
+                    failed.append({"filename": filename, "detail": ALREADY_IN_SESSION_DETAIL})
+        
+        # Repeated files share the outcome of their first copy
+        if repeated:
+            stored_by_hash = {photo["content_hash"]: photo for photo in created_photos}
+            stored_by_hash.update(winners)
+            for file, content_hash in repeated:
+                photo = stored_by_hash.get(content_hash)
+                if photo is None:
+                    failed.append({"filename": file.filename, "detail": REPEATED_IN_BATCH_DETAIL})
+                elif photo.get("user_identifier") == user_identifier:
+                    duplicates.append(existing_photo_record(photo))
+                else:
+                    failed.append({"filename": file.filename, "detail": ALREADY_IN_SESSION_DETAIL})
+        
+        if created_photos:
+            count = len(created_photos)
+            
+            # Counters are updated once for the whole batch
+            with span("photo_count"):
+                try:
+                    await crud.increment_photo_count(session_id, count)
+                except Exception as count_error:
+                    safe_log(f"Error incrementing photo count: {count_error}", 'error')
+                    safe_log(traceback.format_exc(), 'error')
+            
+            with span("user_upload_record"):
+                try:
+                    await crud.create_or_update_user_upload(
+                        session_id=session_id,
+                        user_identifier=user_identifier,
+                        user_ip=user_ip,
+                        user_agent=user_agent,
+                        count=count
+                    )
+                except Exception as user_error:
+                    safe_log(f"Error recording user upload: {user_error}", 'error')
+                    safe_log(traceback.format_exc(), 'error')
+            
+            metrics_collector.record_photo_upload(count)
+            
+            # One notification for the whole batch
+            with span("notify"):
+                try:
+                    if db_session.get("owner_id"):
+                        photos = await crud.get_photos_by_session(session_id=session_id)
+                        latest = created_photos[-1]
+                        await websocket_manager.notify_photo_uploaded(session_id, db_session["owner_id"], {
+                            "filename": latest["filename"],
+                            "url": latest["url"],
+                            "thumbnail_url": latest.get("thumbnail_url"),
+                            "upload_count": len(photos),
+                            "batch_count": count,
+                            "uploaded_by": user_identifier[:8] + "..."
+                        })
+                except Exception as ws_error:
+                    safe_log(f"WebSocket notification error: {ws_error}", 'error')
+                    safe_log(traceback.format_exc(), 'error')
+        
+        # 207 when some files failed: the client retries those, so the
+        # response must not be replayed for its Idempotency-Key
+        return FastJSONResponse({
+            "photos": created_photos,
+            "duplicates": duplicates,
+            "failed": failed
+        }, status_code=207 if failed else 200)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        safe_log(f"General batch upload error: {e}", 'error')
+        safe_log(traceback.format_exc(), 'error')
+        raise HTTPException(status_code=500, detail=f"Batch upload failed: {str(e)}")
+
 @app.get("/sessions/{session_id}/photos")  
 async def get_session_photos(session_id: str, request: Request, current_user: dict = Depends(get_current_user_optional)):
     try:
@@ -751,7 +1461,7 @@ async def get_session_photos(session_id: str, request: Request, current_user: di
             
             # Get all photos first
             all_photos = await crud.get_photos_by_session(session_id=session_id)
-            safe_log(f"Found {len(all_photos)} total photos", 'debug')
+            safe_log("Found %s total photos", 'debug', len(all_photos))
             
             # Filter photos for this specific user
             user_photos = []
@@ -760,9 +1470,9 @@ async def get_session_photos(session_id: str, request: Request, current_user: di
                 # Include photo if it belongs to this user OR if it has no user_identifier (legacy photos)
                 if photo_user_id == user_identifier or not photo_user_id:
                     user_photos.append(photo)
-                    safe_log(f"Including photo: {photo.get('filename', 'unknown')} (user: {photo_user_id or 'legacy'})", 'debug')
+                    safe_log("Including photo: %s (user: %s)", 'debug', photo.get('filename', 'unknown'), photo_user_id or 'legacy')
             
-            safe_log(f"Regular user: filtered to {len(user_photos)} photos", 'debug')
+            safe_log("Regular user: filtered to %s photos", 'debug', len(user_photos))
             photos = user_photos
         
         # Prepare photo data with URLs
@@ -772,10 +1482,14 @@ async def get_session_photos(session_id: str, request: Request, current_user: di
                 "id": str(photo["_id"]) if "_id" in photo else str(photo.get("id", "")),
                 "filename": photo["filename"],
                 "url": photo.get("url", f"https://res.cloudinary.com/{os.getenv('CLOUDINARY_CLOUD_NAME')}/{photo['filename']}"),
+                "thumbnail_url": photo.get("thumbnail_url"),
+                "placeholder": photo.get("placeholder"),
+                "width": photo.get("width"),
+                "height": photo.get("height"),
                 "uploaded_at": photo["uploaded_at"]
             })
         
-        return photo_data
+        return FastJSONResponse(photo_data)
     except HTTPException:
         raise
     except Exception as e:
@@ -804,11 +1518,15 @@ async def get_all_session_photos(session_id: str, current_user: dict = Depends(g
                 "id": str(photo["_id"]) if "_id" in photo else str(photo.get("id", "")),
                 "filename": photo["filename"],
                 "url": photo.get("url", f"https://res.cloudinary.com/{os.getenv('CLOUDINARY_CLOUD_NAME')}/{photo['filename']}"),
+                "thumbnail_url": photo.get("thumbnail_url"),
+                "placeholder": photo.get("placeholder"),
+                "width": photo.get("width"),
+                "height": photo.get("height"),
                 "uploaded_at": photo["uploaded_at"],
                 "user_identifier": photo.get("user_identifier", "unknown")[:12] + "..." if photo.get("user_identifier") else "legacy"
             })
         
-        return photo_data
+        return FastJSONResponse(photo_data)
     except HTTPException:
         raise
     except Exception as e:
@@ -848,9 +1566,9 @@ async def delete_photo(session_id: str, photo_id: str, request: Request, current
             photo_user_id = photo.get("user_identifier")
             
             safe_log(f"Delete permission check:", 'debug')
-            safe_log(f"  Current user identifier: {user_identifier}", 'debug')
-            safe_log(f"  Photo user identifier: {photo_user_id}", 'debug')
-            safe_log(f"  Match: {photo_user_id == user_identifier}", 'debug')
+            safe_log("  Current user identifier: %s", 'debug', user_identifier)
+            safe_log("  Photo user identifier: %s", 'debug', photo_user_id)
+            safe_log("  Match: %s", 'debug', photo_user_id == user_identifier)
             
             # Allow deletion if photo has no user_identifier (legacy) or if it matches
             if photo_user_id and photo_user_id != user_identifier:
@@ -860,10 +1578,11 @@ async def delete_photo(session_id: str, photo_id: str, request: Request, current
         # Delete from Cloudinary
         try:
             cloudinary.uploader.destroy(photo["filename"])
-            safe_log(f"Deleted from Cloudinary: {photo['filename']}", 'debug')
+            safe_log("Deleted from Cloudinary: %s", 'debug', photo['filename'])
         except Exception as e:
             safe_log(f"Failed to delete from Cloudinary: {e}", 'error')
             # Continue anyway, delete from database
+        await destroy_thumbnails(photo)
         
         # Delete from database  
         result = await photos_collection.delete_one({"_id": ObjectId(sanitized_photo_id)})
@@ -873,7 +1592,7 @@ async def delete_photo(session_id: str, photo_id: str, request: Request, current
         # Update session photo count
         await crud.decrement_photo_count(session_id)
         
-        safe_log(f"Photo {photo_id} deleted successfully", 'debug')
+        safe_log("Photo %s deleted successfully", 'debug', photo_id)
         return {"message": "Photo deleted successfully"}
         
     except HTTPException:
@@ -888,11 +1607,7 @@ async def delete_photo(session_id: str, photo_id: str, request: Request, current
 async def get_all_sessions():
     try:
         sessions = await crud.get_all_sessions()
-        # Convert ObjectId to string for all sessions
-        for session in sessions:
-            if "_id" in session:
-                session["_id"] = str(session["_id"])
-        return sessions
+        return FastJSONResponse(sessions)
     except Exception as e:
         safe_log(f"Error getting all sessions: {e}", 'error')
         safe_log(traceback.format_exc(), 'error')
@@ -904,11 +1619,7 @@ async def get_user_sessions(current_user: UserResponse = Depends(require_authent
     """Get all sessions owned by the current user"""
     try:
         sessions = await crud.get_sessions_by_owner(current_user.user_id)
-        # Convert ObjectId to string for all sessions
-        for session in sessions:
-            if "_id" in session:
-                session["_id"] = str(session["_id"])
-        return sessions
+        return FastJSONResponse(sessions)
     except Exception as e:
         safe_log(f"Error getting user sessions: {e}", 'error')
         safe_log(traceback.format_exc(), 'error')
@@ -982,12 +1693,12 @@ async def get_session_user_stats(
                 "user_ip": stat.get("user_ip", "unknown")
             })
         
-        return {
+        return FastJSONResponse({
             "session_id": session_id,
             "total_unique_users": total_users,
             "photos_per_user_limit": photos_per_user_limit,
             "user_stats": formatted_stats
-        }
+        })
         
     except HTTPException:
         raise
@@ -1094,6 +1805,7 @@ async def delete_session(session_id: str, current_user: UserResponse = Depends(r
                 cloudinary.uploader.destroy(photo["filename"])
             except Exception as e:
                 safe_log(f"Failed to delete {photo['filename']} from Cloudinary: {e}", 'error')
+            await destroy_thumbnails(photo)
         
         # Delete from database
         success = await crud.delete_session(session_id)
@@ -0,0 +1,168 @@
+"""
+Admission control for upload requests
+
+Each worker stores at most UPLOAD_MAX_CONCURRENT photos at a time and queues
+up to UPLOAD_MAX_QUEUE more uploads. Anything beyond that, or an upload that
+waited UPLOAD_QUEUE_TIMEOUT_SECONDS without a slot, is answered with 503 and
+a Retry-After estimate. Under an upload burst the worker keeps a bounded
+amount of work in flight instead of slowing down for everyone.
+
+Uploads are admitted once their body has been received, so a slow client
+never holds a slot while it transfers. A batch takes one slot per file.
+Only the upload handlers admit here, so gallery and dashboard reads never
+queue behind guest uploads. Queued uploads from signed-in users are admitted
+before anonymous ones.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.utils.metrics import metrics_collector
+from app.utils.timing import span
+
+UPLOAD_ADMISSION_ENABLED = os.getenv("UPLOAD_ADMISSION_ENABLED", "true").lower() == "true"
+UPLOAD_MAX_CONCURRENT = int(os.getenv("UPLOAD_MAX_CONCURRENT", "8"))
+UPLOAD_MAX_QUEUE = int(os.getenv("UPLOAD_MAX_QUEUE", "32"))
+UPLOAD_QUEUE_TIMEOUT_SECONDS = float(os.getenv("UPLOAD_QUEUE_TIMEOUT_SECONDS", "10"))
+
+# Bounds of the Retry-After estimate, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+
+class AdmissionController:
+    """Weighted concurrency limit with a bounded two-level wait queue (per process)"""
+
+    # Weight of the latest upload in the moving average of upload durations
+    smoothing = 0.2
+
+    def __init__(
+        self,
+        max_concurrent: int = UPLOAD_MAX_CONCURRENT,
+        max_queue: int = UPLOAD_MAX_QUEUE,
+        queue_timeout: float = UPLOAD_QUEUE_TIMEOUT_SECONDS,
+        enabled: bool = UPLOAD_ADMISSION_ENABLED
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        self.active = 0
+        # priority -> (waiter, weight) in arrival order
+        self.waiters: Dict[bool, Deque[Tuple[asyncio.Future, int]]] = {True: deque(), False: deque()}
+        self.average_duration = 1.0
+
+    @property
+    def queued(self) -> int:
+        return len(self.waiters[True]) + len(self.waiters[False])
+
+    def _publish(self):
+        metrics_collector.update_upload_admission(self.active, self.queued)
+
+    def retry_after(self) -> int:
+        """Seconds until the queue has likely drained"""
+        estimate = self.average_duration * (self.queued + 1) / self.max_concurrent
+        return max(MIN_RETRY_AFTER, min(MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def _weight(self, weight: int) -> int:
+        # A batch larger than the limit runs alone rather than never
+        return max(1, min(weight, self.max_concurrent))
+
+    def _dispatch(self):
+        """Hand free slots to waiters in order, signed-in users first"""
+        for priority in (True, False):
+            queue = self.waiters[priority]
+            while queue:
+                waiter, weight = queue[0]
+                if waiter.done():
+                    queue.popleft()
+                    continue
+                if self.active + weight > self.max_concurrent:
+                    # Keep arrival order: later, smaller uploads don't overtake
+                    self._publish()
+                    return
+                queue.popleft()
+                self.active += weight
+                waiter.set_result(None)
+        self._publish()
+
+    async def acquire(self, priority: bool = False, weight: int = 1) -> Optional[str]:
+        """Wait for `weight` slots; returns None once admitted, else the rejection reason"""
+        weight = self._weight(weight)
+        if self.active + weight <= self.max_concurrent and not self.queued:
+            self.active += weight
+            self._publish()
+            metrics_collector.record_upload_admission_wait(0.0)
+            return None
+        if self.queued >= self.max_queue:
+            metrics_collector.record_upload_admission_rejected("queue_full")
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self.waiters[priority]
+        entry = (waiter, weight)
+        queue.append(entry)
+        self._publish()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as error:
+            if waiter.done() and not waiter.cancelled():
+                # The slots were granted just as the wait ended; pass them on
+                self.release(weight)
+            else:
+                if entry in queue:
+                    queue.remove(entry)
+                # A large waiter leaving may let smaller ones behind it in
+                self._dispatch()
+            if isinstance(error, asyncio.CancelledError):
+                raise
+            metrics_collector.record_upload_admission_rejected("timeout")
+            return "timeout"
+        metrics_collector.record_upload_admission_wait(time.perf_counter() - started)
+        return None
+
+    def release(self, weight: int = 1, duration: Optional[float] = None):
+        """Free `weight` slots and admit whoever now fits"""
+        weight = self._weight(weight)
+        if duration is not None:
+            # Per-slot duration, so batches don't inflate the Retry-After estimate
+            self.average_duration += self.smoothing * (duration / weight - self.average_duration)
+        self.active -= weight
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, priority: bool = False, weight: int = 1):
+        """Hold `weight` slots for the block; raises 503 with Retry-After if shed
+
+        Usage:
+            async with upload_admission.admit(priority=signed_in, weight=len(files)):
+                return await store(...)
+        """
+        if not self.enabled:
+            yield
+            return
+        with span("admission_wait"):
+            rejected = await self.acquire(priority, weight)
+        if rejected is not None:
+            retry_after = self.retry_after()
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": str(retry_after)}
+            )
+        admitted_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(weight, time.perf_counter() - admitted_at)
+
+
+# Global upload admission controller instance
+upload_admission = AdmissionController()
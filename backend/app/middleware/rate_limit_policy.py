@@ -0,0 +1,215 @@
+"""
+Declarative rate limit policy, compiled once against the app's routes
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.utils.logger import safe_log
+
+Limits = Tuple[int, int]  # (max_requests, window_seconds)
+
+# Budget of routes without an entry of their own
+DEFAULT_RULE = "default"
+
+# Limits are [max_requests, window_seconds] per auth tier. Routes are FastAPI
+# route templates; omitting "methods" applies the entry to every method.
+# Each entry is its own budget per client; routes without an entry share the
+# default budget. Override with a JSON file of the same shape via
+# RATE_LIMIT_POLICY_FILE.
+DEFAULT_POLICY = {
+    "default": {"anonymous": [100, 3600], "authenticated": [200, 3600]},
+    "exempt": ["/", "/health", "/docs", "/openapi.json", "/favicon.ico"],
+    "routes": [
+        # Uploads - more restrictive
+        {"route": "/sessions/{session_id}/photos", "methods": ["POST"],
+         "anonymous": [10, 600], "authenticated": [20, 600]},
+        # Batch uploads carry up to BATCH_UPLOAD_MAX_FILES photos each
+        {"route": "/sessions/{session_id}/photos/batch", "methods": ["POST"],
+         "anonymous": [5, 900], "authenticated": [10, 900]},
+        # Resumable uploads: creating one counts like an upload; each photo then
+        # takes several PATCH/HEAD requests, on their own window
+        {"route": "/sessions/{session_id}/uploads", "methods": ["POST"],
+         "anonymous": [10, 600], "authenticated": [20, 600]},
+        {"route": "/sessions/{session_id}/uploads/{upload_id}",
+         "anonymous": [400, 1800], "authenticated": [800, 1800]},
+        # Direct uploads: a ticket counts like an upload; the confirmation is a
+        # small JSON request, on its own window
+        {"route": "/sessions/{session_id}/photos/direct", "methods": ["POST"],
+         "anonymous": [10, 600], "authenticated": [20, 600]},
+        {"route": "/sessions/{session_id}/photos/direct/{ticket_id}", "methods": ["POST"],
+         "anonymous": [30, 1200], "authenticated": [60, 1200]},
+        # Prometheus scrapes (every 10s is 360/h, see monitoring/prometheus.yml);
+        # limited so the token cannot be guessed at full speed
+        {"route": "/metrics", "methods": ["GET"],
+         "anonymous": [600, 3600], "authenticated": [600, 3600]},
+        # Session creation
+        {"route": "/sessions/", "methods": ["POST"],
+         "anonymous": [20, 3600], "authenticated": [40, 3600]},
+        # Authentication endpoints
+        {"route": "/auth/me", "anonymous": [100, 3600], "authenticated": [200, 3600]},
+        {"route": "/auth/google/callback", "anonymous": [20, 300], "authenticated": [20, 300]},
+        {"route": "/auth/google", "anonymous": [15, 300], "authenticated": [15, 300]},
+        {"route": "/auth/logout", "anonymous": [10, 300], "authenticated": [10, 300]},
+        # Admin endpoints - very restrictive for anonymous
+        {"route": "/admin/sessions/", "anonymous": [5, 300], "authenticated": [50, 3600]},
+        {"route": "/admin/sessions/{session_id}", "anonymous": [5, 300], "authenticated": [50, 3600]},
+        {"route": "/admin/sessions/{session_id}/photo-limit", "anonymous": [5, 300], "authenticated": [50, 3600]},
+        {"route": "/admin/sessions/{session_id}/user-stats", "anonymous": [5, 300], "authenticated": [50, 3600]},
+    ],
+}
+
+ALL_METHODS = "*"
+
+
+def rule_name(entry: dict) -> str:
+    """Budget name of a policy entry, e.g. "POST /sessions/{session_id}/photos" """
+    methods = entry.get("methods")
+    if not methods:
+        return entry["route"]
+    return f"{','.join(sorted(method.upper() for method in methods))} {entry['route']}"
+
+
+def load_policy() -> dict:
+    """Load the policy from RATE_LIMIT_POLICY_FILE, or the built-in default"""
+    policy_file = os.getenv("RATE_LIMIT_POLICY_FILE")
+    if not policy_file:
+        return DEFAULT_POLICY
+    with open(policy_file, encoding="utf-8") as file:
+        return json.load(file)
+
+
+class _Node:
+    __slots__ = ("static", "param", "methods")
+
+    def __init__(self):
+        self.static: Dict[str, "_Node"] = {}
+        self.param: Optional["_Node"] = None
+        # method -> route template ending at this node
+        self.methods: Dict[str, str] = {}
+
+
+class CompiledRateLimitPolicy:
+    """Resolves (method, path) to a route template, its limits and its budget.
+
+    Route templates are taken from the app's registered routes and compiled
+    into a segment trie; limits for each (template, method) are resolved up
+    front. Results are memoized per (method, path), so a client polling the
+    same URLs costs one dict lookup. On a miss the path is reduced to a shape
+    (segments that are not static in any route become "*"), which is memoized
+    too, so new ids in known routes skip the trie walk.
+    """
+
+    max_cached_shapes = 4096
+    max_cached_paths = 16384
+
+    def __init__(self, policy: dict, route_templates: Iterable[Tuple[str, Iterable[str]]], multiplier: int = 1):
+        self.root = _Node()
+        self.exempt = set(policy.get("exempt", []))
+        self.static_segments = {""}
+        # (method, shape or path) -> (template, (anonymous, authenticated), rule)
+        self.cache: Dict[Tuple[str, str], Tuple[Optional[str], Tuple[Limits, Limits], str]] = {}
+        self.path_cache: Dict[Tuple[str, str], Tuple[Optional[str], Tuple[Limits, Limits], str]] = {}
+
+        def scaled(limits) -> Limits:
+            return int(limits[0]) * multiplier, int(limits[1])
+
+        self.default = (scaled(policy["default"]["anonymous"]), scaled(policy["default"]["authenticated"]))
+
+        known_templates = set()
+        for template, methods in route_templates:
+            known_templates.add(template)
+            self._insert(template, methods)
+
+        # (template, method) -> ((anonymous limits, authenticated limits), rule)
+        self.limits: Dict[Tuple[str, str], Tuple[Tuple[Limits, Limits], str]] = {}
+        for entry in policy.get("routes", []):
+            if entry["route"] not in known_templates:
+                safe_log(f"Rate limit policy references unknown route: {entry['route']}", 'warning')
+            tiers = (scaled(entry["anonymous"]), scaled(entry["authenticated"]))
+            for method in entry.get("methods") or [ALL_METHODS]:
+                self.limits[(entry["route"], method.upper())] = (tiers, rule_name(entry))
+
+    def _insert(self, template: str, methods: Iterable[str]):
+        node = self.root
+        for segment in template.split("/")[1:]:
+            if segment.startswith("{") and segment.endswith("}"):
+                if node.param is None:
+                    node.param = _Node()
+                node = node.param
+            else:
+                node = node.static.setdefault(segment, _Node())
+                self.static_segments.add(segment)
+        for method in methods:
+            node.methods.setdefault(method, template)
+
+    def resolve(self, method: str, path: str) -> Optional[str]:
+        """Route template for a request path, or None if no route matches"""
+        segments = path.split("/")[1:]
+        fallback: List[str] = []
+
+        def walk(node: _Node, index: int) -> Optional[str]:
+            if index == len(segments):
+                if method in node.methods:
+                    return node.methods[method]
+                if node.methods and not fallback:
+                    # Path matches but method does not (405); keep looking
+                    fallback.append(next(iter(node.methods.values())))
+                return None
+            child = node.static.get(segments[index])
+            if child is not None:
+                found = walk(child, index + 1)
+                if found is not None:
+                    return found
+            if node.param is not None and segments[index]:
+                return walk(node.param, index + 1)
+            return None
+
+        return walk(self.root, 0) or (fallback[0] if fallback else None)
+
+    def lookup(
+        self, method: str, path: str, is_authenticated: bool = False
+    ) -> Tuple[Optional[str], Optional[Limits], Optional[str]]:
+        """
+        Resolve limits for a request
+
+        Returns:
+            Tuple of (route_template, limits, rule); limits and rule are None
+            for exempt paths. Requests with the same rule share one budget.
+        """
+        cached = self.path_cache.get((method, path))
+        if cached is None:
+            if path in self.exempt:
+                return path, None, None
+            cached = self._lookup_shape(method, path)
+            if len(self.path_cache) >= self.max_cached_paths:
+                self.path_cache.clear()
+            self.path_cache[(method, path)] = cached
+
+        template, tiers, rule = cached
+        return template, tiers[1] if is_authenticated else tiers[0], rule
+
+    def _lookup_shape(self, method: str, path: str) -> Tuple[Optional[str], Tuple[Limits, Limits], str]:
+        static = self.static_segments
+        shape = "/".join([segment if segment in static else "*" for segment in path.split("/")])
+        cached = self.cache.get((method, shape))
+        if cached is None:
+            template = self.resolve(method, path)
+            tiers, rule = (
+                self.limits.get((template, method)) or self.limits.get((template, ALL_METHODS))
+                or (self.default, DEFAULT_RULE)
+            )
+            if len(self.cache) >= self.max_cached_shapes:
+                self.cache.clear()
+            cached = self.cache[(method, shape)] = (template, tiers, rule)
+        return cached
+
+
+def route_templates_from_app(routes) -> List[Tuple[str, List[str]]]:
+    """(path template, methods) pairs for the app's HTTP routes"""
+    templates = []
+    for route in routes:
+        methods = getattr(route, "methods", None)
+        if methods:
+            templates.append((route.path, list(methods)))
+    return templates
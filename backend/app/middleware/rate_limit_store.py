@@ -0,0 +1,179 @@
+"""
+Pluggable storage backends for rate limiting
+"""
+import heapq
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+from app.utils.redis_fallback import RedisFallback
+
+# Sliding-window counter: the previous fixed window's count is weighted by how
+# much of it still overlaps the sliding window. A client that exceeds the
+# limit is blocked for a full window, matching the in-process behaviour.
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+
+local blocked_until = tonumber(redis.call('GET', KEYS[1]) or '0')
+if blocked_until > now then
+    return {0, 0, math.ceil(blocked_until - now)}
+end
+
+local current = tonumber(redis.call('GET', KEYS[2]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[3]) or '0')
+local overlap = 1 - ((now % window) / window)
+local estimated = math.floor(previous * overlap) + current
+
+if estimated >= limit then
+    redis.call('SET', KEYS[1], tostring(now + window), 'EX', window)
+    return {0, 0, window}
+end
+
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], window * 2)
+return {1, limit - estimated - 1, 0}
+"""
+
+
+class RateLimitStore(ABC):
+    """Backend that records requests and decides whether a client is over its limit"""
+
+    @abstractmethod
+    async def hit(self, key: str, max_requests: int, window_seconds: int, now: float) -> Tuple[bool, int, int]:
+        """
+        Record a request for a client key
+
+        Returns:
+            Tuple of (is_allowed, remaining, retry_after_seconds)
+        """
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        """Number of tracked and currently blocked keys (None if unknown)"""
+        return {"active_limits": None, "currently_blocked": None}
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Per-process store; limits are not shared between workers.
+
+    Uses GCRA, so each key holds just two floats: the theoretical arrival time
+    of the next request and the end of an active block. Keys whose state has
+    fully drained are swept every `sweep_interval` seconds. A new key never
+    takes the store past `max_keys`: it first evicts drained keys, then the
+    unblocked keys closest to draining, and blocked keys only as a last
+    resort, so a flood of fresh keys cannot lift existing blocks.
+    """
+
+    sweep_interval = 60.0
+    # Share of max_keys freed when the cap is hit, so eviction is amortized
+    evict_fraction = 0.1
+
+    def __init__(self, max_keys: int = None):
+        self.max_keys = max_keys or int(os.getenv("RATE_LIMIT_MAX_KEYS", 200_000))
+        # key -> (theoretical arrival time, blocked until)
+        self.state: Dict[str, Tuple[float, float]] = {}
+        self.next_sweep = 0.0
+
+    async def hit(self, key: str, max_requests: int, window_seconds: int, now: float) -> Tuple[bool, int, int]:
+        if now >= self.next_sweep:
+            self.sweep(now)
+
+        key = f"{key}:{window_seconds}"
+        state = self.state.get(key)
+        if state is None:
+            if len(self.state) >= self.max_keys:
+                self.shrink(now, self.max_keys - max(1, int(self.max_keys * self.evict_fraction)))
+            state = (now, 0.0)
+        tat, blocked_until = state
+
+        # Check if client is temporarily blocked
+        if blocked_until > now:
+            return False, 0, int(blocked_until - now)
+
+        # Each request advances the arrival time by one emission interval; the
+        # limit is reached when it runs a full window ahead of the clock
+        emission_interval = window_seconds / max_requests
+        new_tat = max(tat, now) + emission_interval
+        if new_tat - now > window_seconds + 1e-9:
+            # Block client for window duration
+            self.state[key] = (tat, now + window_seconds)
+            return False, 0, window_seconds
+
+        self.state[key] = (new_tat, 0.0)
+        remaining = int((window_seconds - (new_tat - now)) / emission_interval + 1e-9)
+        return True, remaining, 0
+
+    def sweep(self, now: float) -> int:
+        """Evict keys whose limits have fully reset; returns the number removed"""
+        removed = self.shrink(now, self.max_keys)
+        self.next_sweep = now + self.sweep_interval
+        return removed
+
+    def shrink(self, now: float, target: int) -> int:
+        """Drop drained keys, then evict down to `target` keys; returns the number removed"""
+        # Rebuild rather than delete in place so the dict's table shrinks too
+        live = {
+            key: value for key, value in self.state.items()
+            if value[0] > now or value[1] > now
+        }
+
+        overflow = len(live) - max(0, target)
+        if overflow > 0:
+            # Unblocked keys with the least budget used lose the least
+            unblocked = [key for key, value in live.items() if value[1] <= now]
+            for key in heapq.nsmallest(overflow, unblocked, key=lambda key: live[key][0]):
+                del live[key]
+            overflow = len(live) - max(0, target)
+        if overflow > 0:
+            # Only blocked keys are left; release the ones closest to expiring
+            for key in heapq.nsmallest(overflow, live, key=lambda key: live[key][1]):
+                del live[key]
+
+        removed = len(self.state) - len(live)
+        self.state = live
+        return removed
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        now = time.time()
+        blocked = sum(1 for _, blocked_until in self.state.values() if blocked_until > now)
+        return {"active_limits": len(self.state), "currently_blocked": blocked}
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """Shared store backed by Redis; one atomic Lua call per request.
+
+    Falls back to an in-process store while Redis is unreachable so an outage
+    degrades to per-worker limits instead of failing every request.
+    """
+
+    def __init__(self, url: str, prefix: str = "rl"):
+        self.redis = RedisFallback(url, "Rate limit store", "in-process limits")
+        self.prefix = prefix
+        self.script = self.redis.client.register_script(SLIDING_WINDOW_SCRIPT)
+        self.fallback = MemoryRateLimitStore()
+
+    async def hit(self, key: str, max_requests: int, window_seconds: int, now: float) -> Tuple[bool, int, int]:
+        window_index = int(now // window_seconds)
+        # Hash tag keeps all keys of one client in the same cluster slot
+        base = f"{self.prefix}:{{{key}}}:{window_seconds}"
+        keys = [f"{base}:blocked", f"{base}:{window_index}", f"{base}:{window_index - 1}"]
+
+        async def shared():
+            allowed, remaining, retry_after = await self.script(
+                keys=keys, args=[max_requests, window_seconds, repr(now)]
+            )
+            return bool(allowed), int(remaining), int(retry_after)
+
+        return await self.redis.run(
+            shared, lambda: self.fallback.hit(key, max_requests, window_seconds, now)
+        )
+
+
+def create_rate_limit_store() -> RateLimitStore:
+    """Create the configured store (Redis when RATE_LIMIT_REDIS_URL is set)"""
+    redis_url = os.getenv("RATE_LIMIT_REDIS_URL") or os.getenv("REDIS_URL")
+    if redis_url:
+        return RedisRateLimitStore(redis_url)
+    return MemoryRateLimitStore()
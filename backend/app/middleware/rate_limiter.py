@@ -1,18 +1,22 @@
 from fastapi import HTTPException, Request
-from fastapi.responses import JSONResponse
 import time
 import os
-from typing import Dict, Tuple
-import asyncio
-from collections import defaultdict, deque
+from typing import Dict, Optional, Tuple
 import hashlib
+from datetime import datetime
+from app.middleware.rate_limit_store import RateLimitStore, create_rate_limit_store
+from app.middleware.rate_limit_policy import DEFAULT_RULE, CompiledRateLimitPolicy, load_policy, route_templates_from_app
+from app.utils.analytics import HyperLogLog, RingBuffer, SpaceSaving, hash64
+from app.utils.metrics import metrics_collector
+
+# Number of heavy hitters (endpoints/users) tracked per analytics bucket
+ANALYTICS_TOP_K = 20
 
 class RateLimiter:
-    """Simple in-memory rate limiter"""
+    """Rate limiter with a pluggable (optionally shared) store"""
     
-    def __init__(self):
-        self.requests: Dict[str, deque] = defaultdict(deque)
-        self.blocked: Dict[str, float] = {}
+    def __init__(self, store: RateLimitStore = None):
+        self.store = store or create_rate_limit_store()
     
     def _get_client_key(self, request: Request, user_id: str = None) -> str:
         """Generate a unique key for the client (user-based or IP-based)"""
@@ -35,7 +39,10 @@ class RateLimiter:
         key_string = f"anon:{client_ip}:{user_agent[:50]}"
         return hashlib.sha256(key_string.encode()).hexdigest()[:16]
     
-    def is_allowed(self, request: Request, max_requests: int = 100, window_seconds: int = 3600, user_id: str = None) -> Tuple[bool, dict]:
+    async def is_allowed(
+        self, request: Request, max_requests: int = 100, window_seconds: int = 3600, user_id: str = None,
+        rule: str = DEFAULT_RULE
+    ) -> Tuple[bool, dict]:
         """
         Check if request is allowed based on rate limits
         
@@ -44,47 +51,25 @@ class RateLimiter:
             max_requests: Maximum requests allowed in window
             window_seconds: Time window in seconds
             user_id: Authenticated user ID (if available)
+            rule: Policy rule whose budget the request uses
             
         Returns:
             Tuple of (is_allowed, info_dict)
         """
-        client_key = self._get_client_key(request, user_id)
+        # One budget per client and rule, so routes never share a counter
+        client_key = f"{self._get_client_key(request, user_id)}:{rule}"
         current_time = time.time()
         
-        # Check if client is temporarily blocked
-        if client_key in self.blocked:
-            if current_time < self.blocked[client_key]:
-                remaining = int(self.blocked[client_key] - current_time)
-                return False, {
-                    "error": "Rate limit exceeded",
-                    "retry_after": remaining,
-                    "limit": max_requests,
-                    "window": window_seconds
-                }
-            else:
-                # Unblock client
-                del self.blocked[client_key]
-        
-        # Clean old requests outside the window
-        request_times = self.requests[client_key]
-        while request_times and request_times[0] < current_time - window_seconds:
-            request_times.popleft()
+        allowed, remaining, retry_after = await self.store.hit(client_key, max_requests, window_seconds, current_time)
         
-        # Check if limit exceeded
-        if len(request_times) >= max_requests:
-            # Block client for window duration
-            self.blocked[client_key] = current_time + window_seconds
+        if not allowed:
             return False, {
                 "error": "Rate limit exceeded",
-                "retry_after": window_seconds,
+                "retry_after": retry_after,
                 "limit": max_requests,
                 "window": window_seconds
             }
         
-        # Add current request
-        request_times.append(current_time)
-        
-        remaining = max_requests - len(request_times)
         return True, {
             "limit": max_requests,
             "remaining": remaining,
@@ -92,44 +77,34 @@ class RateLimiter:
             "reset_time": int(current_time + window_seconds)
         }
 
-# Global rate limiter instance
-rate_limiter = RateLimiter()
-
-def create_rate_limit_middleware(max_requests: int = 100, window_seconds: int = 3600):
-    """Create rate limiting middleware"""
+class RateLimitBucket:
+    """Rate limiting analytics for one time bucket, in fixed memory"""
     
-    async def rate_limit_middleware(request: Request, call_next):
-        # Skip rate limiting for certain paths
-        skip_paths = ["/health", "/docs", "/openapi.json", "/favicon.ico"]
-        if request.url.path in skip_paths:
-            response = await call_next(request)
-            return response
-        
-        # Check rate limit
-        is_allowed, info = rate_limiter.is_allowed(request, max_requests, window_seconds)
-        
-        if not is_allowed:
-            return JSONResponse(
-                status_code=429,
-                content=info,
-                headers={
-                    "Retry-After": str(info.get("retry_after", window_seconds)),
-                    "X-RateLimit-Limit": str(max_requests),
-                    "X-RateLimit-Window": str(window_seconds)
-                }
-            )
-        
-        # Process request
-        response = await call_next(request)
-        
-        # Add rate limit headers to response
-        response.headers["X-RateLimit-Limit"] = str(info["limit"])
-        response.headers["X-RateLimit-Remaining"] = str(info["remaining"])
-        response.headers["X-RateLimit-Reset"] = str(info["reset_time"])
-        
-        return response
+    __slots__ = ('total', 'blocked', 'unique_users', 'endpoints', 'users')
+    
+    def __init__(self):
+        self.total = 0
+        self.blocked = 0
+        self.unique_users = HyperLogLog()
+        self.endpoints = SpaceSaving(ANALYTICS_TOP_K)
+        self.users = SpaceSaving(ANALYTICS_TOP_K)
     
-    return rate_limit_middleware
+    def record(self, endpoint: str, user_id: str = None, user_hash: int = None, blocked: bool = False):
+        self.total += 1
+        if blocked:
+            self.blocked += 1
+        self.endpoints.add(endpoint)
+        if user_id:
+            self.unique_users.add_hash(user_hash)
+            self.users.add(user_id)
+    
+    def to_dict(self) -> dict:
+        return {
+            'total': self.total,
+            'blocked': self.blocked,
+            'unique_users': self.unique_users.count(),
+            'endpoints': dict(self.endpoints.top())
+        }
 
 # Specific rate limiters for different endpoints
 class APIRateLimiter:
@@ -137,168 +112,123 @@ class APIRateLimiter:
     
     def __init__(self):
         self.limiter = RateLimiter()
-        self.analytics = {
-            'total_requests': 0,
-            'blocked_requests': 0,
-            'endpoint_stats': {},
-            'user_stats': {},
-            'hourly_stats': {}
-        }
+        # Declarative limits; compiled against the app's routes on first use
+        self.policy_config = load_policy()
+        self.exempt_paths = set(self.policy_config.get("exempt", []))
+        self.policy: Optional[CompiledRateLimitPolicy] = None
+        self.total_requests = 0
+        self.blocked_requests = 0
+        # Rolling analytics: last hour by minute, last day by hour
+        self.minute_stats = RingBuffer(60, 60, RateLimitBucket, on_rollover=self._publish_minute)
+        self.hourly_stats = RingBuffer(3600, 24, RateLimitBucket)
     
     def _is_development_environment(self) -> bool:
         """Check if running in development environment"""
         env = os.getenv('NODE_ENV', '').lower()
         return env in ['development', 'dev'] or os.getenv('DEBUG', '').lower() in ['true', '1']
     
-    def _apply_environment_multiplier(self, base_limits: Tuple[int, int]) -> Tuple[int, int]:
-        """Apply environment-specific multipliers to base limits"""
-        max_requests, window_seconds = base_limits
-        
-        if self._is_development_environment():
-            # Development: 3x higher limits for easier development
-            return (max_requests * 3, window_seconds)
-        
-        return base_limits
+    def _environment_multiplier(self) -> int:
+        """Development: 3x higher limits for easier development"""
+        return 3 if self._is_development_environment() else 1
     
-    def get_limits_for_endpoint(self, path: str, method: str, user_id: str = None) -> Tuple[int, int]:
-        """Get rate limits for specific endpoint with environment and user awareness"""
-        is_authenticated = user_id is not None
-        
-        # Base limits for production with user-based adjustment
-        base_limits = self._get_base_limits(path, method, is_authenticated)
-        
-        # Apply environment-specific adjustments
-        return self._apply_environment_multiplier(base_limits)
+    def compile_policy(self, routes):
+        """Compile the rate limit policy against the app's registered routes"""
+        self.policy = CompiledRateLimitPolicy(
+            self.policy_config,
+            route_templates_from_app(routes),
+            multiplier=self._environment_multiplier()
+        )
     
-    def _get_base_limits(self, path: str, method: str, is_authenticated: bool = False) -> Tuple[int, int]:
-        """Get base rate limits for specific endpoint"""
-        # Authenticated users get higher limits
-        auth_multiplier = 2 if is_authenticated else 1
-        
-        # Upload endpoints - more restrictive
-        if "/upload" in path:
-            base_limit = 10 if not is_authenticated else 20
-            return base_limit, 600  # Anonymous: 10/10min, Auth: 20/10min
-        
-        # Authentication endpoints - granular limits
-        elif "/auth" in path:
-            if "/auth/me" in path:
-                base_limit = 100 if not is_authenticated else 200
-                return base_limit, 3600  # Anonymous: 100/hour, Auth: 200/hour
-            elif "/auth/google/callback" in path:
-                return 20, 300   # OAuth callback: same for all
-            elif "/auth/google" in path:
-                return 15, 300   # OAuth initiation: same for all
-            elif "/auth/logout" in path:
-                return 10, 300   # Logout: same for all
-            else:
-                base_limit = 30 * auth_multiplier
-                return base_limit, 300   # Other auth endpoints
-        
-        # Session creation
-        elif path.startswith("/sessions") and method == "POST":
-            base_limit = 20 * auth_multiplier
-            return base_limit, 3600  # Anonymous: 20/hour, Auth: 40/hour
-        
-        # Admin endpoints - only for authenticated users
-        elif "/admin" in path:
-            if not is_authenticated:
-                return 5, 300  # Very restrictive for anonymous
-            return 50, 3600  # 50/hour for authenticated users
+    def is_exempt(self, path: str) -> bool:
+        """Check if a path skips rate limiting entirely"""
+        return path in self.exempt_paths
+    
+    def get_limits_for_request(
+        self, request: Request, user_id: str = None
+    ) -> Tuple[Optional[str], Optional[Tuple[int, int]], Optional[str]]:
+        """
+        Resolve the route template, rate limits and budget rule for a request
         
-        # Default limits
-        else:
-            base_limit = 100 * auth_multiplier
-            return base_limit, 3600  # Anonymous: 100/hour, Auth: 200/hour
+        Returns:
+            Tuple of (route_template, (max_requests, window_seconds), rule);
+            the template is None for unknown routes, limits and rule are None
+            if exempt
+        """
+        if self.policy is None:
+            self.compile_policy(request.app.routes)
+        return self.policy.lookup(request.method, request.scope["path"], user_id is not None)
+    
+    def get_limits_for_endpoint(self, path: str, method: str, user_id: str = None) -> Optional[Tuple[int, int]]:
+        """Get rate limits for specific endpoint (requires a compiled policy)"""
+        return self.policy.lookup(method, path, user_id is not None)[1]
     
     def record_request(self, endpoint: str, user_id: str = None, blocked: bool = False):
         """Record analytics data for rate limiting"""
-        import time
-        from datetime import datetime
+        now = time.time()
+        user_hash = hash64(user_id) if user_id else None
         
         # Update total counters
-        self.analytics['total_requests'] += 1
-        if blocked:
-            self.analytics['blocked_requests'] += 1
-        
-        # Update endpoint stats
-        if endpoint not in self.analytics['endpoint_stats']:
-            self.analytics['endpoint_stats'][endpoint] = {
-                'total': 0, 'blocked': 0, 'last_request': None
-            }
-        
-        endpoint_stats = self.analytics['endpoint_stats'][endpoint]
-        endpoint_stats['total'] += 1
+        self.total_requests += 1
         if blocked:
-            endpoint_stats['blocked'] += 1
-        endpoint_stats['last_request'] = datetime.now().isoformat()
+            self.blocked_requests += 1
         
-        # Update user stats (if authenticated)
-        if user_id:
-            if user_id not in self.analytics['user_stats']:
-                self.analytics['user_stats'][user_id] = {
-                    'total': 0, 'blocked': 0, 'endpoints': {}, 'last_request': None
-                }
-            
-            user_stats = self.analytics['user_stats'][user_id]
-            user_stats['total'] += 1
-            if blocked:
-                user_stats['blocked'] += 1
-            user_stats['last_request'] = datetime.now().isoformat()
-            
-            # Track per-endpoint usage for this user
-            if endpoint not in user_stats['endpoints']:
-                user_stats['endpoints'][endpoint] = 0
-            user_stats['endpoints'][endpoint] += 1
+        # Update rolling per-minute and per-hour buckets
+        self.minute_stats.bucket(now).record(endpoint, user_id, user_hash, blocked)
+        self.hourly_stats.bucket(now).record(endpoint, user_id, user_hash, blocked)
         
-        # Update hourly stats
-        current_hour = datetime.now().strftime('%Y-%m-%d-%H')
-        if current_hour not in self.analytics['hourly_stats']:
-            self.analytics['hourly_stats'][current_hour] = {
-                'total': 0, 'blocked': 0, 'unique_users': set(), 'endpoints': {}
-            }
-        
-        hourly_stats = self.analytics['hourly_stats'][current_hour]
-        hourly_stats['total'] += 1
+        user_type = "authenticated" if user_id else "anonymous"
+        metrics_collector.record_rate_limit_request(blocked, user_type)
         if blocked:
-            hourly_stats['blocked'] += 1
-        if user_id:
-            hourly_stats['unique_users'].add(user_id)
-        
-        if endpoint not in hourly_stats['endpoints']:
-            hourly_stats['endpoints'][endpoint] = 0
-        hourly_stats['endpoints'][endpoint] += 1
+            metrics_collector.record_rate_limit_hit(endpoint, user_type)
+    
+    def _publish_minute(self, bucket: RateLimitBucket):
+        """Export a completed minute bucket to Prometheus"""
+        metrics_collector.update_rate_limit_last_minute(
+            allowed=bucket.total - bucket.blocked,
+            blocked=bucket.blocked,
+            unique_users=bucket.unique_users.count()
+        )
     
     def get_analytics_summary(self) -> dict:
         """Get rate limiting analytics summary"""
-        from datetime import datetime, timedelta
-        
-        # Convert sets to counts for JSON serialization
-        hourly_stats_serializable = {}
-        for hour, stats in self.analytics['hourly_stats'].items():
-            hourly_stats_serializable[hour] = {
-                **stats,
-                'unique_users': len(stats['unique_users'])
-            }
+        now = time.time()
+        
+        # Fold the last 24 hours into one view
+        hourly_buckets = self.hourly_stats.items(now)
+        unique_users = HyperLogLog()
+        top_endpoints = SpaceSaving(ANALYTICS_TOP_K)
+        top_users = SpaceSaving(ANALYTICS_TOP_K)
+        for _, bucket in hourly_buckets:
+            unique_users.merge(bucket.unique_users)
+            top_endpoints.merge(bucket.endpoints)
+            top_users.merge(bucket.users)
         
         # Calculate rates
-        total_requests = self.analytics['total_requests']
-        blocked_requests = self.analytics['blocked_requests']
+        total_requests = self.total_requests
+        blocked_requests = self.blocked_requests
         block_rate = (blocked_requests / total_requests * 100) if total_requests > 0 else 0
+        store_stats = self.limiter.store.stats()
         
         return {
             'summary': {
                 'total_requests': total_requests,
                 'blocked_requests': blocked_requests,
                 'block_rate_percentage': round(block_rate, 2),
-                'active_endpoints': len(self.analytics['endpoint_stats']),
-                'tracked_users': len(self.analytics['user_stats'])
+                'active_endpoints': len(top_endpoints.counts),
+                'tracked_users': unique_users.count()
+            },
+            'endpoint_stats': dict(top_endpoints.top()),
+            'user_stats': dict(top_users.top()),
+            'minute_stats': {
+                datetime.fromtimestamp(start).strftime('%Y-%m-%d-%H:%M'): bucket.to_dict()
+                for start, bucket in self.minute_stats.items(now)
+            },
+            'hourly_stats': {
+                datetime.fromtimestamp(start).strftime('%Y-%m-%d-%H'): bucket.to_dict()
+                for start, bucket in hourly_buckets
             },
-            'endpoint_stats': self.analytics['endpoint_stats'],
-            'user_stats': self.analytics['user_stats'],
-            'hourly_stats': hourly_stats_serializable,
-            'current_active_limits': len(self.limiter.requests),
-            'currently_blocked': len(self.limiter.blocked)
+            'current_active_limits': store_stats['active_limits'],
+            'currently_blocked': store_stats['currently_blocked']
         }
 
 api_rate_limiter = APIRateLimiter()
\ No newline at end of file
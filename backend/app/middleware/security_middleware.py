@@ -4,80 +4,27 @@ Security middleware for FastAPI application
 import hashlib
 import hmac
 import time
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
 import os
 from app.utils.logger import safe_log
 
-class SecurityMiddleware(BaseHTTPMiddleware):
-    """Security middleware for request validation and protection"""
+class SecurityPolicy:
+    """Security settings applied to every response by the request pipeline"""
     
-    def __init__(self, app, secret_key: str = None):
-        super().__init__(app)
+    def __init__(self, secret_key: str = None):
         self.secret_key = secret_key or os.getenv('JWT_SECRET', 'default-secret')
         self.max_request_size = 50 * 1024 * 1024  # 50MB
         self.blocked_ips = set()
-        self.request_counts = {}
         
-    async def dispatch(self, request: Request, call_next):
-        """Process security checks before handling request"""
-        
-        # Security headers
-        response = await self._add_security_headers(request, call_next)
-        return response
-    
-    async def _add_security_headers(self, request: Request, call_next):
-        """Add security headers to response"""
-        try:
-            response = await call_next(request)
-            
-            # Add security headers
-            if os.getenv('NODE_ENV') == 'production':
-                response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-                response.headers["X-Content-Type-Options"] = "nosniff"
-                response.headers["X-Frame-Options"] = "DENY"
-                response.headers["X-XSS-Protection"] = "1; mode=block"
-                response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-            
-            # Remove server identification
-            if "server" in response.headers:
-                del response.headers["server"]
-            
-            return response
-            
-        except Exception as e:
-            safe_log(f"Security middleware error: {e}", 'error')
-            raise e
-    
-    def _check_ip_blacklist(self, client_ip: str):
-        """Check if IP is blacklisted"""
-        if client_ip in self.blocked_ips:
-            raise HTTPException(status_code=403, detail="Access denied")
-    
-    def _validate_request_size(self, request: Request):
-        """Validate request size"""
-        content_length = request.headers.get('content-length')
-        if content_length and int(content_length) > self.max_request_size:
-            raise HTTPException(status_code=413, detail="Request too large")
-    
-    def _check_suspicious_patterns(self, request: Request):
-        """Check for suspicious request patterns"""
-        user_agent = request.headers.get('user-agent', '').lower()
-        
-        # Block known bad user agents
-        bad_agents = ['sqlmap', 'nikto', 'nmap', 'masscan', 'wget', 'curl']
-        if any(bad_agent in user_agent for bad_agent in bad_agents):
-            if 'legitimate-client' not in user_agent:  # Allow legitimate curl/wget with special header
-                safe_log(f"Blocked suspicious user agent: {user_agent}", 'warning')
-                raise HTTPException(status_code=403, detail="Access denied")
-        
-        # Check for SQL injection patterns in URL
-        url_path = str(request.url.path).lower()
-        sql_patterns = ['union', 'select', 'insert', 'delete', 'drop', '--', ';', '/*', '*/', 'xp_']
-        if any(pattern in url_path for pattern in sql_patterns):
-            safe_log(f"Blocked potential SQL injection: {url_path}", 'warning')
-            raise HTTPException(status_code=403, detail="Invalid request")
+        # Security headers, encoded once
+        self.response_headers = []
+        if os.getenv('NODE_ENV') == 'production':
+            self.response_headers = [
+                (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+                (b"x-content-type-options", b"nosniff"),
+                (b"x-frame-options", b"DENY"),
+                (b"x-xss-protection", b"1; mode=block"),
+                (b"referrer-policy", b"strict-origin-when-cross-origin"),
+            ]
     
     def block_ip(self, ip: str):
         """Block an IP address"""
@@ -87,7 +34,10 @@ class SecurityMiddleware(BaseHTTPMiddleware):
     def unblock_ip(self, ip: str):
         """Unblock an IP address"""
         self.blocked_ips.discard(ip)
-        safe_log(f"IP unblocked: {ip}", 'info')
+        safe_log("IP unblocked: %s", 'info', ip)
+
+# Global security policy instance
+security_policy = SecurityPolicy()
 
 class CSRFProtection:
     """CSRF protection utility"""
@@ -1,3 +1,3 @@
 ﻿from .session import Session, SessionCreate
-from .photo import Photo, PhotoCreate
+from .photo import Photo, PhotoCreate, DirectUploadRequest, DirectUploadConfirm
 from .user_upload import UserUpload, UserUploadCreate, UserUploadStats
@@ -1,12 +1,21 @@
 ﻿from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
 
 class PhotoBase(BaseModel):
     filename: str
     session_id: str
     url: str
     user_identifier: Optional[str] = None
+    # SHA-256 of the uploaded bytes, unique per session
+    content_hash: Optional[str] = None
+    # Set by the thumbnail pipeline; missing on legacy photos
+    width: Optional[int] = None
+    height: Optional[int] = None
+    thumbnail_url: Optional[str] = None
+    thumbnails: Optional[Dict[str, Dict[str, Any]]] = None
+    # Tiny data URI shown while thumbnail_url loads
+    placeholder: Optional[str] = None
 
 class PhotoCreate(PhotoBase):
     pass
@@ -17,3 +26,23 @@ class Photo(PhotoBase):
 
     class Config:
         from_attributes = True
+
+class DirectUploadRequest(BaseModel):
+    """A photo the client is about to upload straight to storage"""
+    filename: str
+    content_type: str
+    size: int
+
+class DirectUploadConfirm(BaseModel):
+    """Fields of the storage service's upload response, as received by the client
+
+    Only public_id, version and signature are trusted; size, dimensions and
+    format are read back from storage.
+    """
+    public_id: str
+    version: int
+    signature: str
+    format: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    bytes: Optional[int] = None
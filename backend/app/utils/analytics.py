@@ -0,0 +1,113 @@
+"""
+Fixed-memory streaming analytics primitives
+"""
+import hashlib
+import math
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def hash64(value: str) -> int:
+    """Stable 64-bit hash used for approximate counting"""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """Approximate distinct counter in 2**precision bytes (~3% error at p=10)"""
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int = 10):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add_hash(self, hashed: int):
+        """Add an item by its 64-bit hash"""
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, value: str):
+        self.add_hash(hash64(value))
+
+    def merge(self, other: "HyperLogLog"):
+        """Fold another counter with the same precision into this one"""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class SpaceSaving:
+    """Top-K heavy hitters in O(K) memory (Space-Saving algorithm).
+
+    Counts are upper bounds; an item that displaced another inherits its count.
+    """
+
+    __slots__ = ("capacity", "counts")
+
+    def __init__(self, capacity: int = 20):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+
+    def add(self, item: str, weight: int = 1):
+        counts = self.counts
+        if item in counts:
+            counts[item] += weight
+        elif len(counts) < self.capacity:
+            counts[item] = weight
+        else:
+            victim = min(counts, key=counts.get)
+            counts[item] = counts.pop(victim) + weight
+
+    def merge(self, other: "SpaceSaving"):
+        for item, count in other.counts.items():
+            self.add(item, count)
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        return sorted(self.counts.items(), key=lambda entry: entry[1], reverse=True)[:n]
+
+
+class RingBuffer:
+    """Fixed number of time buckets, reused in a ring as time advances"""
+
+    def __init__(self, resolution_seconds: int, size: int, factory: Callable[[], object],
+                 on_rollover: Optional[Callable[[object], None]] = None):
+        self.resolution = resolution_seconds
+        self.size = size
+        self.factory = factory
+        self.on_rollover = on_rollover
+        self.epochs: List[int] = [-1] * size
+        self.buckets: List[object] = [None] * size
+        self.current_epoch = -1
+
+    def bucket(self, now: float):
+        """Get the bucket for `now`, resetting it if it holds stale data"""
+        epoch = int(now // self.resolution)
+        index = epoch % self.size
+        if self.epochs[index] != epoch:
+            if epoch > self.current_epoch and self.on_rollover is not None:
+                previous = self.buckets[self.current_epoch % self.size]
+                if previous is not None and self.epochs[self.current_epoch % self.size] == self.current_epoch:
+                    self.on_rollover(previous)
+            self.epochs[index] = epoch
+            self.buckets[index] = self.factory()
+        self.current_epoch = max(self.current_epoch, epoch)
+        return self.buckets[index]
+
+    def items(self, now: float) -> List[Tuple[int, object]]:
+        """(bucket start timestamp, bucket) pairs still inside the window, oldest first"""
+        newest = int(now // self.resolution)
+        live = [
+            (epoch, bucket) for epoch, bucket in zip(self.epochs, self.buckets)
+            if bucket is not None and newest - self.size < epoch <= newest
+        ]
+        return [(epoch * self.resolution, bucket) for epoch, bucket in sorted(live, key=lambda entry: entry[0])]
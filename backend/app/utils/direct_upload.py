@@ -0,0 +1,98 @@
+"""
+Direct-to-storage uploads
+
+Instead of streaming the photo through a worker, a guest asks for an upload
+ticket, sends the file straight to Cloudinary with the ticket's signed
+parameters, and confirms the upload afterwards. The worker only handles two
+small JSON requests per photo.
+
+Off by default: the bytes never pass through the API, so these uploads skip
+content verification, normalization (EXIF/GPS stripping) and duplicate
+detection. Size and dimensions are read back from storage on confirmation.
+
+A ticket reserves one photo of the guest's quota until it is confirmed or
+expires, so a guest cannot collect more tickets than photos they may store.
+"""
+import os
+import time
+from typing import Dict, Optional
+
+import cloudinary
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.utils
+
+from app.utils.thumbnails import GALLERY_SIZE, THUMBNAIL_QUALITY, THUMBNAIL_SIZES
+
+DIRECT_UPLOADS_ENABLED = os.getenv("DIRECT_UPLOADS_ENABLED", "false").lower() == "true"
+# Cloudinary rejects signatures older than an hour; keep tickets well inside that
+DIRECT_UPLOAD_TICKET_TTL_SECONDS = min(int(os.getenv("DIRECT_UPLOAD_TICKET_TTL_SECONDS", "900")), 3600)
+
+# Enforced by Cloudinary, since the format list is part of the signature
+ALLOWED_FORMATS = "jpg,jpeg,png,gif,webp"
+
+
+def upload_url() -> str:
+    """Cloudinary's image upload endpoint for the configured account"""
+    return cloudinary.utils.cloudinary_api_url("upload", resource_type="image")
+
+
+def sign_upload(public_id: str, timestamp: Optional[int] = None) -> Dict[str, str]:
+    """Form fields a client sends along with the file to store it as public_id"""
+    config = cloudinary.config()
+    params = {
+        "allowed_formats": ALLOWED_FORMATS,
+        "public_id": public_id,
+        "timestamp": str(timestamp or int(time.time())),
+    }
+    params["signature"] = cloudinary.utils.api_sign_request(
+        params, config.api_secret, config.signature_algorithm
+    )
+    params["api_key"] = config.api_key
+    return params
+
+
+def verify_upload(public_id: str, version, signature: str) -> bool:
+    """Whether a Cloudinary upload response (public_id, version, signature) is genuine"""
+    if not public_id or not version or not signature:
+        return False
+    return cloudinary.utils.verify_api_response_signature(public_id, str(version), signature)
+
+
+def stored_asset(public_id: str) -> Optional[dict]:
+    """Size, dimensions and format of a stored upload, None if there is none
+
+    A blocking Admin API call; run it in a thread.
+    """
+    try:
+        return cloudinary.api.resource(public_id, resource_type="image")
+    except cloudinary.exceptions.NotFound:
+        return None
+
+
+def delivery_url(public_id: str, version, image_format: Optional[str] = None, **transformation) -> str:
+    """HTTPS URL of a stored image, optionally transformed on delivery"""
+    url, _ = cloudinary.utils.cloudinary_url(
+        public_id,
+        version=version,
+        format=image_format,
+        resource_type="image",
+        secure=True,
+        **transformation
+    )
+    return url
+
+
+def gallery_thumbnail_url(public_id: str, version) -> Optional[str]:
+    """Gallery-size rendition derived by Cloudinary on first request
+
+    Direct uploads never pass through the thumbnail pool, so the gallery
+    size is requested as a delivery transformation instead.
+    """
+    edge = THUMBNAIL_SIZES.get(GALLERY_SIZE)
+    if not edge:
+        return None
+    return delivery_url(
+        public_id, version, "jpg",
+        width=edge, height=edge, crop="limit", quality=THUMBNAIL_QUALITY
+    )
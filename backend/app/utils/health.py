@@ -0,0 +1,150 @@
+"""
+Background dependency checks backing /health/detailed
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+import cloudinary
+import cloudinary.api
+import psutil
+
+from app.utils.logger import safe_log
+from app.utils.metrics import metrics_collector
+from app.utils.serialization import encode_static
+
+HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("HEALTH_CHECK_INTERVAL_SECONDS", "15"))
+HEALTH_CHECK_TIMEOUT_SECONDS = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", "5"))
+# cloudinary.api.ping counts against the hourly Admin API quota, which
+# direct-upload confirmation also needs, and every worker runs its own checks
+HEALTH_CHECK_STORAGE_INTERVAL_SECONDS = float(os.getenv("HEALTH_CHECK_STORAGE_INTERVAL_SECONDS", "300"))
+
+
+async def ping_database():
+    from app.database import get_database
+    await get_database().command('ping')
+
+
+async def ping_cloudinary():
+    # The Cloudinary SDK is synchronous; keep it off the event loop
+    await asyncio.to_thread(cloudinary.api.ping)
+
+
+def system_stats() -> Dict[str, float]:
+    return {
+        # Non-blocking: CPU usage since the previous call (one refresh interval)
+        "cpu_percent": psutil.cpu_percent(interval=None),
+        "memory_percent": psutil.virtual_memory().percent,
+        "disk_percent": psutil.disk_usage('/').percent
+    }
+
+
+class HealthMonitor:
+    """Runs dependency checks on a fixed interval and caches the result.
+
+    Probes read the latest pre-encoded snapshot, so polling the endpoint
+    never waits on MongoDB, Cloudinary or psutil. Checks listed in
+    `check_intervals` run less often than the refresh; in between, the
+    snapshot repeats their last result.
+    """
+
+    def __init__(
+        self,
+        checks: Optional[Dict[str, Callable[[], Awaitable[None]]]] = None,
+        interval: float = HEALTH_CHECK_INTERVAL_SECONDS,
+        timeout: float = HEALTH_CHECK_TIMEOUT_SECONDS,
+        check_intervals: Optional[Dict[str, float]] = None
+    ):
+        self.checks = checks if checks is not None else {
+            "database": ping_database,
+            "cloudinary": ping_cloudinary,
+        }
+        self.interval = interval
+        self.timeout = timeout
+        self.check_intervals = check_intervals if check_intervals is not None else {
+            "cloudinary": HEALTH_CHECK_STORAGE_INTERVAL_SECONDS,
+        }
+        # name -> last result and when the check is next due (monotonic)
+        self.results: Dict[str, dict] = {}
+        self.next_due: Dict[str, float] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.snapshot: dict = {
+            "status": "starting",
+            "timestamp": datetime.utcnow().isoformat(),
+            "services": {}
+        }
+        self.body = encode_static(self.snapshot)
+
+    async def _check(self, name: str, check: Callable[[], Awaitable[None]]) -> dict:
+        start_time = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), timeout=self.timeout)
+            result = {"status": "healthy"}
+        except asyncio.TimeoutError:
+            result = {"status": "unhealthy", "error": f"Timed out after {self.timeout}s"}
+        except Exception as e:
+            result = {"status": "unhealthy", "error": str(e)}
+        latency = time.perf_counter() - start_time
+        result["response_time_ms"] = round(latency * 1000, 2)
+        result["checked_at"] = datetime.utcnow().isoformat()
+        metrics_collector.update_dependency_health(name, result["status"] == "healthy", latency)
+        self.results[name] = result
+        if name in self.check_intervals:
+            self.next_due[name] = time.monotonic() + self.check_intervals[name]
+        return result
+
+    async def _result(self, name: str) -> dict:
+        """Run a check if it is due, else repeat its last result"""
+        if name in self.results and time.monotonic() < self.next_due.get(name, 0.0):
+            return self.results[name]
+        return await self._check(name, self.checks[name])
+
+    async def refresh(self) -> dict:
+        """Run all checks concurrently and publish a new snapshot"""
+        names = list(self.checks)
+        results = await asyncio.gather(*(self._result(name) for name in names))
+        services = dict(zip(names, results))
+
+        snapshot = {
+            "status": "healthy" if all(r["status"] == "healthy" for r in results) else "degraded",
+            "timestamp": datetime.utcnow().isoformat(),
+            "version": "1.0.0",
+            "environment": os.getenv("NODE_ENV", "development"),
+            "refresh_interval_seconds": self.interval,
+            "services": services
+        }
+        try:
+            snapshot["system"] = await asyncio.to_thread(system_stats)
+        except Exception as e:
+            snapshot["system"] = {"error": str(e)}
+
+        self.snapshot = snapshot
+        self.body = encode_static(snapshot)
+        return snapshot
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                safe_log("Health check refresh failed: %s", 'error', e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+# Global health monitor instance
+health_monitor = HealthMonitor()
@@ -0,0 +1,193 @@
+"""
+Idempotency-Key support for upload endpoints
+
+A client sends the same ``Idempotency-Key`` header when it retries a request.
+The first successful response is cached under the key for a short TTL, and
+replays are answered from the cache without touching storage or MongoDB.
+A replay that arrives while the first request is still running gets a 409.
+"""
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple, Union
+
+from fastapi import HTTPException
+from starlette.responses import Response
+
+from app.utils.metrics import metrics_collector
+from app.utils.redis_fallback import RedisFallback
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+# A request that never finishes (worker killed mid-upload) stops blocking its
+# key after this long
+IDEMPOTENCY_PENDING_TTL_SECONDS = 120
+
+MAX_KEY_LENGTH = 255
+
+# (status code, JSON body)
+CachedResponse = Tuple[int, bytes]
+
+
+class _InProgress:
+    def __repr__(self):
+        return "IN_PROGRESS"
+
+
+# Returned by begin() when another request holds the key
+IN_PROGRESS = _InProgress()
+
+
+class IdempotencyStore(ABC):
+    """Backend holding key -> cached response"""
+
+    @abstractmethod
+    async def begin(self, key: str) -> Union[None, CachedResponse, _InProgress]:
+        """Claim a key for a new request
+
+        Returns None if the caller now owns the key, the cached response if
+        the key already completed, or IN_PROGRESS if another request holds it.
+        """
+
+    @abstractmethod
+    async def complete(self, key: str, response: CachedResponse):
+        """Cache the owner's response for IDEMPOTENCY_TTL_SECONDS"""
+
+    @abstractmethod
+    async def release(self, key: str):
+        """Give up a claimed key so the request can be retried"""
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Per-process LRU; replays only hit when they reach the same worker"""
+
+    def __init__(self, max_keys: int = IDEMPOTENCY_MAX_KEYS, ttl: int = IDEMPOTENCY_TTL_SECONDS):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        # key -> (expires at, cached response or None while in progress)
+        self.entries: "OrderedDict[str, Tuple[float, Optional[CachedResponse]]]" = OrderedDict()
+
+    def _set(self, key: str, expires_at: float, response: Optional[CachedResponse]):
+        self.entries[key] = (expires_at, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_keys:
+            self.entries.popitem(last=False)
+
+    async def begin(self, key: str) -> Union[None, CachedResponse, _InProgress]:
+        now = time.monotonic()
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > now:
+            self.entries.move_to_end(key)
+            return entry[1] if entry[1] is not None else IN_PROGRESS
+        self._set(key, now + IDEMPOTENCY_PENDING_TTL_SECONDS, None)
+        return None
+
+    async def complete(self, key: str, response: CachedResponse):
+        self._set(key, time.monotonic() + self.ttl, response)
+
+    async def release(self, key: str):
+        self.entries.pop(key, None)
+
+
+class RedisIdempotencyStore(IdempotencyStore):
+    """Shared store so a retry landing on another worker is still recognised.
+
+    Falls back to an in-process store while Redis is unreachable.
+    """
+
+    pending = b"pending"
+
+    def __init__(self, url: str, prefix: str = "idem", ttl: int = IDEMPOTENCY_TTL_SECONDS):
+        self.redis = RedisFallback(url, "Idempotency store", "in-process cache")
+        self.prefix = prefix
+        self.ttl = ttl
+        self.fallback = MemoryIdempotencyStore(ttl=ttl)
+
+    async def begin(self, key: str) -> Union[None, CachedResponse, _InProgress]:
+        client = self.redis.client
+        redis_key = f"{self.prefix}:{key}"
+
+        async def shared():
+            claimed = await client.set(redis_key, self.pending, nx=True, ex=IDEMPOTENCY_PENDING_TTL_SECONDS)
+            if claimed:
+                return None
+            value = await client.get(redis_key)
+            # Missing here means the key expired between SET and GET; let the client retry
+            if value is None or value == self.pending:
+                return IN_PROGRESS
+            return int(value[:3]), value[3:]
+
+        return await self.redis.run(shared, lambda: self.fallback.begin(key))
+
+    async def complete(self, key: str, response: CachedResponse):
+        status_code, body = response
+        await self.redis.run(
+            lambda: self.redis.client.set(f"{self.prefix}:{key}", b"%03d" % status_code + body, ex=self.ttl),
+            lambda: self.fallback.complete(key, response)
+        )
+
+    async def release(self, key: str):
+        await self.fallback.release(key)
+
+        async def nothing():
+            return None
+
+        await self.redis.run(lambda: self.redis.client.delete(f"{self.prefix}:{key}"), nothing)
+
+
+def create_idempotency_store() -> IdempotencyStore:
+    """Create the configured store (Redis when IDEMPOTENCY_REDIS_URL or REDIS_URL is set)"""
+    redis_url = os.getenv("IDEMPOTENCY_REDIS_URL") or os.getenv("REDIS_URL")
+    if redis_url:
+        return RedisIdempotencyStore(redis_url)
+    return MemoryIdempotencyStore()
+
+
+def validate_idempotency_key(value: str) -> str:
+    if not value or len(value) > MAX_KEY_LENGTH or not value.isascii() or not value.isprintable():
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} printable ASCII characters")
+    return value
+
+
+async def run_idempotent(
+    store: IdempotencyStore,
+    key: str,
+    handler: Callable[[], Awaitable[Response]]
+) -> Response:
+    """Run handler once per key; replays get the first successful response
+
+    Only complete successes are cached: 2xx other than 207 Multi-Status (a
+    batch in which some files failed). Anything else releases the key, so a
+    retry runs the request again.
+    """
+    cached = await store.begin(key)
+    if cached is IN_PROGRESS:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+    if cached is not None:
+        status_code, body = cached
+        metrics_collector.record_idempotent_replay()
+        return Response(
+            content=body,
+            status_code=status_code,
+            headers={"Content-Type": "application/json", REPLAYED_HEADER: "true"}
+        )
+
+    try:
+        response = await handler()
+    except BaseException:
+        await store.release(key)
+        raise
+
+    if 200 <= response.status_code < 300 and response.status_code != 207:
+        await store.complete(key, (response.status_code, bytes(response.body)))
+    else:
+        await store.release(key)
+    return response
+
+
+# Global idempotency store instance
+idempotency_store = create_idempotency_store()
@@ -1,63 +1,139 @@
 import os
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
-from typing import Any
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from app.utils.serialization import dumps_text
+
+# Environment is resolved once at import; safe_log runs on every request path
+ENVIRONMENT = (os.getenv('NODE_ENV', '') or
+               os.getenv('RAILWAY_ENVIRONMENT', '') or
+               os.getenv('VERCEL_ENV', '') or
+               'development').lower()
+
+IS_PRODUCTION = ENVIRONMENT in ('production', 'prod')
+
+LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+# In production, only log warnings and errors unless LOG_LEVEL says otherwise
+LOG_LEVEL = LEVELS.get(
+    os.getenv('LOG_LEVEL', '').lower(),
+    logging.WARNING if IS_PRODUCTION else logging.INFO
+)
+
+TEXT_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# LOG_FORMAT=json switches to one JSON object per line and enables the
+# structured access log written by the request pipeline
+JSON_LOGS = os.getenv('LOG_FORMAT', 'text').lower() == 'json'
+
+# Set by the request pipeline; stamped on every record logged while handling a request
+current_request_id: ContextVar[Optional[str]] = ContextVar('current_request_id', default=None)
+
+_logger = logging.getLogger('qr-photo-app')
+_access_logger = logging.getLogger('qr-photo-app.access')
+_listener = None
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request id (runs on the calling thread, before queueing)"""
+
+    def filter(self, record):
+        record.request_id = current_request_id.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; access log fields are merged in at top level"""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return dumps_text(entry)
 
 def setup_logger():
-    """Setup logging configuration based on environment"""
-    # Check multiple environment indicators for production
-    env = (os.getenv('NODE_ENV', '') or 
-           os.getenv('RAILWAY_ENVIRONMENT', '') or 
-           os.getenv('VERCEL_ENV', '') or 
-           'development').lower()
-    
-    is_production = env in ('production', 'prod')
-    
-    # Configure logging level
-    if is_production:
-        log_level = logging.WARNING
-    else:
-        log_level = logging.INFO
-    
-    # Setup logging
-    logging.basicConfig(
-        level=log_level,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    
-    return logging.getLogger('qr-photo-app')
+    """Setup logging configuration based on environment
+
+    Records are handed to a QueueHandler and written to stdout by a
+    QueueListener thread, so log I/O never blocks the event loop.
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    if _listener is not None:
+        return _logger
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if JSON_LOGS else logging.Formatter(TEXT_LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Messages are formatted once, by the listener's handler
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    queue_handler.addFilter(RequestContextFilter())
+    root.addHandler(queue_handler)
+
+    # Access records bypass the app log level (production keeps them at WARNING)
+    _access_logger.setLevel(logging.INFO)
+    _access_logger.propagate = False
+    _access_logger.addHandler(queue_handler)
+    if JSON_LOGS:
+        # The pipeline's access log replaces uvicorn's free-text one
+        logging.getLogger('uvicorn.access').disabled = True
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    return _logger
 
 def get_logger():
     """Get the application logger"""
-    return logging.getLogger('qr-photo-app')
-
-def safe_log(message: str, level: str = 'info', *args: Any):
-    """Safe logging function that respects environment settings"""
-    # Check multiple environment indicators for production
-    env = (os.getenv('NODE_ENV', '') or 
-           os.getenv('RAILWAY_ENVIRONMENT', '') or 
-           os.getenv('VERCEL_ENV', '') or 
-           'development').lower()
-    
-    is_production = env in ('production', 'prod')
-    
-    # In production, only log warnings and errors
-    if is_production and level in ('info', 'debug'):
+    return _logger
+
+def log_enabled(level: str = 'debug') -> bool:
+    """Cheap guard for log calls whose arguments are expensive to build"""
+    return LEVELS.get(level, logging.INFO) >= LOG_LEVEL
+
+def safe_log(message: Any, level: str = 'info', *args: Any):
+    """Safe logging function that respects environment settings
+
+    Prefer lazy arguments on hot paths; nothing is formatted when the level
+    is suppressed:
+        safe_log("Session found: %s", 'debug', db_session)
+        safe_log(lambda: expensive_summary(), 'debug')
+    """
+    levelno = LEVELS.get(level, logging.INFO)
+    if levelno < LOG_LEVEL:
         return
-    
-    logger = get_logger()
-    
-    if level == 'error':
-        logger.error(message, *args)
-    elif level == 'warning':
-        logger.warning(message, *args)
-    elif level == 'info':
-        logger.info(message, *args)
-    elif level == 'debug':
-        logger.debug(message, *args)
+
+    if callable(message):
+        message = message()
+    _logger.log(levelno, message, *args)
+
+def access_log(fields: dict):
+    """Write one structured access log record (JSON mode only)"""
+    _access_logger.info("request", extra={"fields": fields})
 
 # Initialize logger
-setup_logger()
\ No newline at end of file
+setup_logger()
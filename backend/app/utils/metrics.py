@@ -1,11 +1,41 @@
 """
 Prometheus metrics for QR PhotoShare application
 """
+import hmac
 import time
-from typing import Dict, Any
-from prometheus_client import Counter, Histogram, Gauge, start_http_server
+from typing import Dict, Any, Optional
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess, start_http_server
+)
 import os
 
+# With several uvicorn workers each process keeps its own values; when
+# PROMETHEUS_MULTIPROC_DIR is set prometheus_client writes them to files in
+# that directory and the exposition merges all workers.
+MULTIPROCESS_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+# Bearer token Prometheus must send to scrape /metrics
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Labels are kept to bounded sets: route templates (never raw paths), known
+# HTTP methods and status codes.
+KNOWN_METHODS = frozenset({"GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"})
+
+# (method, route template) pairs timed with the upload duration histogram
+UPLOAD_ROUTES = frozenset({
+    ("POST", "/sessions/{session_id}/photos"),
+    ("POST", "/sessions/{session_id}/photos/batch"),
+    ("PATCH", "/sessions/{session_id}/uploads/{upload_id}"),
+})
+
+# Reads are expected in milliseconds; uploads carry the image and a storage
+# round trip, so they get their own wider buckets.
+STAGE_DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DATABASE_DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+READ_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+UPLOAD_DURATION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
 # Metrics definitions
 REQUEST_COUNT = Counter(
     'http_requests_total',
@@ -16,18 +46,67 @@ REQUEST_COUNT = Counter(
 REQUEST_DURATION = Histogram(
     'http_request_duration_seconds',
     'HTTP request duration in seconds',
-    ['method', 'endpoint']
+    ['method', 'endpoint'],
+    buckets=READ_DURATION_BUCKETS
+)
+
+UPLOAD_DURATION = Histogram(
+    'http_upload_duration_seconds',
+    'Photo upload request duration in seconds',
+    ['method', 'endpoint'],
+    buckets=UPLOAD_DURATION_BUCKETS
+)
+
+PIPELINE_STAGE_DURATION = Histogram(
+    'pipeline_stage_duration_seconds',
+    'Duration of individual request pipeline stages (e.g. upload storage, db insert)',
+    ['pipeline', 'stage'],
+    buckets=STAGE_DURATION_BUCKETS
+)
+
+PIPELINE_STAGE_FAILURES = Counter(
+    'pipeline_stage_failures_total',
+    'Pipeline stages that failed with a server-side error',
+    ['pipeline', 'stage']
 )
 
 ACTIVE_SESSIONS = Gauge(
     'qr_active_sessions_total',
-    'Number of active QR sessions'
+    'Number of active QR sessions',
+    multiprocess_mode='livemax'
 )
 
 PHOTOS_UPLOADED = Counter(
     'qr_photos_uploaded_total',
-    'Total number of photos uploaded',
-    ['session_id']
+    'Total number of photos uploaded'
+)
+
+DUPLICATE_UPLOADS = Counter(
+    'qr_duplicate_uploads_total',
+    'Uploads answered with an existing photo of identical content'
+)
+
+DUPLICATE_UPLOAD_BYTES = Counter(
+    'qr_duplicate_upload_bytes_total',
+    'Bytes not sent to storage because the content was already stored'
+)
+
+IDEMPOTENT_REPLAYS = Counter(
+    'qr_idempotent_replays_total',
+    'Requests answered from the Idempotency-Key cache'
+)
+
+# Bytes saved per normalized photo; a photo that grew is observed as a
+# negative value and lands in the first bucket
+IMAGE_NORMALIZATION_SAVED_BYTES = Histogram(
+    'qr_image_normalization_saved_bytes',
+    'Bytes saved per photo by image normalization (original minus stored size)',
+    buckets=(0, 16384, 65536, 262144, 524288, 1048576, 2097152, 4194304, 8388608)
+)
+
+IMAGE_NORMALIZATION_INPUT_BYTES = Counter(
+    'qr_image_normalization_input_bytes_total',
+    'Original size of normalized photos'
 )
 
 DATABASE_OPERATIONS = Counter(
@@ -36,9 +115,102 @@ DATABASE_OPERATIONS = Counter(
     ['operation', 'collection', 'status']
 )
 
+DATABASE_OPERATION_DURATION = Histogram(
+    'database_operation_duration_seconds',
+    'MongoDB command round trip time',
+    ['operation', 'collection'],
+    buckets=DATABASE_DURATION_BUCKETS
+)
+
+DATABASE_POOL_CHECKOUT_WAIT = Histogram(
+    'database_pool_checkout_wait_seconds',
+    'Time spent waiting to check a connection out of the MongoDB pool',
+    buckets=DATABASE_DURATION_BUCKETS
+)
+
+DATABASE_POOL_CHECKOUT_FAILURES = Counter(
+    'database_pool_checkout_failures_total',
+    'MongoDB pool checkouts that failed',
+    ['reason']
+)
+
+DATABASE_POOL_CONNECTIONS = Gauge(
+    'database_pool_connections',
+    'Open MongoDB pool connections',
+    ['state'],
+    multiprocess_mode='livesum'
+)
+
+DATABASE_CONNECTION_STATUS = Gauge(
+    'qr_database_connection_status',
+    'MongoDB reachable at the last health check (1) or not (0)',
+    multiprocess_mode='livemin'
+)
+
+CLOUDINARY_CONNECTION_STATUS = Gauge(
+    'qr_cloudinary_connection_status',
+    'Cloudinary reachable at the last health check (1) or not (0)',
+    multiprocess_mode='livemin'
+)
+
+DEPENDENCY_CHECK_LATENCY = Gauge(
+    'dependency_check_latency_seconds',
+    'Latency of the last background health check per dependency',
+    ['dependency'],
+    multiprocess_mode='livemax'
+)
+
+DEPENDENCY_STATUS_GAUGES = {
+    'database': DATABASE_CONNECTION_STATUS,
+    'cloudinary': CLOUDINARY_CONNECTION_STATUS,
+}
+
+UPLOAD_ADMISSION_WAIT = Histogram(
+    'upload_admission_wait_seconds',
+    'Time an admitted upload waited in the admission queue',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+UPLOAD_ADMISSION_REJECTED = Counter(
+    'upload_admission_rejected_total',
+    'Uploads answered with 503 by admission control',
+    ['reason']
+)
+
+UPLOAD_ADMISSION_ACTIVE = Gauge(
+    'upload_admission_active',
+    'Upload slots in use (a batch holds one per file)',
+    multiprocess_mode='livesum'
+)
+
+UPLOAD_ADMISSION_QUEUED = Gauge(
+    'upload_admission_queued',
+    'Uploads waiting for admission',
+    multiprocess_mode='livesum'
+)
+
 WEBSOCKET_CONNECTIONS = Gauge(
     'websocket_connections_active',
-    'Number of active WebSocket connections'
+    'Number of active WebSocket connections',
+    multiprocess_mode='livesum'
+)
+
+WEBSOCKET_SEND_QUEUE_DEPTH = Histogram(
+    'websocket_send_queue_depth',
+    'Outbound WebSocket queue depth observed when a message is enqueued',
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+WEBSOCKET_QUEUED_MESSAGES = Gauge(
+    'websocket_queued_messages',
+    'Number of outbound WebSocket messages waiting to be written',
+    multiprocess_mode='livesum'
+)
+
+WEBSOCKET_MESSAGES_DROPPED = Counter(
+    'websocket_messages_dropped_total',
+    'Outbound WebSocket messages dropped or merged because a queue was full',
+    ['policy']
 )
 
 RATE_LIMIT_HITS = Counter(
@@ -47,6 +219,25 @@ RATE_LIMIT_HITS = Counter(
     ['endpoint', 'user_type']
 )
 
+RATE_LIMIT_REQUESTS = Counter(
+    'rate_limit_requests_total',
+    'Requests checked by the rate limiter',
+    ['outcome', 'user_type']
+)
+
+RATE_LIMIT_LAST_MINUTE_REQUESTS = Gauge(
+    'rate_limit_last_minute_requests',
+    'Requests checked by the rate limiter in the last complete minute',
+    ['outcome'],
+    multiprocess_mode='livesum'
+)
+
+RATE_LIMIT_LAST_MINUTE_UNIQUE_USERS = Gauge(
+    'rate_limit_last_minute_unique_users',
+    'Approximate authenticated users seen in the last complete minute (summed across workers)',
+    multiprocess_mode='livesum'
+)
+
 class MetricsCollector:
     """Centralized metrics collection"""
     
@@ -54,21 +245,44 @@ class MetricsCollector:
         self.start_time = time.time()
         
     def record_request(self, method: str, endpoint: str, status_code: int, duration: float):
-        """Record HTTP request metrics"""
+        """Record HTTP request metrics (endpoint must be a route template)"""
+        if method not in KNOWN_METHODS:
+            method = "OTHER"
         REQUEST_COUNT.labels(
             method=method,
             endpoint=endpoint,
             status_code=str(status_code)
         ).inc()
         
-        REQUEST_DURATION.labels(
+        histogram = UPLOAD_DURATION if (method, endpoint) in UPLOAD_ROUTES else REQUEST_DURATION
+        histogram.labels(
             method=method,
             endpoint=endpoint
         ).observe(duration)
     
-    def record_photo_upload(self, session_id: str):
+    def record_photo_upload(self, count: int = 1):
         """Record photo upload"""
-        PHOTOS_UPLOADED.labels(session_id=session_id).inc()
+        PHOTOS_UPLOADED.inc(count)
+    
+    def record_duplicate_upload(self, size: int):
+        """Record an upload short-circuited by content-hash deduplication"""
+        DUPLICATE_UPLOADS.inc()
+        DUPLICATE_UPLOAD_BYTES.inc(size)
+    
+    def record_idempotent_replay(self):
+        """Record a request answered from the Idempotency-Key cache"""
+        IDEMPOTENT_REPLAYS.inc()
+    
+    def record_image_normalized(self, original_size: int, normalized_size: int):
+        """Record a photo stored in normalized form (see app.utils.normalization)"""
+        IMAGE_NORMALIZATION_SAVED_BYTES.observe(original_size - normalized_size)
+        IMAGE_NORMALIZATION_INPUT_BYTES.inc(original_size)
+    
+    def record_stage_duration(self, pipeline: str, stage: str, duration: float, failed: bool = False):
+        """Record one pipeline stage (see app.utils.timing)"""
+        PIPELINE_STAGE_DURATION.labels(pipeline=pipeline, stage=stage).observe(duration)
+        if failed:
+            PIPELINE_STAGE_FAILURES.labels(pipeline=pipeline, stage=stage).inc()
     
     def update_active_sessions(self, count: int):
         """Update active sessions count"""
@@ -83,25 +297,128 @@ class MetricsCollector:
             status=status
         ).inc()
     
+    def record_database_latency(self, operation: str, collection: str, duration: float):
+        """Record a MongoDB command round trip"""
+        DATABASE_OPERATION_DURATION.labels(operation=operation, collection=collection).observe(duration)
+    
+    def record_pool_checkout(self, wait_seconds: float):
+        """Record a connection checked out of the MongoDB pool"""
+        DATABASE_POOL_CHECKOUT_WAIT.observe(wait_seconds)
+        DATABASE_POOL_CONNECTIONS.labels(state="in_use").inc()
+    
+    def record_pool_checkin(self):
+        """Record a connection returned to the MongoDB pool"""
+        DATABASE_POOL_CONNECTIONS.labels(state="in_use").dec()
+    
+    def record_pool_checkout_failure(self, reason: str, wait_seconds: float):
+        """Record a failed MongoDB pool checkout (e.g. wait queue timeout)"""
+        DATABASE_POOL_CHECKOUT_WAIT.observe(wait_seconds)
+        DATABASE_POOL_CHECKOUT_FAILURES.labels(reason=reason).inc()
+    
+    def update_pool_connections(self, delta: int):
+        """Track MongoDB pool connections being opened/closed"""
+        DATABASE_POOL_CONNECTIONS.labels(state="open").inc(delta)
+    
+    def update_dependency_health(self, dependency: str, healthy: bool, latency: float):
+        """Publish the result of a background dependency health check"""
+        DEPENDENCY_CHECK_LATENCY.labels(dependency=dependency).set(latency)
+        status_gauge = DEPENDENCY_STATUS_GAUGES.get(dependency)
+        if status_gauge is not None:
+            status_gauge.set(1 if healthy else 0)
+    
+    def update_upload_admission(self, active: int, queued: int):
+        """Update admitted and queued upload counts (see app.middleware.admission)"""
+        UPLOAD_ADMISSION_ACTIVE.set(active)
+        UPLOAD_ADMISSION_QUEUED.set(queued)
+    
+    def record_upload_admission_wait(self, duration: float):
+        """Record how long an admitted upload waited for its slot"""
+        UPLOAD_ADMISSION_WAIT.observe(duration)
+    
+    def record_upload_admission_rejected(self, reason: str):
+        """Record an upload shed by admission control (queue_full or timeout)"""
+        UPLOAD_ADMISSION_REJECTED.labels(reason=reason).inc()
+    
     def update_websocket_connections(self, count: int):
         """Update WebSocket connections count"""
         WEBSOCKET_CONNECTIONS.set(count)
     
+    def record_websocket_enqueue(self, depth: int):
+        """Record outbound WebSocket queue depth after an enqueue"""
+        WEBSOCKET_SEND_QUEUE_DEPTH.observe(depth)
+        WEBSOCKET_QUEUED_MESSAGES.inc()
+    
+    def record_websocket_dequeue(self, count: int = 1):
+        """Record outbound WebSocket messages leaving a queue"""
+        WEBSOCKET_QUEUED_MESSAGES.dec(count)
+    
+    def record_websocket_drop(self, policy: str):
+        """Record a message dropped or merged by a full WebSocket queue"""
+        WEBSOCKET_MESSAGES_DROPPED.labels(policy=policy).inc()
+    
     def record_rate_limit_hit(self, endpoint: str, user_type: str):
         """Record rate limit hit"""
         RATE_LIMIT_HITS.labels(
             endpoint=endpoint,
             user_type=user_type
         ).inc()
+    
+    def record_rate_limit_request(self, blocked: bool, user_type: str):
+        """Record a request checked by the rate limiter"""
+        RATE_LIMIT_REQUESTS.labels(
+            outcome="blocked" if blocked else "allowed",
+            user_type=user_type
+        ).inc()
+    
+    def update_rate_limit_last_minute(self, allowed: int, blocked: int, unique_users: int):
+        """Publish the rate limiter's last complete minute"""
+        RATE_LIMIT_LAST_MINUTE_REQUESTS.labels(outcome="allowed").set(allowed)
+        RATE_LIMIT_LAST_MINUTE_REQUESTS.labels(outcome="blocked").set(blocked)
+        RATE_LIMIT_LAST_MINUTE_UNIQUE_USERS.set(unique_users)
 
 # Global metrics collector instance
 metrics_collector = MetricsCollector()
 
+def metrics_enabled() -> bool:
+    return os.getenv('ENABLE_METRICS', 'true').lower() == 'true'
+
+def metrics_token_missing() -> bool:
+    """True in production without METRICS_TOKEN, where /metrics stays closed"""
+    return not METRICS_TOKEN and os.getenv('NODE_ENV', '').lower() == 'production'
+
+def metrics_authorized(authorization: Optional[str]) -> bool:
+    """Whether a scrape request may read /metrics
+
+    Requires "Authorization: Bearer <METRICS_TOKEN>". Without a token
+    configured the endpoint is only open outside production.
+    """
+    if not METRICS_TOKEN:
+        return not metrics_token_missing()
+    scheme, _, token = (authorization or '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+
+def get_registry():
+    """Registry to expose: merged across workers in multiprocess mode"""
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+def render_metrics():
+    """Prometheus exposition body and content type"""
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
+
+def mark_process_dead():
+    """Drop this worker's live gauges from the shared multiprocess directory"""
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
 def start_metrics_server():
-    """Start Prometheus metrics server"""
+    """Start a standalone Prometheus metrics server (the app also serves /metrics)"""
     metrics_port = int(os.getenv('METRICS_PORT', 9090))
-    if os.getenv('ENABLE_METRICS', 'true').lower() == 'true':
-        start_http_server(metrics_port)
+    if metrics_enabled():
+        start_http_server(metrics_port, registry=get_registry())
         print(f"📊 Metrics server started on port {metrics_port}")
 
 def get_app_info() -> Dict[str, Any]:
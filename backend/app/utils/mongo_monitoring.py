@@ -0,0 +1,108 @@
+"""
+pymongo event listeners exporting MongoDB command and pool metrics
+"""
+import threading
+import time
+from typing import Dict, Tuple
+
+from pymongo import monitoring
+
+from app.utils.metrics import MetricsCollector, metrics_collector
+
+# Commands whose first field names the target collection
+COLLECTION_COMMANDS = frozenset({
+    "find", "insert", "update", "delete", "aggregate", "count", "distinct",
+    "findAndModify", "createIndexes", "listIndexes", "dropIndexes", "drop",
+})
+
+# Everything else is reported as "other" to keep the label set bounded
+KNOWN_COMMANDS = COLLECTION_COMMANDS | {"getMore", "killCursors", "ping", "endSessions", "listCollections"}
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Per-command, per-collection latency and success/error counts"""
+
+    def __init__(self, metrics: MetricsCollector = metrics_collector):
+        self.metrics = metrics
+        # (request_id, connection_id) -> (operation, collection) for in-flight commands
+        self.in_flight: Dict[Tuple[int, object], Tuple[str, str]] = {}
+
+    def started(self, event):
+        name = event.command_name
+        if name in COLLECTION_COMMANDS:
+            collection = event.command.get(name)
+        elif name == "getMore":
+            collection = event.command.get("collection")
+        else:
+            collection = None
+        operation = name if name in KNOWN_COMMANDS else "other"
+        collection = collection if isinstance(collection, str) else "-"
+        self.in_flight[(event.request_id, event.connection_id)] = (operation, collection)
+
+    def _finish(self, event, success: bool):
+        operation, collection = self.in_flight.pop(
+            (event.request_id, event.connection_id), ("other", "-")
+        )
+        self.metrics.record_database_latency(operation, collection, event.duration_micros / 1e6)
+        self.metrics.record_database_operation(operation, collection, success)
+
+    def succeeded(self, event):
+        self._finish(event, True)
+
+    def failed(self, event):
+        self._finish(event, False)
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Pool checkout wait time, in-use and open connection counts.
+
+    A checkout happens entirely on the thread running the operation (motor's
+    executor thread), so the start time is kept in a thread-local.
+    """
+
+    def __init__(self, metrics: MetricsCollector = metrics_collector):
+        self.metrics = metrics
+        self.local = threading.local()
+
+    def _wait_time(self) -> float:
+        started = getattr(self.local, "checkout_started", None)
+        self.local.checkout_started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self.local.checkout_started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        self.metrics.record_pool_checkout(self._wait_time())
+
+    def connection_check_out_failed(self, event):
+        self.metrics.record_pool_checkout_failure(str(event.reason), self._wait_time())
+
+    def connection_checked_in(self, event):
+        self.metrics.record_pool_checkin()
+
+    def connection_created(self, event):
+        self.metrics.update_pool_connections(1)
+
+    def connection_closed(self, event):
+        self.metrics.update_pool_connections(-1)
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+def create_event_listeners() -> list:
+    """Listeners to pass as event_listeners= when creating the client"""
+    return [CommandMetricsListener(), PoolMetricsListener()]
@@ -0,0 +1,144 @@
+"""
+Optional normalization of uploaded images before they are stored
+
+Phone photos carry EXIF/XMP blocks (including GPS position) and an
+orientation flag that viewers have to apply themselves. When enabled, each
+upload is rotated upright, stripped of metadata (the colour profile is
+kept), downscaled to NORMALIZE_MAX_DIMENSION and re-encoded in the shared
+process pool, and the result is stored in place of the original bytes.
+Duplicate detection still uses the hash of the bytes the client sent.
+"""
+import io
+import os
+from typing import Optional, Tuple
+
+from PIL import Image, ImageCms, ImageOps
+
+# Also applies IMAGE_MAX_PIXELS in the worker processes
+import app.utils.images  # noqa: F401
+from app.utils.logger import safe_log
+from app.utils.metrics import metrics_collector
+from app.utils.process_pool import ProcessPoolService, process_pool
+
+NORMALIZE_IMAGES = os.getenv("NORMALIZE_IMAGES", "false").lower() == "true"
+# Longest edge after normalization; 0 keeps the original size
+NORMALIZE_MAX_DIMENSION = int(os.getenv("NORMALIZE_MAX_DIMENSION", "4096"))
+# "jpeg" or "webp"
+NORMALIZE_FORMAT = os.getenv("NORMALIZE_FORMAT", "jpeg").lower()
+NORMALIZE_QUALITY = int(os.getenv("NORMALIZE_QUALITY", "85"))
+
+_SAVE_OPTIONS = {
+    "jpeg": {"format": "JPEG", "optimize": True, "progressive": True},
+    "webp": {"format": "WEBP", "method": 4},
+}
+
+
+def _convert(image: Image.Image, mode: str, icc_profile: Optional[bytes]) -> Tuple[Image.Image, Optional[bytes]]:
+    """The image in mode, with the colour profile that still describes it
+
+    An RGB profile stays valid for palette and RGB/RGBA images. Any other
+    profile (CMYK, grayscale) is applied with ImageCms, producing sRGB
+    output that needs no profile. If that fails, the profile is dropped
+    rather than attached to pixels it does not describe.
+    """
+    if icc_profile:
+        try:
+            source = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+            if source.profile.xcolor_space.strip() == "RGB" and image.mode in ("RGB", "RGBA", "P", "PA"):
+                return image.convert(mode), icc_profile
+            srgb = ImageCms.createProfile("sRGB")
+            return ImageCms.profileToProfile(image, source, srgb, outputMode=mode), None
+        except Exception:
+            pass
+    return image.convert(mode), None
+
+
+def normalize_image(contents: bytes, max_dimension: int, image_format: str, quality: int) -> Optional[bytes]:
+    """Upright, metadata-free and re-encoded image bytes (runs in a worker process)
+
+    Returns None for images that are left as they are (animations).
+    Images with transparency are kept transparent: WebP when that is the
+    target format, PNG otherwise.
+    """
+    with Image.open(io.BytesIO(contents)) as source:
+        if getattr(source, "n_frames", 1) > 1:
+            return None
+        original_size = source.size
+        orientation = source.getexif().get(0x0112)
+        # The colour profile is kept so wide-gamut photos keep their colours;
+        # nothing else from image.info (EXIF, XMP, comments) is written out
+        source_profile = source.info.get("icc_profile")
+        icc_profile = source_profile
+
+        if max_dimension:
+            source.draft("RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(source)
+        if max_dimension:
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        transparent = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+        buffer = io.BytesIO()
+        if transparent and image_format != "webp":
+            image.save(buffer, format="PNG", optimize=True, icc_profile=icc_profile)
+        else:
+            if image.mode not in ("RGB", "RGBA"):
+                image, icc_profile = _convert(image, "RGBA" if transparent else "RGB", icc_profile)
+            image.save(buffer, quality=quality, icc_profile=icc_profile, **_SAVE_OPTIONS[image_format])
+        normalized = buffer.getvalue()
+
+        # Re-encoding an already compact JPEG can grow it. When it needs no
+        # rotation or resizing, re-encoding with its own quantization tables
+        # keeps it at about the original size minus the metadata.
+        unchanged = image.size == original_size and orientation in (None, 1)
+        if (len(normalized) > len(contents) and unchanged and source.format == "JPEG"
+                and image_format == "jpeg" and source.mode in ("RGB", "L")):
+            buffer = io.BytesIO()
+            source.save(buffer, format="JPEG", quality="keep", optimize=True, icc_profile=source_profile)
+            normalized = min(normalized, buffer.getvalue(), key=len)
+    return normalized
+
+
+class ImageNormalizer:
+    """Normalizes uploads in the shared process pool before they are stored"""
+
+    def __init__(
+        self,
+        max_dimension: int = NORMALIZE_MAX_DIMENSION,
+        image_format: str = NORMALIZE_FORMAT,
+        quality: int = NORMALIZE_QUALITY,
+        enabled: bool = NORMALIZE_IMAGES,
+        pool: ProcessPoolService = process_pool
+    ):
+        if image_format not in _SAVE_OPTIONS:
+            safe_log("Unknown NORMALIZE_FORMAT %s, using jpeg", 'warning', image_format)
+            image_format = "jpeg"
+        self.max_dimension = max(0, max_dimension)
+        self.image_format = image_format
+        self.quality = quality
+        self.enabled = enabled
+        self.pool = pool
+
+    async def normalize(self, contents: bytes) -> bytes:
+        """The bytes to store for an upload
+
+        Falls back to the original bytes when disabled, and when the image
+        cannot be normalized (the upload still goes through).
+        """
+        if not self.enabled:
+            return contents
+        try:
+            normalized = await self.pool.run(
+                normalize_image, contents, self.max_dimension, self.image_format, self.quality
+            )
+        except Exception as e:
+            safe_log("Image normalization failed: %s", 'warning', e)
+            return contents
+
+        if normalized is None:
+            return contents
+        metrics_collector.record_image_normalized(len(contents), len(normalized))
+        return normalized
+
+
+# Global image normalizer instance
+image_normalizer = ImageNormalizer()
@@ -0,0 +1,98 @@
+"""
+Shared process pool for CPU-bound work
+
+Image decoding, thumbnail rendering, normalization and QR rendering hold the
+GIL for milliseconds to hundreds of milliseconds; run on the event loop they
+stall every other request of the worker. They run in this pool instead: one
+per uvicorn worker, sized to that worker's share of the machine's cores.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from app.utils.logger import safe_log
+
+
+def default_workers() -> int:
+    """Cores divided among the uvicorn workers (WEB_CONCURRENCY)"""
+    web_workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return max(1, (os.cpu_count() or 1) // web_workers)
+
+
+# 0 sizes the pool automatically
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", "0"))
+
+
+def _ready() -> bool:
+    return True
+
+
+class ProcessPoolService:
+    """A lazily (re)started process pool with asyncio-friendly submit/run"""
+
+    def __init__(self, workers: int = PROCESS_POOL_WORKERS):
+        self.workers = workers if workers > 0 else default_workers()
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        if self.executor is None:
+            # spawn: forking a process that runs the event loop, Motor and
+            # the log listener thread is not safe
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def warm_up(self):
+        """Start the worker processes now instead of on the first job"""
+        self.start()
+        for _ in range(self.workers):
+            self.executor.submit(_ready)
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        # Other callers may already have replaced the broken pool
+        if self.executor is executor:
+            safe_log("Process pool broke, starting a new one", 'warning')
+            self.executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, func: Callable, *args: Any) -> asyncio.Future:
+        """Schedule func(*args) in a worker process and return its future
+
+        func and args must be picklable (module-level functions, plain data).
+        A pool broken by a dying worker (e.g. OOM on a huge image) is replaced,
+        so only the jobs that were running on it fail.
+        """
+        loop = asyncio.get_running_loop()
+        self.start()
+        executor = self.executor
+        try:
+            future = loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            self._discard(executor)
+            self.start()
+            executor = self.executor
+            future = loop.run_in_executor(executor, func, *args)
+
+        def check_broken(done: asyncio.Future):
+            if not done.cancelled() and isinstance(done.exception(), BrokenProcessPool):
+                self._discard(executor)
+
+        future.add_done_callback(check_broken)
+        return future
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """Run func(*args) in a worker process"""
+        return await self.submit(func, *args)
+
+
+# Global process pool instance
+process_pool = ProcessPoolService()
@@ -0,0 +1,57 @@
+"""
+Redis access that degrades to an in-process fallback during outages
+
+Shared stores (rate limits, idempotency keys) keep working when Redis is
+unreachable by answering from a per-worker store instead. Redis is retried
+at most every `retry_interval` seconds while it is down, so an outage costs
+one timeout per interval rather than one per request.
+"""
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from app.utils.logger import safe_log
+
+T = TypeVar("T")
+
+
+class RedisFallback:
+    """A Redis client plus the outage state of the store using it"""
+
+    def __init__(self, url: str, name: str, fallback_name: str, retry_interval: float = 5.0):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        # For log messages, e.g. "Rate limit store" / "in-process limits"
+        self.name = name
+        self.fallback_name = fallback_name
+        self.retry_interval = retry_interval
+        self.using_fallback = False
+        self.retry_at = 0.0
+
+    @property
+    def available(self) -> bool:
+        """False while Redis is down and not yet due for a retry"""
+        return not (self.using_fallback and time.monotonic() < self.retry_at)
+
+    def failed(self, error: Exception):
+        if not self.using_fallback:
+            safe_log("%s unavailable, using %s: %s", 'warning', self.name, self.fallback_name, error)
+            self.using_fallback = True
+        self.retry_at = time.monotonic() + self.retry_interval
+
+    def recovered(self):
+        if self.using_fallback:
+            safe_log("%s reachable again", 'info', self.name)
+            self.using_fallback = False
+
+    async def run(self, call: Callable[[], Awaitable[T]], fallback: Callable[[], Awaitable[T]]) -> T:
+        """Result of call() against Redis, or of fallback() while Redis is down"""
+        if not self.available:
+            return await fallback()
+        try:
+            result = await call()
+        except Exception as e:
+            self.failed(e)
+            return await fallback()
+        self.recovered()
+        return result
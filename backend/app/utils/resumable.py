@@ -0,0 +1,217 @@
+"""
+Resumable uploads (tus 1.0 core protocol with the creation, termination and expiration extensions)
+
+Bytes received so far are spooled to a local directory, so an upload
+interrupted by a flaky connection continues from the last stored offset
+instead of starting over. All file I/O runs in worker threads. The directory is shared by all workers in a
+container; with several containers, route a client's upload to one of them
+(sticky sessions) or point RESUMABLE_UPLOAD_DIR at shared storage.
+"""
+import asyncio
+import base64
+import json
+import os
+import tempfile
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines; uploads are not locked
+    fcntl = None
+
+from fastapi import HTTPException
+
+from app.utils.logger import safe_log
+
+TUS_VERSION = "1.0.0"
+TUS_EXTENSIONS = "creation,termination,expiration"
+
+# PATCH bodies arrive in small ASGI chunks; write them in pieces of this size
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+RESUMABLE_UPLOAD_DIR = os.getenv("RESUMABLE_UPLOAD_DIR") or os.path.join(tempfile.gettempdir(), "qr_resumable_uploads")
+RESUMABLE_UPLOAD_TTL_SECONDS = int(os.getenv("RESUMABLE_UPLOAD_TTL_SECONDS", "86400"))
+
+
+def check_tus_resumable(header: Optional[str]):
+    """Reject requests for a protocol version this server does not speak (412)"""
+    if header != TUS_VERSION:
+        raise HTTPException(
+            status_code=412,
+            detail=f"Tus-Resumable {TUS_VERSION} is required",
+            headers={"Tus-Version": TUS_VERSION}
+        )
+
+
+def parse_upload_metadata(header: Optional[str]) -> Dict[str, str]:
+    """Decode an Upload-Metadata header ("key base64value,key2 base64value2")"""
+    metadata = {}
+    if not header:
+        return metadata
+    for item in header.split(","):
+        key, _, value = item.strip().partition(" ")
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value).decode("utf-8") if value else ""
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Upload-Metadata header")
+    return metadata
+
+
+class ResumableUploadStore:
+    """Partial uploads on local disk: <id>.part holds the bytes, <id>.json the upload's details"""
+
+    sweep_interval = 600.0
+
+    def __init__(self, directory: str = RESUMABLE_UPLOAD_DIR, ttl: int = RESUMABLE_UPLOAD_TTL_SECONDS):
+        self.directory = directory
+        self.ttl = ttl
+        self.next_sweep = 0.0
+
+    def _path(self, upload_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{upload_id}.{suffix}")
+
+    async def create(self, session_id: str, user_identifier: str, length: int, metadata: Dict[str, str]) -> dict:
+        now = time.time()
+        if now >= self.next_sweep:
+            self.next_sweep = now + self.sweep_interval
+            await asyncio.to_thread(self.sweep, now)
+
+        upload = {
+            "id": uuid.uuid4().hex,
+            "session_id": session_id,
+            "user_identifier": user_identifier,
+            "length": length,
+            "filename": metadata.get("filename") or "photo.jpg",
+            "content_type": metadata.get("filetype") or metadata.get("content_type") or "",
+            "expires_at": now + self.ttl,
+        }
+        await asyncio.to_thread(self._write_new, upload)
+        return upload
+
+    def _write_new(self, upload: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        open(self._path(upload["id"], "part"), "wb").close()
+        with open(self._path(upload["id"], "json"), "w", encoding="utf-8") as file:
+            json.dump(upload, file)
+
+    async def get(self, upload_id: str) -> Optional[dict]:
+        """The upload with its current offset, or None if unknown or expired"""
+        # Ids are hex; anything else could escape the directory
+        if len(upload_id) != 32 or not all(c in "0123456789abcdef" for c in upload_id):
+            return None
+        upload = await asyncio.to_thread(self._read, upload_id)
+        if upload is not None and upload["expires_at"] < time.time():
+            await self.remove(upload_id)
+            return None
+        return upload
+
+    def _read(self, upload_id: str) -> Optional[dict]:
+        try:
+            with open(self._path(upload_id, "json"), encoding="utf-8") as file:
+                upload = json.load(file)
+            upload["offset"] = os.path.getsize(self._path(upload_id, "part"))
+        except (OSError, ValueError):
+            return None
+        return upload
+
+    def part_path(self, upload_id: str) -> str:
+        return self._path(upload_id, "part")
+
+    def _open_for_append(self, upload_id: str, offset: int):
+        """The locked part file positioned at its end; raises 423 or 409"""
+        file = open(self.part_path(upload_id), "r+b")
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise HTTPException(status_code=423, detail="Upload is being written by another request")
+
+            current = os.fstat(file.fileno()).st_size
+            if offset != current:
+                raise HTTPException(status_code=409, detail=f"Upload-Offset mismatch, current offset is {current}")
+            file.seek(current)
+        except BaseException:
+            file.close()
+            raise
+        return file
+
+    @staticmethod
+    def _write_and_close(file, data: bytes, truncate_to: Optional[int] = None):
+        try:
+            if truncate_to is not None:
+                file.truncate(truncate_to)
+            elif data:
+                file.write(data)
+            file.flush()
+        finally:
+            file.close()
+
+    async def append(self, upload: dict, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Write a PATCH body at offset; returns the new offset
+
+        Bytes written before a client disconnect are kept, which is what
+        makes the upload resumable. Raises 409 if offset is not the current
+        offset, and 423 while another request is writing to the upload.
+        """
+        file = await asyncio.to_thread(self._open_for_append, upload["id"], offset)
+        written = offset
+        pending = bytearray()
+        truncate_to = None
+        try:
+            async for chunk in chunks:
+                if written + len(pending) + len(chunk) > upload["length"]:
+                    # Keep only what fits the declared length
+                    truncate_to = offset
+                    raise HTTPException(status_code=413, detail="Upload exceeds the declared Upload-Length")
+                pending += chunk
+                if len(pending) >= WRITE_BUFFER_SIZE:
+                    await asyncio.to_thread(file.write, bytes(pending))
+                    written += len(pending)
+                    pending.clear()
+        finally:
+            # Also runs on a disconnect, so the bytes received so far are kept
+            data = bytes(pending) if truncate_to is None else b""
+            await asyncio.to_thread(self._write_and_close, file, data, truncate_to)
+        return written + len(data)
+
+    async def remove(self, upload_id: str):
+        await asyncio.to_thread(self._remove, upload_id)
+
+    def _remove(self, upload_id: str):
+        for suffix in ("part", "json"):
+            try:
+                os.remove(self._path(upload_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def sweep(self, now: float) -> int:
+        """Delete expired uploads; returns the number removed (blocking, run in a thread)"""
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            upload_id = name[:-len(".json")]
+            try:
+                with open(self._path(upload_id, "json"), encoding="utf-8") as file:
+                    expired = json.load(file)["expires_at"] < now
+            except (OSError, ValueError, KeyError):
+                expired = True
+            if expired:
+                self._remove(upload_id)
+                removed += 1
+        if removed:
+            safe_log("Removed %s expired resumable uploads", 'info', removed)
+        return removed
+
+
+# Global resumable upload store instance
+resumable_upload_store = ResumableUploadStore()
@@ -0,0 +1,60 @@
+"""
+Fast JSON serialization shared by HTTP responses and WebSocket frames
+"""
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from starlette.responses import JSONResponse, Response
+
+# Non-string dict keys show up in analytics dumps (e.g. status codes)
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    """Encode types orjson does not handle natively"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to JSON bytes; ObjectId and datetime are handled natively"""
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+
+def dumps_text(obj: Any) -> str:
+    """Serialize to a JSON string (for WebSocket text frames)"""
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS).decode()
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from bytes or str"""
+    return orjson.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson.
+
+    Returning this directly from an endpoint also skips FastAPI's
+    jsonable_encoder pass, so Mongo documents can be returned as-is.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class StaticJSONResponse(Response):
+    """Response for a JSON body that was encoded once at import time"""
+
+    media_type = "application/json"
+
+    def __init__(self, body: bytes, status_code: int = 200, headers: dict = None):
+        super().__init__(content=body, status_code=status_code, headers=headers)
+
+
+def encode_static(obj: Any) -> bytes:
+    """Pre-encode a constant payload so it is never serialized per request"""
+    return dumps(obj)
@@ -0,0 +1,181 @@
+"""
+Ingestion-time thumbnails for gallery views
+
+Each upload is decoded and resized once, in the shared process pool so
+Pillow never runs on the event loop, and the derivatives are stored next to
+the original in Cloudinary. Galleries render ``thumbnail_url`` and only open
+the original ``url`` when a photo is viewed. The same job produces
+``placeholder``, a tiny blurred preview small enough to embed in photo
+listings, which galleries show while the thumbnail loads.
+"""
+import asyncio
+import base64
+import io
+import os
+from typing import Dict, List, Optional
+
+import cloudinary.uploader
+from PIL import Image, ImageOps
+
+from app.utils.images import TRANSPOSED_ORIENTATIONS
+from app.utils.logger import safe_log
+from app.utils.process_pool import ProcessPoolService, process_pool
+
+THUMBNAILS_ENABLED = os.getenv("THUMBNAILS_ENABLED", "true").lower() == "true"
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+# Longest edge of the embedded placeholder; 0 disables placeholders
+PLACEHOLDER_SIZE = int(os.getenv("PLACEHOLDER_SIZE", "16"))
+
+
+def _parse_sizes(value: str) -> Dict[str, int]:
+    """"small:320,medium:1024" -> {"small": 320, "medium": 1024} (longest edge in pixels)"""
+    sizes = {}
+    for item in value.split(","):
+        name, _, edge = item.strip().partition(":")
+        if name and edge.isdigit():
+            sizes[name] = int(edge)
+    return sizes
+
+
+THUMBNAIL_SIZES = _parse_sizes(os.getenv("THUMBNAIL_SIZES", "small:320,medium:1024"))
+
+# Size served as thumbnail_url in photo listings
+GALLERY_SIZE = "small"
+
+
+def render_placeholder(image: Image.Image, edge: int) -> str:
+    """A data URI of the image scaled down to edge pixels (about 100-200 bytes)
+
+    Browsers stretch it to the tile size, which gives the blur for free.
+    """
+    preview = image.copy()
+    preview.thumbnail((edge, edge), Image.BILINEAR)
+    buffer = io.BytesIO()
+    preview.save(buffer, format="WEBP", quality=50)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def render_thumbnails(contents: bytes, sizes: Dict[str, int], quality: int, placeholder_size: int = 0) -> dict:
+    """Decode an image once and encode a JPEG per size (runs in a worker process)
+
+    Returns the original's display dimensions, the placeholder (when
+    placeholder_size is set) and, per size name, the encoded bytes with
+    their dimensions. Images are never upscaled.
+    """
+    with Image.open(io.BytesIO(contents)) as image:
+        width, height = image.size
+        orientation = image.getexif().get(0x0112)
+        if orientation in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+
+        # JPEGs can be decoded at a reduced scale, which is most of the win
+        # for multi-megapixel phone photos
+        largest = max(sizes.values())
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+
+        if image.mode in ("RGBA", "LA", "P"):
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba.split()[-1])
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        renditions = {}
+        # Largest first, so each smaller size resamples from the previous one
+        for name, edge in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+            image.thumbnail((edge, edge), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+            renditions[name] = {"data": buffer.getvalue(), "width": image.width, "height": image.height}
+
+        # Scaled from the smallest rendition, which is already in memory
+        placeholder = render_placeholder(image, placeholder_size) if placeholder_size else None
+
+    return {"width": width, "height": height, "placeholder": placeholder, "renditions": renditions}
+
+
+class ThumbnailPipeline:
+    """Renders thumbnails for uploads in the shared process pool"""
+
+    def __init__(
+        self,
+        sizes: Dict[str, int] = THUMBNAIL_SIZES,
+        quality: int = THUMBNAIL_QUALITY,
+        enabled: bool = THUMBNAILS_ENABLED,
+        placeholder_size: int = PLACEHOLDER_SIZE,
+        pool: ProcessPoolService = process_pool
+    ):
+        self.sizes = sizes
+        self.quality = quality
+        self.placeholder_size = max(0, placeholder_size)
+        self.enabled = enabled and bool(sizes)
+        self.pool = pool
+
+    def render(self, contents: bytes) -> Optional[asyncio.Future]:
+        """Schedule rendering and return a future, or None when disabled
+
+        Call this before the original is uploaded so both run concurrently.
+        """
+        if not self.enabled:
+            return None
+        try:
+            return self.pool.submit(render_thumbnails, contents, self.sizes, self.quality, self.placeholder_size)
+        except Exception as e:
+            # Thumbnails are optional; never fail the upload over the pool
+            safe_log("Thumbnail pool unavailable: %s", 'error', e)
+            return None
+
+    async def store(self, job: asyncio.Future, folder: str, public_id: str) -> dict:
+        """Wait for a render job and upload its renditions next to the original
+
+        Returns the fields to add to the photo document.
+        """
+        rendered = await job
+
+        async def upload(name: str, rendition: dict) -> dict:
+            result = await asyncio.to_thread(
+                cloudinary.uploader.upload,
+                rendition["data"],
+                folder=folder,
+                public_id=f"{public_id}_{name}",
+                resource_type="image"
+            )
+            return {
+                "public_id": result["public_id"],
+                "url": result["secure_url"],
+                "width": rendition["width"],
+                "height": rendition["height"]
+            }
+
+        names = list(rendered["renditions"])
+        stored = await asyncio.gather(*(upload(name, rendered["renditions"][name]) for name in names))
+        thumbnails = dict(zip(names, stored))
+        gallery = thumbnails.get(GALLERY_SIZE) or min(stored, key=lambda item: item["width"])
+        return {
+            "width": rendered["width"],
+            "height": rendered["height"],
+            "thumbnail_url": gallery["url"],
+            "thumbnails": thumbnails,
+            "placeholder": rendered.get("placeholder")
+        }
+
+
+def thumbnail_public_ids(photo: dict) -> List[str]:
+    """Cloudinary public ids of a photo's stored thumbnails"""
+    return [item["public_id"] for item in (photo.get("thumbnails") or {}).values() if item.get("public_id")]
+
+
+async def destroy_thumbnails(photo: dict):
+    """Delete a photo's thumbnails from Cloudinary (off the event loop)"""
+    async def destroy(public_id: str):
+        try:
+            await asyncio.to_thread(cloudinary.uploader.destroy, public_id)
+        except Exception as e:
+            safe_log("Failed to delete thumbnail %s from Cloudinary: %s", 'error', public_id, e)
+
+    await asyncio.gather(*(destroy(public_id) for public_id in thumbnail_public_ids(photo)))
+
+
+# Global thumbnail pipeline instance
+thumbnail_pipeline = ThumbnailPipeline()
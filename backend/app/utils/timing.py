@@ -0,0 +1,97 @@
+"""
+Lightweight stage timers feeding Prometheus and the Server-Timing header
+"""
+import functools
+import inspect
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from app.utils.metrics import metrics_collector
+
+# Stage durations always go to Prometheus; the per-response header is opt-in
+# since it reveals backend timings to clients.
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+
+class RequestTimings:
+    """Stage durations collected while handling one request"""
+
+    __slots__ = ("started", "entries")
+
+    def __init__(self, started: float):
+        self.started = started
+        self.entries: List[Tuple[str, float]] = []
+
+    def add(self, stage: str, duration: float):
+        self.entries.append((stage, duration))
+
+    def header_value(self, total: Optional[float] = None) -> bytes:
+        """Server-Timing header value (durations in milliseconds)"""
+        entries = list(self.entries)
+        if total is not None:
+            entries.append(("total", total))
+        return ", ".join(f"{stage};dur={duration * 1000:.1f}" for stage, duration in entries).encode()
+
+
+# Set by the request pipeline for every HTTP request
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+
+def _record(pipeline: str, stage: str, duration: float, failed: bool = False):
+    metrics_collector.record_stage_duration(pipeline, stage, duration, failed)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(stage, duration)
+
+
+def _is_server_failure(error: BaseException) -> bool:
+    """Client errors (HTTPException 4xx) are expected outcomes, not stage failures"""
+    return getattr(error, "status_code", 500) >= 500
+
+
+@contextmanager
+def span(stage: str, pipeline: str = "upload"):
+    """Time a block of code as one pipeline stage
+
+    Usage:
+        with span("storage_upload"):
+            result = await upload(...)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as error:
+        _record(pipeline, stage, time.perf_counter() - start, _is_server_failure(error))
+        raise
+    _record(pipeline, stage, time.perf_counter() - start)
+
+
+def timed(stage: str, pipeline: str = "upload"):
+    """Decorator form of span() for sync and async functions"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage, pipeline):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage, pipeline):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_since_request_start(stage: str, pipeline: str = "upload"):
+    """Record the time from request arrival until now as a stage
+
+    Used for work done before the endpoint runs, e.g. multipart parsing.
+    """
+    timings = current_timings.get()
+    if timings is not None:
+        _record(pipeline, stage, time.perf_counter() - timings.started)
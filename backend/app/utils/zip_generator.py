@@ -4,27 +4,8 @@ import requests
 from typing import List, Dict
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import os
-import logging
 
-def safe_log(message: str, level: str = 'info'):
-    """Simple logging that works in all environments"""
-    # Check multiple environment indicators for production
-    env = (os.getenv('NODE_ENV', '') or 
-           os.getenv('RAILWAY_ENVIRONMENT', '') or 
-           os.getenv('VERCEL_ENV', '') or 
-           'development').lower()
-    
-    is_production = env in ('production', 'prod')
-    if is_production and level in ('info', 'debug'):
-        return
-    
-    if level == 'error':
-        logging.error(message)
-    elif level == 'warning':
-        logging.warning(message)
-    else:
-        logging.info(message)
+from app.utils.logger import safe_log
 
 
 def download_image_from_url(url: str, filename: str) -> tuple:
@@ -97,7 +78,7 @@ This ZIP file contains all photos uploaded to your QR Photo Session.
                     filename, content = future.result(timeout=60)
                     if content:
                         zip_file.writestr(f"photos/{filename}", content)
-                        safe_log(f"Added {filename} to ZIP", 'debug')
+                        safe_log("Added %s to ZIP", 'debug', filename)
                     else:
                         safe_log(f"Skipped {filename} - download failed", 'warning')
                 except Exception as e:
@@ -1,9 +1,89 @@
-from typing import Dict, List, Set
+from typing import Dict, List, Set, Optional, Union
+from collections import deque
 from fastapi import WebSocket
-import json
+import os
 import asyncio
 from datetime import datetime, timedelta
 from app.utils.logger import safe_log
+from app.utils.metrics import metrics_collector
+from app.utils.serialization import dumps_text
+
+# Outbound queue tuning (per connection)
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 64))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", 10))
+
+# Message types where only the latest pending copy matters; when the queue is
+# full a new one replaces the pending one instead of evicting something else
+MERGEABLE_MESSAGE_TYPES = {"photo_uploaded"}
+
+
+class OutboundQueue:
+    """Bounded outbound message queue for a single WebSocket connection.
+    
+    Producers call put() which never awaits; a dedicated writer task drains
+    the queue with get(). When the queue is full, mergeable messages replace a
+    pending message of the same type, otherwise the oldest message that does
+    not require an acknowledgment is dropped (falling back to the oldest).
+    """
+    
+    def __init__(self, maxsize: int = WS_SEND_QUEUE_SIZE):
+        self.maxsize = max(1, maxsize)
+        self._messages: deque = deque()
+        self._ready = asyncio.Event()
+    
+    def __len__(self) -> int:
+        return len(self._messages)
+    
+    def put(self, message: Union[dict, str]):
+        """Enqueue a message without waiting on the network"""
+        if len(self._messages) >= self.maxsize:
+            if self._merge(message):
+                metrics_collector.record_websocket_drop("merged")
+                return
+            self._drop_one()
+            metrics_collector.record_websocket_drop("dropped")
+        
+        self._messages.append(message)
+        metrics_collector.record_websocket_enqueue(len(self._messages))
+        self._ready.set()
+    
+    async def get(self) -> Union[dict, str]:
+        """Wait for and return the next message to write"""
+        while not self._messages:
+            self._ready.clear()
+            await self._ready.wait()
+        metrics_collector.record_websocket_dequeue()
+        return self._messages.popleft()
+    
+    def clear(self):
+        """Discard all pending messages"""
+        if self._messages:
+            metrics_collector.record_websocket_dequeue(len(self._messages))
+            self._messages.clear()
+    
+    def _merge(self, message: Union[dict, str]) -> bool:
+        """Replace a pending message of the same mergeable type, if any"""
+        if not isinstance(message, dict) or message.get("type") not in MERGEABLE_MESSAGE_TYPES:
+            return False
+        
+        for index in range(len(self._messages) - 1, -1, -1):
+            pending = self._messages[index]
+            if isinstance(pending, dict) and pending.get("type") == message["type"]:
+                merged_count = pending.get("merged_count", 1) + 1
+                self._messages[index] = {**message, "merged_count": merged_count}
+                return True
+        return False
+    
+    def _drop_one(self):
+        """Evict one pending message to make room"""
+        for index, pending in enumerate(self._messages):
+            if not (isinstance(pending, dict) and pending.get("ack_required")):
+                del self._messages[index]
+                break
+        else:
+            self._messages.popleft()
+        metrics_collector.record_websocket_dequeue()
+
 
 class WebSocketManager:
     def __init__(self):
@@ -15,6 +95,9 @@ class WebSocketManager:
         self.connection_heartbeat: Dict[WebSocket, datetime] = {}
         # Message sequence numbers for each connection
         self.connection_sequences: Dict[WebSocket, int] = {}
+        # WebSocket -> outbound queue and the writer task draining it
+        self.connection_queues: Dict[WebSocket, OutboundQueue] = {}
+        self.connection_writers: Dict[WebSocket, asyncio.Task] = {}
     
     async def connect(self, websocket: WebSocket, session_id: str, user_id: str = None):
         """Connect a WebSocket to a session room (only for session owners)"""
@@ -28,15 +111,21 @@ class WebSocketManager:
         if user_id:
             self.session_connections[session_id][user_id] = websocket
             self.connection_mapping[websocket] = (session_id, user_id)
-            safe_log(f"WebSocket connected to session {session_id} for user {user_id}", 'debug')
+            safe_log("WebSocket connected to session %s for user %s", 'debug', session_id, user_id)
         else:
             # For anonymous users, don't store the connection (no notifications)
             self.connection_mapping[websocket] = (session_id, None)
-            safe_log(f"WebSocket connected to session {session_id} (anonymous - no notifications)", 'debug')
+            safe_log("WebSocket connected to session %s (anonymous - no notifications)", 'debug', session_id)
         
         # Initialize heartbeat and sequence tracking
         self.connection_heartbeat[websocket] = datetime.utcnow()
         self.connection_sequences[websocket] = 0
+        
+        # Start the dedicated writer for this connection
+        queue = OutboundQueue()
+        self.connection_queues[websocket] = queue
+        self.connection_writers[websocket] = asyncio.create_task(self._writer(websocket, queue))
+        metrics_collector.update_websocket_connections(len(self.connection_mapping))
     
     def disconnect(self, websocket: WebSocket):
         """Disconnect a WebSocket and clean up"""
@@ -59,35 +148,76 @@ class WebSocketManager:
             self.connection_heartbeat.pop(websocket, None)
             self.connection_sequences.pop(websocket, None)
             
-            safe_log(f"WebSocket disconnected from session {session_id} (user: {user_id or 'anonymous'})", 'debug')
+            # Stop the writer and discard anything still queued
+            queue = self.connection_queues.pop(websocket, None)
+            if queue is not None:
+                queue.clear()
+            writer = self.connection_writers.pop(websocket, None)
+            if writer is not None and writer is not asyncio.current_task():
+                writer.cancel()
+            metrics_collector.update_websocket_connections(len(self.connection_mapping))
+            
+            safe_log("WebSocket disconnected from session %s (user: %s)", 'debug', session_id, user_id or 'anonymous')
     
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        """Send message to a specific WebSocket"""
+    async def _writer(self, websocket: WebSocket, queue: OutboundQueue):
+        """Drain a connection's outbound queue onto the network"""
         try:
-            await websocket.send_text(message)
+            while True:
+                message = await queue.get()
+                message_str = message if isinstance(message, str) else dumps_text(message)
+                await asyncio.wait_for(websocket.send_text(message_str), timeout=WS_SEND_TIMEOUT_SECONDS)
+                
+                # Update heartbeat when a message actually went out
+                self.update_heartbeat(websocket)
+        except asyncio.CancelledError:
+            pass
         except Exception as e:
-            safe_log(f"Error sending personal message: {e}", 'error')
+            safe_log("Error writing to WebSocket, closing connection: %r", 'error', e)
             self.disconnect(websocket)
+            # Close the socket too, so the client notices and reconnects
+            # (1001 for a client that stopped reading, 1011 for other failures)
+            code = 1001 if isinstance(e, asyncio.TimeoutError) else 1011
+            try:
+                await asyncio.wait_for(websocket.close(code=code), timeout=WS_SEND_TIMEOUT_SECONDS)
+            except Exception:
+                pass  # Connection might already be closed
+    
+    def is_connected(self, websocket: WebSocket) -> bool:
+        """False once the connection has been dropped, e.g. by a failed write"""
+        return websocket in self.connection_mapping
+    
+    def enqueue(self, message: Union[dict, str], websocket: WebSocket) -> bool:
+        """Queue a message for a connection; returns False if it is not connected"""
+        queue = self.connection_queues.get(websocket)
+        if queue is None:
+            return False
+        queue.put(message)
+        return True
+    
+    def get_queue_depth(self, websocket: WebSocket) -> int:
+        """Get number of messages waiting to be written to a connection"""
+        queue = self.connection_queues.get(websocket)
+        return len(queue) if queue is not None else 0
+    
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        """Send message to a specific WebSocket"""
+        if not self.enqueue(message, websocket):
+            safe_log("Error sending personal message: connection is not registered", 'error')
     
     async def notify_session_owner(self, session_id: str, owner_id: str, message: dict):
         """Send notification only to session owner"""
         if session_id not in self.session_connections:
-            safe_log(f"No connections found for session {session_id}", 'debug')
+            safe_log("No connections found for session %s", 'debug', session_id)
             return
         
         if owner_id not in self.session_connections[session_id]:
-            safe_log(f"Session owner {owner_id} not connected to session {session_id}", 'debug')
+            safe_log("Session owner %s not connected to session %s", 'debug', owner_id, session_id)
             return
             
         websocket = self.session_connections[session_id][owner_id]
-        message_str = json.dumps(message)
         
-        try:
-            await websocket.send_text(message_str)
-            safe_log(f"Notification sent to session owner {owner_id} for session {session_id}", 'debug')
-        except Exception as e:
-            safe_log(f"Error sending notification to owner: {e}", 'error')
-            self.disconnect(websocket)
+        if self.enqueue(message, websocket):
+            safe_log("Notification queued for session owner %s for session %s", 'debug', owner_id, session_id)
     
     async def notify_photo_uploaded(self, session_id: str, owner_id: str, photo_data: dict):
         """Send photo upload notification to session owner only"""
@@ -97,27 +227,26 @@ class WebSocketManager:
             "data": {
                 "filename": photo_data.get("filename"),
                 "url": photo_data.get("url"),
+                "thumbnail_url": photo_data.get("thumbnail_url"),
                 "upload_count": photo_data.get("upload_count", 0),
+                # Photos covered by this notification (batch uploads send one)
+                "batch_count": photo_data.get("batch_count", 1),
                 "uploaded_by": photo_data.get("uploaded_by")
             }
         }
         
         if session_id not in self.session_connections:
-            safe_log(f"No connections found for session {session_id}", 'debug')
+            safe_log("No connections found for session %s", 'debug', session_id)
             return
         
         if owner_id not in self.session_connections[session_id]:
-            safe_log(f"Session owner {owner_id} not connected to session {session_id}", 'debug')
+            safe_log("Session owner %s not connected to session %s", 'debug', owner_id, session_id)
             return
             
         websocket = self.session_connections[session_id][owner_id]
         
-        try:
-            await self.send_enhanced_message(notification_data, websocket, require_ack=True)
-            safe_log(f"Photo upload notification sent to session owner {owner_id} for session {session_id}", 'debug')
-        except Exception as e:
-            safe_log(f"Error sending photo upload notification to owner: {e}", 'error')
-            self.disconnect(websocket)
+        if self.enqueue_enhanced_message(notification_data, websocket, require_ack=True):
+            safe_log("Photo upload notification queued for session owner %s for session %s", 'debug', owner_id, session_id)
     
     def get_session_connection_count(self, session_id: str) -> int:
         """Get number of active connections for a session"""
@@ -135,26 +264,21 @@ class WebSocketManager:
             return self.connection_sequences[websocket]
         return 0
     
+    def enqueue_enhanced_message(self, message_data: dict, websocket: WebSocket, require_ack: bool = False) -> bool:
+        """Queue enhanced message with sequence number and timestamp"""
+        # Add metadata to message (the timestamp is encoded by the writer)
+        enhanced_message = {
+            **message_data,
+            "sequence": self.get_next_sequence(websocket),
+            "timestamp": datetime.utcnow(),
+            "ack_required": require_ack
+        }
+        return self.enqueue(enhanced_message, websocket)
+    
     async def send_enhanced_message(self, message_data: dict, websocket: WebSocket, require_ack: bool = False):
         """Send enhanced message with sequence number and timestamp"""
-        try:
-            # Add metadata to message
-            enhanced_message = {
-                **message_data,
-                "sequence": self.get_next_sequence(websocket),
-                "timestamp": datetime.utcnow().isoformat(),
-                "ack_required": require_ack
-            }
-            
-            message_str = json.dumps(enhanced_message)
-            await websocket.send_text(message_str)
-            
-            # Update heartbeat when sending message
-            self.update_heartbeat(websocket)
-            
-        except Exception as e:
-            safe_log(f"Error sending enhanced message: {e}", 'error')
-            self.disconnect(websocket)
+        if not self.enqueue_enhanced_message(message_data, websocket, require_ack):
+            safe_log("Error sending enhanced message: connection is not registered", 'error')
     
     def get_stale_connections(self, timeout_minutes: int = 5) -> List[WebSocket]:
         """Get connections that haven't sent heartbeat in specified minutes"""
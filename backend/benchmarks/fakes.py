@@ -0,0 +1,516 @@
+"""
+In-process stand-ins for MongoDB and Cloudinary used by the benchmark suite.
+
+InMemoryDatabase implements the subset of the Motor API the app uses
+(find_one/find/insert/update/delete/count, unique indexes, ping) over plain
+dicts, with an optional per-operation delay to mimic a network round trip.
+FakeStorageServer is a threaded HTTP server that answers the Cloudinary
+upload/destroy/ping API and serves image bytes, so the real SDK and ZIP
+download code paths run unchanged against it. It checks upload signatures
+and signs its responses, so clients can also upload to it directly with
+the parameters of a direct upload ticket.
+"""
+import asyncio
+import copy
+import io
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+
+# ---------------------------------------------------------------------------
+# MongoDB stand-in
+# ---------------------------------------------------------------------------
+
+def _get(document: dict, dotted: str):
+    value: Any = document
+    for part in dotted.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+BSON_TYPES = {"string": str, "int": int, "bool": bool, "object": dict, "array": list}
+
+
+def _matches_condition(value, condition) -> bool:
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        for operator, operand in condition.items():
+            if operator == "$lt" and not (value is not None and value < operand):
+                return False
+            if operator == "$lte" and not (value is not None and value <= operand):
+                return False
+            if operator == "$gt" and not (value is not None and value > operand):
+                return False
+            if operator == "$gte" and not (value is not None and value >= operand):
+                return False
+            if operator == "$ne" and value == operand:
+                return False
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$nin" and value in operand:
+                return False
+            if operator == "$exists" and (value is not None) != bool(operand):
+                return False
+            if operator == "$type" and not isinstance(value, BSON_TYPES[operand]):
+                return False
+        return True
+    return value == condition
+
+
+def matches(document: dict, query: Optional[dict]) -> bool:
+    if not query:
+        return True
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, sub) for sub in condition):
+                return False
+        elif not _matches_condition(_get(document, key), condition):
+            return False
+    return True
+
+
+def _set(document: dict, dotted: str, value):
+    parts = dotted.split(".")
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+
+def apply_update(document: dict, update: dict, inserting: bool = False):
+    for operator, fields in update.items():
+        for key, value in fields.items():
+            if operator == "$set":
+                _set(document, key, value)
+            elif operator == "$setOnInsert":
+                if inserting:
+                    _set(document, key, value)
+            elif operator == "$inc":
+                _set(document, key, (_get(document, key) or 0) + value)
+            elif operator == "$unset":
+                document.pop(key, None)
+            elif operator == "$push":
+                current = _get(document, key) or []
+                _set(document, key, current + [value])
+            else:
+                raise NotImplementedError(f"Update operator {operator} not supported")
+
+
+class InMemoryCursor:
+    def __init__(self, documents: List[dict], delay: float):
+        self.documents = documents
+        self.delay = delay
+
+    def sort(self, key, direction: int = 1):
+        if isinstance(key, list):
+            for field, field_direction in reversed(key):
+                self.sort(field, field_direction)
+            return self
+        self.documents.sort(key=lambda doc: (_get(doc, key) is None, _get(doc, key)), reverse=direction < 0)
+        return self
+
+    def skip(self, count: int):
+        self.documents = self.documents[count:]
+        return self
+
+    def limit(self, count: int):
+        if count:
+            self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length: Optional[int] = None):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.documents[:length] if length else list(self.documents)
+
+    def __aiter__(self):
+        self._iterator = iter(self.documents)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+# Equality lookups on these fields use a hash index instead of a full scan,
+# so the stand-in's cost stays flat as the benchmark grows the collections
+INDEXED_FIELDS = ("session_id", "user_id")
+
+
+class InMemoryCollection:
+    def __init__(self, name: str, delay: float = 0.0):
+        self.name = name
+        self.delay = delay
+        self.documents: Dict[Any, dict] = {}
+        # field -> {value: {_id: None}} (dicts keep insertion order)
+        self.indexes: Dict[str, Dict[Any, Dict[Any, None]]] = {field: {} for field in INDEXED_FIELDS}
+        # unique index fields -> {key tuple: _id}, and the optional partialFilterExpression
+        self.unique_indexes: Dict[tuple, Dict[tuple, Any]] = {}
+        self.partial_filters: Dict[tuple, Optional[dict]] = {}
+
+    async def _round_trip(self):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+    def _store(self, document: dict, previous: Optional[dict] = None):
+        """Write a document, maintaining unique indexes"""
+        document_id = document["_id"]
+        for fields, entries in self.unique_indexes.items():
+            if not self._in_index(fields, document):
+                continue
+            key = tuple(_get(document, field) for field in fields)
+            owner = entries.get(key)
+            if owner is not None and owner != document_id:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {fields} dup key: {key}")
+        for fields, entries in self.unique_indexes.items():
+            if previous is not None and self._in_index(fields, previous):
+                entries.pop(tuple(_get(previous, field) for field in fields), None)
+            if self._in_index(fields, document):
+                entries[tuple(_get(document, field) for field in fields)] = document_id
+        for field, index in self.indexes.items():
+            if previous is not None:
+                index.get(previous.get(field), {}).pop(document_id, None)
+            index.setdefault(document.get(field), {})[document_id] = None
+        self.documents[document_id] = document
+
+    def _remove(self, document: dict):
+        document_id = document["_id"]
+        for fields, entries in self.unique_indexes.items():
+            if self._in_index(fields, document):
+                entries.pop(tuple(_get(document, field) for field in fields), None)
+        for field, index in self.indexes.items():
+            index.get(document.get(field), {}).pop(document_id, None)
+        del self.documents[document_id]
+
+    def _in_index(self, fields: tuple, document: dict) -> bool:
+        return matches(document, self.partial_filters.get(fields))
+
+    def _candidates(self, query: Optional[dict]):
+        if query:
+            if "_id" in query and not isinstance(query["_id"], dict):
+                document = self.documents.get(query["_id"])
+                return [document] if document is not None else []
+            for field, index in self.indexes.items():
+                value = query.get(field)
+                if value is not None and not isinstance(value, dict):
+                    return [self.documents[document_id] for document_id in index.get(value, ())]
+        return list(self.documents.values())
+
+    def _find(self, query: Optional[dict]) -> List[dict]:
+        return [doc for doc in self._candidates(query) if matches(doc, query)]
+
+    async def create_index(self, keys, unique: bool = False, partialFilterExpression: Optional[dict] = None, name: Optional[str] = None, **kwargs):
+        fields = (keys,) if isinstance(keys, str) else tuple(field for field, _ in keys)
+        if unique and fields not in self.unique_indexes:
+            self.partial_filters[fields] = partialFilterExpression
+            self.unique_indexes[fields] = {
+                tuple(_get(doc, field) for field in fields): doc["_id"]
+                for doc in self.documents.values() if self._in_index(fields, doc)
+            }
+        return name or "_".join(fields)
+
+    async def find_one(self, query: Optional[dict] = None, *args, **kwargs):
+        await self._round_trip()
+        for document in self._candidates(query):
+            if matches(document, query):
+                return copy.copy(document)
+        return None
+
+    def find(self, query: Optional[dict] = None, *args, **kwargs):
+        return InMemoryCursor([copy.copy(doc) for doc in self._find(query)], self.delay)
+
+    async def insert_one(self, document: dict):
+        await self._round_trip()
+        document.setdefault("_id", ObjectId())
+        self._store(copy.copy(document))
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    async def insert_many(self, documents: List[dict], ordered: bool = True):
+        await self._round_trip()
+        inserted = []
+        errors = []
+        for index, document in enumerate(documents):
+            document.setdefault("_id", ObjectId())
+            try:
+                self._store(copy.copy(document))
+            except DuplicateKeyError as error:
+                errors.append({"index": index, "code": 11000, "errmsg": str(error)})
+                if ordered:
+                    break
+                continue
+            inserted.append(document["_id"])
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return SimpleNamespace(inserted_ids=inserted)
+
+    def _update_matching(self, query: dict, update: dict, upsert: bool) -> Tuple[Optional[dict], Optional[dict]]:
+        """Update the first match; returns (before, after)"""
+        for document in self._candidates(query):
+            if matches(document, query):
+                updated = copy.deepcopy(document)
+                apply_update(updated, update)
+                self._store(updated, previous=document)
+                return document, updated
+        if upsert:
+            document = {key: value for key, value in query.items() if not key.startswith("$") and not isinstance(value, dict)}
+            document["_id"] = ObjectId()
+            apply_update(document, update, inserting=True)
+            self._store(document)
+            return None, document
+        return None, None
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        await self._round_trip()
+        before, after = self._update_matching(query, update, upsert)
+        return SimpleNamespace(
+            matched_count=int(before is not None),
+            modified_count=int(before is not None),
+            upserted_id=after["_id"] if before is None and after is not None else None
+        )
+
+    async def update_many(self, query: dict, update: dict, upsert: bool = False):
+        await self._round_trip()
+        count = 0
+        for document in self._find(query):
+            updated = copy.deepcopy(document)
+            apply_update(updated, update)
+            self._store(updated, previous=document)
+            count += 1
+        return SimpleNamespace(matched_count=count, modified_count=count, upserted_id=None)
+
+    async def find_one_and_update(self, query: dict, update: dict, upsert: bool = False,
+                                  return_document=ReturnDocument.BEFORE, **kwargs):
+        await self._round_trip()
+        before, after = self._update_matching(query, update, upsert)
+        document = after if return_document == ReturnDocument.AFTER else before
+        return copy.copy(document) if document is not None else None
+
+    async def delete_one(self, query: dict):
+        await self._round_trip()
+        for document in self._candidates(query):
+            if matches(document, query):
+                self._remove(document)
+                return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    async def delete_many(self, query: dict):
+        await self._round_trip()
+        doomed = self._find(query)
+        for document in doomed:
+            self._remove(document)
+        return SimpleNamespace(deleted_count=len(doomed))
+
+    async def count_documents(self, query: Optional[dict] = None, **kwargs):
+        await self._round_trip()
+        return len(self._find(query))
+
+
+class InMemoryDatabase:
+    """Attribute and item access return (and create) collections, like Motor"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.collections: Dict[str, InMemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        if name not in self.collections:
+            self.collections[name] = InMemoryCollection(name, self.delay)
+        return self.collections[name]
+
+    def __getattr__(self, name: str) -> InMemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, name, *args, **kwargs):
+        return {"ok": 1.0}
+
+
+def install_database(delay: float = 0.0) -> InMemoryDatabase:
+    """Point app.database at a fresh in-memory database"""
+    from app import database
+
+    fake = InMemoryDatabase(delay)
+    database.database = fake
+    return fake
+
+
+# ---------------------------------------------------------------------------
+# Cloudinary stand-in
+# ---------------------------------------------------------------------------
+
+def make_jpeg(width: int = 1600, height: int = 1200, quality: int = 85) -> bytes:
+    """A photo-sized JPEG with enough detail to not compress to nothing"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (width, height), (40, 90, 160))
+    draw = ImageDraw.Draw(image)
+    for index in range(0, width, 24):
+        draw.line([(index, 0), (width - index, height)], fill=(index % 255, 120, 255 - index % 255), width=3)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _form_fields(body: bytes) -> Dict[str, str]:
+    """Plain (non-file) fields of a multipart/form-data body"""
+    return {
+        name.decode(): value.decode()
+        for name, value in re.findall(rb'name="([^"]+)"\r\n\r\n(.*?)\r\n--', body, re.S)
+    }
+
+
+class _StorageHandler(BaseHTTPRequestHandler):
+    server: "FakeStorageServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _json(self, payload: dict, status: int = 200):
+        self._send(status, json.dumps(payload).encode(), "application/json")
+
+    def do_GET(self):
+        if self.path.endswith("/ping"):
+            return self._json({"status": "ok"})
+        if self.path.startswith("/media/"):
+            self.server.stats["downloads"] += 1
+            return self._send(200, self.server.image_bytes, "image/jpeg")
+        if "/resources/image/upload/" in self.path:
+            public_id = unquote(self.path.split("/resources/image/upload/", 1)[1].split("?", 1)[0])
+            asset = self.server.assets.get(public_id)
+            if asset is None:
+                return self._json({"error": {"message": f"Resource not found - {public_id}"}}, 404)
+            return self._json(asset)
+        return self._json({"error": {"message": "not found"}}, 404)
+
+    def do_POST(self):
+        body = self._read_body()
+        action = self.path.rstrip("/").rsplit("/", 1)[-1]
+        if action == "upload":
+            fields = _form_fields(body)
+            if not self.server.signature_valid(fields):
+                return self._json({"error": {"message": "Invalid Signature"}}, 401)
+            self.server.stats["uploads"] += 1
+            self.server.stats["bytes_in"] += len(body)
+            public_id = fields.get("public_id") or uuid.uuid4().hex
+            if fields.get("folder"):
+                public_id = f"{fields['folder']}/{public_id}"
+            version = next(self.server.versions)
+            asset = self.server.assets[public_id] = {
+                "public_id": public_id,
+                "version": version,
+                "signature": self.server.sign({"public_id": public_id, "version": version}),
+                "resource_type": "image",
+                "type": "upload",
+                "format": "jpg",
+                "width": 1600,
+                "height": 1200,
+                "bytes": len(body),
+                "created_at": datetime.utcnow().isoformat() + "Z",
+                "url": f"{self.server.base_url}/media/v{version}/{public_id}.jpg",
+                "secure_url": f"{self.server.base_url}/media/v{version}/{public_id}.jpg",
+            }
+            return self._json(asset)
+        if action == "destroy":
+            self.server.stats["deletes"] += 1
+            self.server.assets.pop(_form_fields(body).get("public_id"), None)
+            return self._json({"result": "ok"})
+        if action == "ping":
+            return self._json({"status": "ok"})
+        return self._json({"error": {"message": f"unsupported action {action}"}}, 404)
+
+
+class FakeStorageServer(ThreadingHTTPServer):
+    """Cloudinary-compatible upload API plus a media host, on a background thread"""
+
+    daemon_threads = True
+
+    # Upload signatures older than this are rejected, as Cloudinary does
+    signature_max_age = 3600
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, image_bytes: Optional[bytes] = None,
+                 api_key: str = "bench-key", api_secret: str = "bench-secret"):
+        super().__init__((host, port), _StorageHandler)
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.image_bytes = image_bytes or make_jpeg()
+        self.versions = itertools.count(1)
+        # public_id -> upload response, for Admin API lookups
+        self.assets: Dict[str, dict] = {}
+        self.stats = {"uploads": 0, "downloads": 0, "deletes": 0, "bytes_in": 0}
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def sign(self, params: Dict[str, Any]) -> str:
+        from cloudinary.utils import api_sign_request
+
+        return api_sign_request(params, self.api_secret)
+
+    def signature_valid(self, fields: Dict[str, str]) -> bool:
+        """Check a signed upload the way Cloudinary does (unsigned uploads pass)"""
+        if "signature" not in fields:
+            return True
+        signed = {
+            name: value for name, value in fields.items()
+            if name not in ("signature", "api_key", "file", "resource_type", "cloud_name")
+        }
+        try:
+            fresh = time.time() - int(signed.get("timestamp", "")) < self.signature_max_age
+        except ValueError:
+            return False
+        return fresh and fields.get("api_key") == self.api_key and fields["signature"] == self.sign(signed)
+
+    def start(self) -> "FakeStorageServer":
+        self.thread = threading.Thread(target=self.serve_forever, name="fake-storage", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def install_storage(server: FakeStorageServer):
+    """Route the Cloudinary SDK to the fake storage server"""
+    import cloudinary
+
+    cloudinary.config(
+        cloud_name="bench",
+        api_key=server.api_key,
+        api_secret=server.api_secret,
+        upload_prefix=server.base_url,
+    )
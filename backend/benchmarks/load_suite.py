@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the API against in-memory MongoDB and storage fakes.
+
+Starts the app in a child process (uvicorn, one worker) with the MongoDB
+stand-in from benchmarks/fakes.py and a fake Cloudinary server, seeds owner
+accounts and sessions, then drives each scenario for a fixed duration with
+closed-loop workers over real HTTP/WebSocket connections:
+
+    guest_uploads    new guests uploading photos to random sessions
+    owner_dashboard  owners with a WebSocket open polling their session
+                     and photo list while guests upload
+    gallery_polling  guests polling a session and their photo list
+    zip_download     owners downloading their session as a ZIP
+    mixed            all of the above at once
+
+For each scenario the report has requests/s, error count, p50/p95/p99
+latency per operation and the server's RSS (start/peak/end). The JSON
+report includes the git commit, so runs can be diffed between commits.
+
+Run from the backend directory:
+    python benchmarks/load_suite.py --duration 10 --output bench-results.json
+    python benchmarks/load_suite.py --scenarios guest_uploads,zip_download
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("JWT_SECRET_KEY", "bench-only-Zq8#vX2!mL9@pR4$wT7^nB1&cF6*hJ3%")
+
+SCENARIOS = ("guest_uploads", "owner_dashboard", "gallery_polling", "zip_download", "mixed")
+
+# Every route gets effectively unlimited quota: the limiter still runs on
+# each request, but the suite measures throughput rather than 429s
+BENCH_RATE_LIMIT_POLICY = {
+    "default": {"anonymous": [10**9, 3600], "authenticated": [10**9, 3600]},
+    "exempt": ["/", "/health", "/docs", "/openapi.json", "/favicon.ico"],
+    "routes": [],
+}
+
+
+def owner_id(index: int) -> str:
+    return f"bench-owner-{index}"
+
+
+# ---------------------------------------------------------------------------
+# Server side (child process)
+# ---------------------------------------------------------------------------
+
+def serve(args):
+    import uvicorn
+
+    from benchmarks.fakes import FakeStorageServer, install_database, install_storage, make_jpeg
+
+    database = install_database(delay=args.db_latency_ms / 1000)
+
+    now = datetime.utcnow()
+    for index in range(args.owners):
+        asyncio.run(database.users.insert_one({
+            "user_id": owner_id(index), "email": f"owner{index}@bench.example", "name": f"Owner {index}",
+            "provider": "google", "provider_id": f"bench-{index}", "avatar_url": None,
+            "created_at": now, "last_login": now, "is_active": True,
+        }))
+
+    from app.main import app
+
+    # After importing the app, which configures Cloudinary from the environment
+    storage = FakeStorageServer(image_bytes=make_jpeg(*args.image_size)).start()
+    install_storage(storage)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", ws="websockets")
+
+
+# ---------------------------------------------------------------------------
+# Client side
+# ---------------------------------------------------------------------------
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    def record(self, operation: str, started: float, ok: bool):
+        self.latencies[operation].append(time.perf_counter() - started)
+        if not ok:
+            self.errors[operation] += 1
+
+    def summary(self, duration: float) -> dict:
+        operations = {}
+        total = 0
+        for operation, samples in sorted(self.latencies.items()):
+            samples.sort()
+            total += len(samples)
+            operations[operation] = {
+                "requests": len(samples),
+                "errors": self.errors.get(operation, 0),
+                "rps": round(len(samples) / duration, 1),
+                "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 99) * 1000, 2),
+            }
+        return {
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "rps": round(total / duration, 1),
+            "operations": operations,
+            **({"counters": dict(self.counters)} if self.counters else {}),
+        }
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(pct / 100 * len(samples))) - 1))
+    return samples[index]
+
+
+class MemorySampler:
+    """Polls the server process RSS while a scenario runs"""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        import psutil
+
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.samples: List[int] = []
+        self.task = None
+
+    async def _run(self):
+        while True:
+            self.samples.append(self.process.memory_info().rss)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.samples = [self.process.memory_info().rss]
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict:
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.samples.append(self.process.memory_info().rss)
+        mib = 1024 * 1024
+        return {
+            "rss_start_mib": round(self.samples[0] / mib, 1),
+            "rss_peak_mib": round(max(self.samples) / mib, 1),
+            "rss_end_mib": round(self.samples[-1] / mib, 1),
+        }
+
+
+class LoadSuite:
+    def __init__(self, args, base_url: str, server_pid: int):
+        from benchmarks.fakes import make_jpeg
+
+        self.args = args
+        self.base_url = base_url
+        self.ws_url = base_url.replace("http://", "ws://")
+        self.server_pid = server_pid
+        self.photo = make_jpeg(*args.image_size)
+        self.guest_ids = itertools.count()
+        self.tokens: List[str] = []
+        self.sessions: List[str] = []  # sessions[i] is owned by owner i
+        self.client = None
+
+    async def setup(self):
+        import httpx
+
+        from app.auth import create_access_token
+
+        limits = httpx.Limits(max_connections=self.args.concurrency * 4, max_keepalive_connections=self.args.concurrency * 4)
+        self.client = httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=60)
+        for index in range(self.args.owners):
+            token = create_access_token({"sub": owner_id(index), "email": f"owner{index}@bench.example"})
+            response = await self.client.post("/sessions/", headers={"Authorization": f"Bearer {token}"})
+            response.raise_for_status()
+            self.tokens.append(token)
+            self.sessions.append(response.json()["session_id"])
+        # Give every session some photos so galleries and ZIPs are not empty
+        await asyncio.gather(*(
+            self.upload(Recorder(), self.sessions[index % len(self.sessions)], f"seed-{index}")
+            for index in range(self.args.seed_photos)
+        ))
+
+    async def close(self):
+        await self.client.aclose()
+
+    def auth(self, owner: int) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[owner]}"}
+
+    # -- operations ---------------------------------------------------------
+
+    async def upload(self, recorder: Recorder, session_id: str, guest: str):
+        started = time.perf_counter()
+        try:
+            response = await self.client.post(
+                f"/sessions/{session_id}/photos",
+                # Unique trailing bytes after the JPEG end marker, so uploads are not deduplicated
+                files={"file": ("photo.jpg", self.photo + os.urandom(16), "image/jpeg")},
+                headers={"User-Agent": f"bench-guest-{guest}"},
+            )
+            recorder.record("upload", started, response.status_code == 200)
+        except Exception:
+            recorder.record("upload", started, False)
+
+    async def get(self, recorder: Recorder, operation: str, path: str, headers: dict = None):
+        started = time.perf_counter()
+        try:
+            response = await self.client.get(path, headers=headers)
+            recorder.record(operation, started, response.status_code == 200)
+        except Exception:
+            recorder.record(operation, started, False)
+
+    # -- workers --------------------------------------------------------------
+
+    async def guest_uploader(self, recorder: Recorder, deadline: float):
+        while time.perf_counter() < deadline:
+            await self.upload(recorder, random.choice(self.sessions), str(next(self.guest_ids)))
+
+    async def gallery_poller(self, recorder: Recorder, deadline: float):
+        guest = f"poller-{next(self.guest_ids)}"
+        headers = {"User-Agent": f"bench-guest-{guest}"}
+        session_id = random.choice(self.sessions)
+        while time.perf_counter() < deadline:
+            await self.get(recorder, "gallery_session", f"/sessions/{session_id}", headers)
+            await self.get(recorder, "gallery_photos", f"/sessions/{session_id}/photos", headers)
+
+    async def owner_dashboard(self, recorder: Recorder, deadline: float, owner: int):
+        import websockets
+
+        session_id = self.sessions[owner]
+        url = f"{self.ws_url}/ws/{session_id}?token={self.tokens[owner]}"
+
+        async def read(socket):
+            async for message in socket:
+                recorder.counters["ws_messages"] += 1
+
+        started = time.perf_counter()
+        try:
+            async with websockets.connect(url, max_size=None) as socket:
+                recorder.record("ws_connect", started, True)
+                reader = asyncio.create_task(read(socket))
+                while time.perf_counter() < deadline:
+                    await self.get(recorder, "dashboard_session", f"/sessions/{session_id}", self.auth(owner))
+                    await self.get(recorder, "dashboard_photos", f"/sessions/{session_id}/photos", self.auth(owner))
+                reader.cancel()
+        except Exception:
+            recorder.record("ws_connect", started, False)
+
+    async def zip_downloader(self, recorder: Recorder, deadline: float, owner: int):
+        session_id = self.sessions[owner]
+        while time.perf_counter() < deadline:
+            await self.get(recorder, "zip_download", f"/sessions/{session_id}/download", self.auth(owner))
+
+    # -- scenarios ----------------------------------------------------------
+
+    def workers(self, scenario: str, recorder: Recorder, deadline: float) -> list:
+        concurrency = self.args.concurrency
+        owners = range(len(self.sessions))
+        if scenario == "guest_uploads":
+            return [self.guest_uploader(recorder, deadline) for _ in range(concurrency)]
+        if scenario == "owner_dashboard":
+            # Owners watch their dashboards while a quarter of the load uploads
+            return ([self.owner_dashboard(recorder, deadline, owner) for owner in owners] +
+                    [self.guest_uploader(recorder, deadline) for _ in range(max(1, concurrency // 4))])
+        if scenario == "gallery_polling":
+            return [self.gallery_poller(recorder, deadline) for _ in range(concurrency)]
+        if scenario == "zip_download":
+            return [self.zip_downloader(recorder, deadline, owner % len(self.sessions))
+                    for owner in range(min(concurrency, self.args.zip_concurrency))]
+        if scenario == "mixed":
+            share = max(1, concurrency // 4)
+            return ([self.guest_uploader(recorder, deadline) for _ in range(share)] +
+                    [self.gallery_poller(recorder, deadline) for _ in range(share * 2)] +
+                    [self.owner_dashboard(recorder, deadline, owner) for owner in owners] +
+                    [self.zip_downloader(recorder, deadline, 0)])
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+    async def run_scenario(self, scenario: str) -> dict:
+        recorder = Recorder()
+        sampler = MemorySampler(self.server_pid)
+        sampler.start()
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        await asyncio.gather(*self.workers(scenario, recorder, deadline))
+        elapsed = time.perf_counter() - started
+        memory = await sampler.stop()
+        return {"duration_s": round(elapsed, 2), **recorder.summary(elapsed), "memory": memory}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 30):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError("Benchmark server exited during startup")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Benchmark server did not become healthy")
+
+
+async def run(args) -> dict:
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as policy_file:
+        json.dump(BENCH_RATE_LIMIT_POLICY, policy_file)
+    env = {
+        **os.environ,
+        "RATE_LIMIT_POLICY_FILE": policy_file.name,
+        "NODE_ENV": "benchmark",
+        "LOG_LEVEL": "warning",
+        "ENABLE_METRICS": "true",
+        "PYTHONPATH": BACKEND_DIR,
+    }
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    command = [
+        sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+        "--owners", str(args.owners), "--db-latency-ms", str(args.db_latency_ms),
+        "--image-size", f"{args.image_size[0]}x{args.image_size[1]}",
+    ]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    try:
+        await wait_for_server(base_url, process)
+        suite = LoadSuite(args, base_url, process.pid)
+        await suite.setup()
+        results = {}
+        try:
+            for scenario in args.scenarios:
+                results[scenario] = await suite.run_scenario(scenario)
+                print(f"{scenario}: {results[scenario]['rps']} req/s, {results[scenario]['errors']} errors",
+                      file=sys.stderr)
+        finally:
+            await suite.close()
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        os.unlink(policy_file.name)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "owners": args.owners,
+            "seed_photos": args.seed_photos,
+            "db_latency_ms": args.db_latency_ms,
+            "image_size": list(args.image_size),
+            "image_bytes": len(suite.photo),
+        },
+        "scenarios": results,
+    }
+
+
+def image_size(value: str):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        type=lambda value: [name.strip() for name in value.split(",") if name.strip()])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="closed-loop workers per scenario")
+    parser.add_argument("--owners", type=int, default=8, help="session owners (one session and WebSocket each)")
+    parser.add_argument("--seed-photos", type=int, default=40, help="photos uploaded before the first scenario")
+    parser.add_argument("--zip-concurrency", type=int, default=4)
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="simulated MongoDB round trip")
+    parser.add_argument("--image-size", type=image_size, default=(1280, 960))
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Logging overhead on the upload path.
+
+Replays the debug log calls made by one upload_photo request (session dict,
+Cloudinary result, photo record) through the previous safe_log with eager
+f-strings and through the current facade with lazy %-style arguments, in
+production (WARNING) and development (INFO) modes, where all of them are
+suppressed. Also times an emitted record on the calling thread with a
+direct StreamHandler versus the QueueHandler used by the app.
+
+Run from the backend directory:
+    python benchmarks/logging_overhead.py
+"""
+import argparse
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import logger as app_logger
+
+SESSION_ID = str(uuid.uuid4())
+DB_SESSION = {
+    "_id": "65f0c0ffee0123456789abcd", "session_id": SESSION_ID, "owner_id": "google_1234567890",
+    "photo_count": 42, "is_active": True, "max_photos": 1000, "photos_per_user_limit": 10,
+    "created_at": "2024-03-12T10:00:00", "expires_at": "2024-03-13T10:00:00",
+}
+CLOUDINARY_RESULT = {
+    "asset_id": "b5e6d2b39ba3e0869d67141ba7dba6cf", "public_id": f"qr_sessions/{SESSION_ID}/photo",
+    "version": 1710237600, "signature": "0d2a4e1b8c4f2f5d8e6c9f0a1b2c3d4e5f6a7b8c", "width": 4032,
+    "height": 3024, "format": "jpg", "resource_type": "image", "created_at": "2024-03-12T10:00:00Z",
+    "tags": [], "bytes": 2483921, "type": "upload", "etag": "1adf8d2ad3954f6270d69860cb126b24",
+    "placeholder": False, "url": "http://res.cloudinary.com/demo/image/upload/v1/photo.jpg",
+    "secure_url": "https://res.cloudinary.com/demo/image/upload/v1/photo.jpg", "folder": "qr_sessions",
+    "original_filename": "IMG_2048", "api_key": "123456789012345",
+}
+DB_PHOTO = {"_id": "65f0c0ffee0123456789abce", "filename": "photo", "session_id": SESSION_ID,
+            "url": CLOUDINARY_RESULT["secure_url"], "user_identifier": "a" * 64}
+
+
+def legacy_safe_log(message, level='info', *args):
+    """The previous safe_log: re-reads the environment on every call"""
+    env = (os.getenv('NODE_ENV', '') or
+           os.getenv('RAILWAY_ENVIRONMENT', '') or
+           os.getenv('VERCEL_ENV', '') or
+           'development').lower()
+    is_production = env in ('production', 'prod')
+    if is_production and level in ('info', 'debug'):
+        return
+    logger = logging.getLogger('qr-photo-app')
+    if level == 'error':
+        logger.error(message, *args)
+    elif level == 'warning':
+        logger.warning(message, *args)
+    elif level == 'info':
+        logger.info(message, *args)
+    elif level == 'debug':
+        logger.debug(message, *args)
+
+
+def legacy_upload_logging():
+    user_identifier = DB_PHOTO["user_identifier"]
+    legacy_safe_log(f"Attempting to upload photo for session: {SESSION_ID}", 'debug')
+    legacy_safe_log(f"File details: {'IMG_2048.jpg'}, {'image/jpeg'}", 'debug')
+    legacy_safe_log(f"Session found: {DB_SESSION}", 'debug')
+    legacy_safe_log(f"User identifier: {user_identifier}", 'debug')
+    legacy_safe_log(f"User uploads: {3}, Per-user limit: {10}", 'debug')
+    legacy_safe_log(f"File size: {2483921} bytes", 'debug')
+    legacy_safe_log("Uploading to Cloudinary...", 'debug')
+    legacy_safe_log(f"Cloudinary upload result: {CLOUDINARY_RESULT}", 'debug')
+    legacy_safe_log(f"Photo record created: {DB_PHOTO}", 'debug')
+    legacy_safe_log(f"Photo count incremented for session: {SESSION_ID}", 'debug')
+    legacy_safe_log(f"User upload recorded for: {user_identifier}", 'debug')
+    legacy_safe_log(f"WebSocket notification sent to owner {DB_SESSION['owner_id']} for session {SESSION_ID}", 'debug')
+
+
+def lazy_upload_logging():
+    safe_log = app_logger.safe_log
+    user_identifier = DB_PHOTO["user_identifier"]
+    safe_log("Attempting to upload photo for session: %s", 'debug', SESSION_ID)
+    safe_log("File details: %s, %s", 'debug', 'IMG_2048.jpg', 'image/jpeg')
+    safe_log("Session found: %s", 'debug', DB_SESSION)
+    safe_log("User identifier: %s", 'debug', user_identifier)
+    safe_log("User uploads: %s, Per-user limit: %s", 'debug', 3, 10)
+    safe_log("File size: %s bytes", 'debug', 2483921)
+    safe_log("Uploading to Cloudinary...", 'debug')
+    safe_log("Cloudinary upload result: %s", 'debug', CLOUDINARY_RESULT)
+    safe_log("Photo record created: %s", 'debug', DB_PHOTO)
+    safe_log("Photo count incremented for session: %s", 'debug', SESSION_ID)
+    safe_log("User upload recorded for: %s", 'debug', user_identifier)
+    safe_log("WebSocket notification sent to owner %s for session %s", 'debug', DB_SESSION['owner_id'], SESSION_ID)
+
+
+def time_per_call(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def emit_cost(handler: logging.Handler, iterations: int) -> float:
+    """Microseconds spent on the calling thread per emitted warning"""
+    logger = logging.getLogger("bench-emit")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.WARNING)
+    return time_per_call(lambda: logger.warning("Upload for session %s took %s ms", SESSION_ID, 812), iterations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    report = {}
+    for mode, node_env, level in (("production", "production", logging.WARNING), ("development", "development", logging.INFO)):
+        os.environ["NODE_ENV"] = node_env
+        logging.getLogger().setLevel(level)
+        app_logger.LOG_LEVEL = level
+        legacy_us = time_per_call(legacy_upload_logging, args.iterations)
+        lazy_us = time_per_call(lazy_upload_logging, args.iterations)
+        report[f"{mode}_suppressed_upload_logging_us"] = {
+            "legacy_fstring": round(legacy_us, 2),
+            "lazy_facade": round(lazy_us, 2),
+            "speedup": round(legacy_us / lazy_us, 1),
+        }
+
+    formatter = logging.Formatter(app_logger.TEXT_LOG_FORMAT)
+    with tempfile.TemporaryFile("w") as output:
+        direct = logging.StreamHandler(output)
+        direct.setFormatter(formatter)
+        log_queue = queue.SimpleQueue()
+        queued = logging.handlers.QueueHandler(log_queue)
+        queued.setFormatter(logging.Formatter('%(message)s'))
+        sink = logging.StreamHandler(output)
+        sink.setFormatter(formatter)
+        listener = logging.handlers.QueueListener(log_queue, sink)
+        listener.start()
+        report["emitted_warning_caller_us"] = {
+            "direct_stream_handler": round(emit_cost(direct, args.iterations), 2),
+            "queue_handler": round(emit_cost(queued, args.iterations), 2),
+        }
+        listener.stop()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Requests/second through the previous call_next middleware stack versus the
+pure-ASGI RequestPipelineMiddleware.
+
+Both apps share the same routes and CORS settings; the legacy app adds the old
+BaseHTTPMiddleware-style rate limiter, metrics and security middlewares (kept
+here as compact copies). Requests go through httpx's ASGI transport, so the
+numbers exclude socket I/O and isolate middleware cost. Session lookups use an
+in-memory stand-in; rate limits are raised so nothing is rejected.
+
+Run from the backend directory:
+    python benchmarks/middleware_stack.py --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "bench-only-Zq8#vX2!mL9@pR4$wT7^nB1&cF6*hJ3%")
+
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+from app import crud
+from app.main import app, allowed_origins
+from app.middleware.rate_limit_policy import CompiledRateLimitPolicy, load_policy, route_templates_from_app
+from app.middleware.rate_limiter import api_rate_limiter
+from app.utils.metrics import metrics_collector
+
+SESSION_ID = str(uuid.uuid4())
+
+
+async def fake_get_session(session_id: str):
+    return {"session_id": session_id, "owner_id": None, "photo_count": 0, "is_active": True}
+
+
+class LegacyMetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        metrics_collector.record_request(request.method, request.url.path, response.status_code, time.time() - start_time)
+        return response
+
+
+class LegacySecurityMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        if "server" in response.headers:
+            del response.headers["server"]
+        return response
+
+
+async def legacy_rate_limit_middleware(request, call_next):
+    if api_rate_limiter.is_exempt(request.url.path):
+        return await call_next(request)
+    route_template, (max_requests, window_seconds), rule = api_rate_limiter.get_limits_for_request(request)
+    is_allowed, info = await api_rate_limiter.limiter.is_allowed(request, max_requests, window_seconds, rule=rule)
+    api_rate_limiter.record_request(route_template or "unmatched", None, blocked=not is_allowed)
+    if not is_allowed:
+        return JSONResponse(status_code=429, content=info)
+    response = await call_next(request)
+    response.headers["X-RateLimit-Limit"] = str(info["limit"])
+    response.headers["X-RateLimit-Remaining"] = str(info["remaining"])
+    response.headers["X-RateLimit-Reset"] = str(info["reset_time"])
+    return response
+
+
+def build_legacy_app() -> FastAPI:
+    legacy = FastAPI()
+    legacy.router.routes.extend(app.router.routes)
+    legacy.add_middleware(CORSMiddleware, allow_origins=allowed_origins, allow_credentials=True,
+                          allow_methods=["*"], allow_headers=["*"])
+    legacy.middleware("http")(legacy_rate_limit_middleware)
+    legacy.add_middleware(LegacyMetricsMiddleware)
+    legacy.add_middleware(LegacySecurityMiddleware)
+    return legacy
+
+
+async def requests_per_second(asgi_app, path: str, total: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def worker(count: int):
+            for _ in range(count):
+                response = await client.get(path)
+                assert response.status_code == 200, response.text
+
+        await worker(50)  # warm up
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(total // concurrency) for _ in range(concurrency)))
+        return (total // concurrency * concurrency) / (time.perf_counter() - started)
+
+
+async def run(total: int, concurrency: int) -> dict:
+    crud.get_session = fake_get_session
+    api_rate_limiter.policy = CompiledRateLimitPolicy(load_policy(), route_templates_from_app(app.routes), multiplier=10**6)
+
+    legacy = build_legacy_app()
+    report = {}
+    for label, path in (("health", "/health"), ("session", f"/sessions/{SESSION_ID}")):
+        old = await requests_per_second(legacy, path, total, concurrency)
+        new = await requests_per_second(app, path, total, concurrency)
+        report[label] = {"path": path, "legacy_rps": round(old), "pipeline_rps": round(new), "speedup": round(new / old, 2)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests, args.concurrency)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
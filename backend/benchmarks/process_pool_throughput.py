@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Throughput of CPU-bound image work in the shared process pool.
+
+Runs image verification, header inspection and thumbnail rendering on a set
+of synthetic photos, first inline on the event loop (how a handler without
+the pool would do it) and then through app.utils.process_pool with each
+worker count. Reports images per second and how long the event loop was
+blocked (the delay a concurrent gallery request would see).
+
+Run from the backend directory:
+    python benchmarks/process_pool_throughput.py --workers 1,2,4
+    python benchmarks/process_pool_throughput.py --tasks verify --images 200
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageFilter
+
+from app.utils.images import inspect_image_header, verify_image_contents
+from app.utils.process_pool import ProcessPoolService, _ready
+from app.utils.thumbnails import PLACEHOLDER_SIZE, THUMBNAIL_QUALITY, THUMBNAIL_SIZES, render_thumbnails
+
+TASKS = {
+    "verify": (verify_image_contents, ()),
+    "header": (inspect_image_header, ()),
+    "thumbnails": (render_thumbnails, (THUMBNAIL_SIZES, THUMBNAIL_QUALITY, PLACEHOLDER_SIZE)),
+}
+
+# How often the lag monitor expects to be woken up, in seconds
+LAG_INTERVAL = 0.005
+
+
+def make_photos(count: int, width: int, height: int) -> list:
+    """Distinct photo-like JPEGs (blurred noise compresses like real photos)"""
+    photos = []
+    for i in range(count):
+        noise = Image.effect_noise((width // 4, height // 4), 64).convert("RGB")
+        tint = Image.new("RGB", noise.size, tuple(random.randrange(256) for _ in range(3)))
+        image = Image.blend(noise, tint, 0.5).resize((width, height)).filter(ImageFilter.GaussianBlur(2))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        photos.append(buffer.getvalue())
+    return photos
+
+
+async def monitor_lag(samples: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(max(0.0, time.perf_counter() - started - LAG_INTERVAL))
+
+
+def summarize(elapsed: float, count: int, lag: list) -> dict:
+    lag = sorted(lag) or [0.0]
+    return {
+        "images_per_second": round(count / elapsed, 1),
+        "loop_lag_p99_ms": round(lag[int(len(lag) * 0.99)] * 1000, 1),
+        "loop_lag_max_ms": round(lag[-1] * 1000, 1),
+    }
+
+
+async def run_inline(func, extra: tuple, photos: list) -> dict:
+    lag, stop = [], asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(lag, stop))
+    await asyncio.sleep(LAG_INTERVAL * 2)
+    started = time.perf_counter()
+    for contents in photos:
+        func(contents, *extra)
+        # Let the monitor observe the stall, as other requests would
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    return summarize(elapsed, len(photos), lag)
+
+
+async def run_pool(pool: ProcessPoolService, func, extra: tuple, photos: list, concurrency: int) -> dict:
+    lag, stop = [], asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(lag, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(contents: bytes):
+        async with semaphore:
+            await pool.run(func, contents, *extra)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(contents) for contents in photos))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    return summarize(elapsed, len(photos), lag)
+
+
+async def benchmark(args) -> dict:
+    photos = make_photos(args.images, args.width, args.height)
+    tasks = [task.strip() for task in args.tasks.split(",") if task.strip()]
+    report = {
+        "cpu_count": os.cpu_count(),
+        "images": args.images,
+        "image_size": f"{args.width}x{args.height}",
+        "average_jpeg_bytes": sum(map(len, photos)) // len(photos),
+        "inline": {},
+        "pool": {},
+    }
+
+    for task in tasks:
+        func, extra = TASKS[task]
+        report["inline"][task] = await run_inline(func, extra, photos)
+
+    for workers in (int(count) for count in args.workers.split(",")):
+        pool = ProcessPoolService(workers)
+        # Start every worker (and its imports) before measuring
+        pool.start()
+        await asyncio.gather(*(pool.run(_ready) for _ in range(workers * 2)))
+        results = {}
+        for task in tasks:
+            func, extra = TASKS[task]
+            results[task] = await run_pool(pool, func, extra, photos, args.concurrency or workers * 2)
+            results[task]["speedup_vs_inline"] = round(
+                results[task]["images_per_second"] / report["inline"][task]["images_per_second"], 2
+            )
+        pool.stop()
+        report["pool"][f"{workers}_workers"] = results
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated pool sizes")
+    parser.add_argument("--tasks", default=",".join(TASKS), help="comma-separated: " + ", ".join(TASKS))
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--concurrency", type=int, default=0, help="jobs in flight (default: 2 per worker)")
+    args = parser.parse_args()
+
+    unknown = set(args.tasks.split(",")) - set(TASKS)
+    if unknown:
+        parser.error(f"unknown tasks: {', '.join(sorted(unknown))}")
+    print(json.dumps(asyncio.run(benchmark(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Memory footprint of the in-process rate limit store.
+
+Drives N synthetic clients through the previous deque-per-client store and
+the current GCRA store, then reports traced memory before and after an idle
+period so the sweep can evict drained keys.
+
+Run from the backend directory:
+    python benchmarks/rate_limit_memory.py --clients 100000
+"""
+import argparse
+import asyncio
+import gc
+import hashlib
+import json
+import os
+import sys
+import tracemalloc
+from collections import defaultdict, deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.middleware.rate_limit_store import MemoryRateLimitStore
+
+
+class DequeRateLimitStore:
+    """The previous store: one timestamp per request, keys never removed"""
+
+    def __init__(self):
+        self.requests = defaultdict(deque)
+        self.blocked = {}
+
+    async def hit(self, key, max_requests, window_seconds, now):
+        if key in self.blocked:
+            if now < self.blocked[key]:
+                return False, 0, int(self.blocked[key] - now)
+            del self.blocked[key]
+        request_times = self.requests[key]
+        while request_times and request_times[0] < now - window_seconds:
+            request_times.popleft()
+        if len(request_times) >= max_requests:
+            self.blocked[key] = now + window_seconds
+            return False, 0, window_seconds
+        request_times.append(now)
+        return True, max_requests - len(request_times), 0
+
+
+async def drive(store, clients: int, requests_per_client: int) -> dict:
+    keys = [hashlib.sha256(str(i).encode()).hexdigest()[:16] for i in range(clients)]
+    now = 1_000_000.0
+
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for _ in range(requests_per_client):
+        for key in keys:
+            await store.hit(key, 100, 3600, now)
+        now += 1.0
+    active, _ = tracemalloc.get_traced_memory()
+
+    # An hour later every client has gone idle; one request triggers the sweep
+    await store.hit("late-client", 100, 3600, now + 7200)
+    gc.collect()
+    idle, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "active_mib": round((active - baseline) / 2**20, 1),
+        "bytes_per_client": round((active - baseline) / clients),
+        "after_idle_mib": round((idle - baseline) / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100_000)
+    parser.add_argument("--requests-per-client", type=int, default=50)
+    args = parser.parse_args()
+
+    report = {
+        "clients": args.clients,
+        "requests_per_client": args.requests_per_client,
+        "deque_store": asyncio.run(drive(DequeRateLimitStore(), args.clients, args.requests_per_client)),
+        "gcra_store": asyncio.run(drive(MemoryRateLimitStore(), args.clients, args.requests_per_client)),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Per-request overhead of the rate limiting middleware.
+
+Times limit resolution with the previous substring chain against the
+compiled route-template policy, and the full per-request path (resolve
+limits, check the store, record analytics) on a realistic path mix. The
+compiled lookup is timed for repeated paths (a client polling its session)
+and for paths never seen before (a new session id on every request).
+
+Run from the backend directory:
+    python benchmarks/rate_limit_overhead.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "bench-only-Zq8#vX2!mL9@pR4$wT7^nB1&cF6*hJ3%")
+
+from starlette.requests import Request
+
+from app.main import app
+from app.middleware.rate_limiter import APIRateLimiter
+
+
+def legacy_limits(path: str, method: str, is_authenticated: bool = False):
+    """The previous _get_base_limits substring chain"""
+    auth_multiplier = 2 if is_authenticated else 1
+    if "/upload" in path:
+        return (10 if not is_authenticated else 20), 600
+    elif "/auth" in path:
+        if "/auth/me" in path:
+            return (100 if not is_authenticated else 200), 3600
+        elif "/auth/google/callback" in path:
+            return 20, 300
+        elif "/auth/google" in path:
+            return 15, 300
+        elif "/auth/logout" in path:
+            return 10, 300
+        return 30 * auth_multiplier, 300
+    elif path.startswith("/sessions") and method == "POST":
+        return 20 * auth_multiplier, 3600
+    elif "/admin" in path:
+        if not is_authenticated:
+            return 5, 300
+        return 50, 3600
+    return 100 * auth_multiplier, 3600
+
+
+def request_mix() -> list:
+    session_id = str(uuid.uuid4())
+    return [
+        ("POST", f"/sessions/{session_id}/photos"),
+        ("GET", f"/sessions/{session_id}/photos"),
+        ("GET", f"/sessions/{session_id}"),
+        ("GET", f"/sessions/{session_id}/my-stats"),
+        ("GET", f"/sessions/{session_id}/photos/all"),
+        ("DELETE", f"/sessions/{session_id}/photos/{'a' * 24}"),
+        ("GET", "/auth/me"),
+        ("GET", f"/admin/sessions/{session_id}/user-stats"),
+    ]
+
+
+def make_request(method: str, path: str) -> Request:
+    scope = {
+        "type": "http", "method": method, "path": path, "query_string": b"", "app": app,
+        "headers": [(b"user-agent", b"bench"), (b"host", b"testserver")],
+        "client": ("10.0.0.1", 1234), "server": ("testserver", 80), "scheme": "http", "root_path": "",
+    }
+    return Request(scope)
+
+
+def time_per_call(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    mix = request_mix()
+    limiter = APIRateLimiter()
+    limiter.compile_policy(app.routes)
+    requests = [make_request(method, path) for method, path in mix]
+
+    legacy_us = time_per_call(lambda: [legacy_limits(path, method) for method, path in mix], args.iterations) / len(mix)
+    compiled_us = time_per_call(lambda: [limiter.policy.lookup(method, path) for method, path in mix], args.iterations) / len(mix)
+    fresh_mixes = iter([request_mix() for _ in range(args.iterations)])
+    compiled_new_path_us = time_per_call(
+        lambda: [limiter.policy.lookup(method, path) for method, path in next(fresh_mixes)], args.iterations
+    ) / len(mix)
+
+    async def full_path():
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            for request in requests:
+                template, (max_requests, window), rule = limiter.get_limits_for_request(request)
+                allowed, _ = await limiter.limiter.is_allowed(request, max_requests * 10**6, window, rule=rule)
+                limiter.record_request(template or "unmatched", None, blocked=not allowed)
+        return (time.perf_counter() - started) / args.iterations / len(requests) * 1e6
+
+    print(json.dumps({
+        "paths_in_mix": len(mix),
+        "legacy_substring_lookup_us": round(legacy_us, 2),
+        "compiled_template_lookup_us": round(compiled_us, 2),
+        "compiled_template_lookup_new_paths_us": round(compiled_new_path_us, 2),
+        "full_middleware_work_us": round(asyncio.run(full_path()), 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
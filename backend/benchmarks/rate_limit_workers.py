@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Multi-process harness for the rate limiter store.
+
+Spawns several worker processes, each with its own RateLimiter (like uvicorn
+--workers), and hammers the same client key from all of them at once. With a
+shared store the total number of allowed requests must not exceed the limit;
+with the in-process store each worker enforces its own copy of the limit.
+A worker whose Redis calls fail falls back to in-process limits; such runs
+are reported and fail, since they say nothing about the shared store.
+
+Only the in-process store and a fakeredis TcpFakeServer (one shared server,
+running the same Lua script) have been run through this harness so far; the
+Redis store has not been checked against a real Redis server with several
+workers yet. The fake closes the connection after any error reply, including
+the NOSCRIPT of the first EVALSHA, so SCRIPT LOAD the store's script into
+it before a run.
+
+Run from the backend directory:
+    python benchmarks/rate_limit_workers.py --redis-url redis://localhost:6379/0
+    python benchmarks/rate_limit_workers.py            # in-process store
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def worker(redis_url, client_id, limit, window, requests, start_at, results):
+    if redis_url:
+        os.environ["RATE_LIMIT_REDIS_URL"] = redis_url
+    else:
+        os.environ.pop("RATE_LIMIT_REDIS_URL", None)
+        os.environ.pop("REDIS_URL", None)
+
+    from app.middleware.rate_limiter import RateLimiter
+
+    limiter = RateLimiter()
+
+    async def hammer():
+        allowed = 0
+        fell_back = False
+        shared = getattr(limiter.store, "redis", None)
+        # Line up all workers so their requests actually interleave
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        for _ in range(requests):
+            is_allowed, _ = await limiter.is_allowed(None, limit, window, user_id=client_id)
+            allowed += int(is_allowed)
+            fell_back = fell_back or (shared is not None and shared.using_fallback)
+        return allowed, fell_back
+
+    results.put(asyncio.run(hammer()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default=os.getenv("RATE_LIMIT_REDIS_URL"))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--window", type=int, default=600)
+    parser.add_argument("--requests-per-worker", type=int, default=500)
+    args = parser.parse_args()
+
+    client_id = f"bench-{uuid.uuid4()}"
+    results = multiprocessing.Queue()
+    start_at = time.time() + 2.0
+    processes = [
+        multiprocessing.Process(
+            target=worker,
+            args=(args.redis_url, client_id, args.limit, args.window, args.requests_per_worker, start_at, results),
+        )
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    allowed = [worker_allowed for worker_allowed, _ in outcomes]
+    fell_back = sum(1 for _, worker_fell_back in outcomes if worker_fell_back)
+    total_allowed = sum(allowed)
+    report = {
+        "store": "redis" if args.redis_url else "memory",
+        "workers": args.workers,
+        "limit": args.limit,
+        "requests_sent": args.workers * args.requests_per_worker,
+        "allowed_per_worker": allowed,
+        "total_allowed": total_allowed,
+        "workers_fell_back": fell_back,
+        "global_limit_held": total_allowed <= args.limit and not fell_back,
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["global_limit_held"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Serialization throughput for gallery listings.
+
+Compares the old response path (stringify `_id` in a Python loop, then
+FastAPI's jsonable_encoder + stdlib json, as JSONResponse does) with
+app.utils.serialization.dumps on the raw Mongo documents.
+
+Run from the backend directory:
+    python benchmarks/serialization_throughput.py --photos 300
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from app.utils.serialization import dumps
+
+
+def make_gallery(count: int) -> list:
+    session_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "filename": f"qr_sessions/{session_id}/{uuid.uuid4()}_IMG_{i:04d}",
+            "session_id": session_id,
+            "url": f"https://res.cloudinary.com/demo/image/upload/v1/qr_sessions/{session_id}/{uuid.uuid4()}.jpg",
+            "user_identifier": f"anon_{uuid.uuid4().hex}",
+            "uploaded_at": now - timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+
+def encode_baseline(photos: list) -> bytes:
+    stringified = []
+    for photo in photos:
+        photo = dict(photo)
+        photo["_id"] = str(photo["_id"])
+        stringified.append(photo)
+    encoded = jsonable_encoder(stringified)
+    return json.dumps(encoded, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def encode_fast(photos: list) -> bytes:
+    return dumps(photos)
+
+
+def measure(encoder, photos: list, min_seconds: float) -> dict:
+    iterations = 0
+    total_bytes = 0
+    started = time.perf_counter()
+    while True:
+        total_bytes += len(encoder(photos))
+        iterations += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            break
+    return {
+        "listings_per_second": round(iterations / elapsed, 1),
+        "megabytes_per_second": round(total_bytes / elapsed / 1_000_000, 2),
+        "bytes_per_listing": total_bytes // iterations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--photos", type=int, default=300)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    photos = make_gallery(args.photos)
+    baseline = measure(encode_baseline, photos, args.seconds)
+    fast = measure(encode_fast, photos, args.seconds)
+    print(json.dumps({
+        "photos_per_listing": args.photos,
+        "baseline_jsonable_encoder": baseline,
+        "orjson": fast,
+        "speedup": round(fast["megabytes_per_second"] / baseline["megabytes_per_second"], 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
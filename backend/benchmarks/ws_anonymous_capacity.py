@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Capacity check for anonymous WebSocket connections on a single worker.
+
+Boots the app in-process on a random port, swaps the session lookup for an
+in-memory stand-in (no MongoDB required) and opens N anonymous connections to
+/ws/{session_id}. Reports how many sockets the worker is still holding, how
+many entries the WebSocket manager tracks and the memory they cost.
+
+Run from the backend directory:
+    python benchmarks/ws_anonymous_capacity.py --connections 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "bench-only-Zq8#vX2!mL9@pR4$wT7^nB1&cF6*hJ3%")
+
+import uvicorn
+import websockets
+
+from app import crud
+from app.main import app
+from app.websocket_manager import websocket_manager
+
+SESSION_ID = str(uuid.uuid4())
+
+
+async def fake_get_session(session_id: str):
+    return {"session_id": session_id, "owner_id": "bench-owner", "is_active": True}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def open_anonymous(url: str):
+    """Open one anonymous connection; returns the socket if the server kept it"""
+    try:
+        ws = await websockets.connect(url, open_timeout=10)
+        # The baseline server sends a welcome frame; the new one closes instead
+        await asyncio.wait_for(ws.recv(), timeout=5)
+        return ws
+    except Exception:
+        return None
+
+
+async def run(connections: int, concurrency: int) -> dict:
+    crud.get_session = fake_get_session
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    url = f"ws://127.0.0.1:{port}/ws/{SESSION_ID}"
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with semaphore:
+            return await open_anonymous(url)
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(limited() for _ in range(connections)))
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.5)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    held = [ws for ws in results if ws is not None and ws.open]
+    report = {
+        "connections_attempted": connections,
+        "connections_held_open": len(held),
+        "manager_tracked_connections": len(websocket_manager.connection_mapping),
+        "server_tasks": len(asyncio.all_tasks()),
+        "handshakes_per_second": round(connections / elapsed, 1),
+        "memory_delta_kib": round((after - before) / 1024, 1),
+        "memory_per_attempt_bytes": round((after - before) / connections),
+    }
+
+    await asyncio.gather(*(ws.close() for ws in held), return_exceptions=True)
+    server.should_exit = True
+    await server_task
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.connections, args.concurrency)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Shared fixtures: the app runs in-process against the MongoDB and Cloudinary
+stand-ins from benchmarks/fakes.py
+
+Needs pytest, which requirements.txt leaves out since deploys install it.
+Run from the backend directory:
+    python -m pytest -q
+"""
+import json
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Settings are read at import time, so they have to be in place before the app is
+os.environ.setdefault("JWT_SECRET_KEY", "test-only-Zq8#vX2!mL9@pR4$wT7^nB1&cF6*hJ3%")
+os.environ.setdefault("RESUMABLE_UPLOAD_DIR", tempfile.mkdtemp(prefix="qr_resumable_test_"))
+os.environ.setdefault("THUMBNAILS_ENABLED", "false")
+os.environ.setdefault("PROCESS_POOL_WORKERS", "1")
+
+# Tests upload more than a guest's hourly quota; rate limits have their own tests
+with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as _policy_file:
+    json.dump({
+        "default": {"anonymous": [10**9, 3600], "authenticated": [10**9, 3600]},
+        "exempt": ["/", "/health"],
+        "routes": [],
+    }, _policy_file)
+os.environ.setdefault("RATE_LIMIT_POLICY_FILE", _policy_file.name)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app.main import app as application
+    from app.utils.process_pool import process_pool
+
+    yield application
+    process_pool.stop()
+
+
+@pytest.fixture
+def database(app):
+    from benchmarks.fakes import install_database
+
+    return install_database()
+
+
+@pytest.fixture
+def storage(app):
+    from benchmarks.fakes import FakeStorageServer, install_storage
+
+    # Installed after the app import, which configures Cloudinary from the environment
+    server = FakeStorageServer().start()
+    install_storage(server)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+async def client(app, database, storage):
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http_client:
+        yield http_client
+
+
+@pytest.fixture
+async def session_id(database):
+    session_id = str(uuid.uuid4())
+    await database.sessions.insert_one({
+        "session_id": session_id,
+        "owner_id": None,
+        "is_active": True,
+        "photos_per_user_limit": 10,
+        "photo_count": 0,
+    })
+    return session_id
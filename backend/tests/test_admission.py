@@ -0,0 +1,129 @@
+"""Upload admission control: slot hand-off, priority, weights and shedding"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.middleware.admission import AdmissionController
+
+pytestmark = pytest.mark.anyio
+
+
+def controller(max_concurrent: int = 1, max_queue: int = 4, queue_timeout: float = 5.0) -> AdmissionController:
+    return AdmissionController(max_concurrent, max_queue, queue_timeout, enabled=True)
+
+
+async def queue_up(admission: AdmissionController, **kwargs) -> asyncio.Task:
+    task = asyncio.create_task(admission.acquire(**kwargs))
+    # Let it reach the queue before the next one arrives
+    await asyncio.sleep(0)
+    return task
+
+
+async def test_released_slot_is_handed_to_the_next_waiter():
+    admission = controller()
+    assert await admission.acquire() is None
+    waiter = await queue_up(admission)
+    assert admission.queued == 1
+
+    admission.release()
+    assert await waiter is None
+    assert admission.active == 1
+    assert admission.queued == 0
+
+    admission.release()
+    assert admission.active == 0
+
+
+async def test_signed_in_users_are_admitted_first():
+    admission = controller()
+    await admission.acquire()
+    order = []
+
+    async def upload(name: str, priority: bool):
+        await admission.acquire(priority=priority)
+        order.append(name)
+
+    guest = asyncio.create_task(upload("guest", False))
+    await asyncio.sleep(0)
+    user = asyncio.create_task(upload("user", True))
+    await asyncio.sleep(0)
+
+    admission.release()
+    await asyncio.sleep(0)
+    admission.release()
+    await asyncio.gather(guest, user)
+    assert order == ["user", "guest"]
+
+
+async def test_waiting_past_the_timeout_is_rejected():
+    admission = controller(queue_timeout=0.05)
+    await admission.acquire()
+
+    assert await admission.acquire() == "timeout"
+    assert admission.queued == 0
+    assert admission.active == 1
+
+
+async def test_full_queue_is_rejected_immediately():
+    admission = controller(max_queue=1)
+    await admission.acquire()
+    waiter = await queue_up(admission)
+
+    assert await admission.acquire() == "queue_full"
+
+    admission.release()
+    assert await waiter is None
+
+
+async def test_batches_take_one_slot_per_file():
+    admission = controller(max_concurrent=4)
+    assert await admission.acquire(weight=3) is None
+    assert admission.active == 3
+
+    batch = await queue_up(admission, weight=2)
+    # A smaller upload behind the batch does not overtake it
+    single = await queue_up(admission, weight=1)
+    assert not batch.done() and not single.done()
+
+    admission.release(weight=3)
+    assert await batch is None
+    assert await single is None
+    assert admission.active == 3
+
+
+async def test_oversized_batch_runs_alone():
+    admission = controller(max_concurrent=2)
+    assert await admission.acquire(weight=10) is None
+    assert admission.active == 2
+
+    admission.release(weight=10)
+    assert admission.active == 0
+
+
+async def test_timed_out_batch_lets_smaller_waiters_in():
+    admission = controller(max_concurrent=2, queue_timeout=0.05)
+    await admission.acquire()
+    batch = await queue_up(admission, weight=2)
+    await asyncio.sleep(0.02)
+    single = asyncio.create_task(admission.acquire())
+
+    assert await batch == "timeout"
+    assert await single is None
+    assert admission.active == 2
+
+
+async def test_shed_upload_gets_503_with_retry_after():
+    admission = controller(max_queue=0)
+    await admission.acquire()
+
+    with pytest.raises(HTTPException) as error:
+        async with admission.admit():
+            pass
+    assert error.value.status_code == 503
+    assert int(error.value.headers["Retry-After"]) >= 1
+
+    admission.release()
+    async with admission.admit(weight=1):
+        assert admission.active == 1
+    assert admission.active == 0
@@ -0,0 +1,53 @@
+"""Batch uploads: every file is reported as stored, duplicate or failed"""
+import pytest
+
+from benchmarks.fakes import make_jpeg
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_file_repeated_in_batch_is_reported_as_duplicate(client, session_id, storage, database):
+    photo = make_jpeg(400, 300)
+    files = [
+        ("files", ("first.jpg", photo, "image/jpeg")),
+        ("files", ("other.jpg", make_jpeg(300, 200), "image/jpeg")),
+        ("files", ("again.jpg", photo, "image/jpeg")),
+    ]
+
+    response = await client.post(f"/sessions/{session_id}/photos/batch", files=files)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["photos"]) == 2
+    assert body["failed"] == []
+    [duplicate] = body["duplicates"]
+    first = next(stored for stored in body["photos"] if stored["filename"].endswith("_first"))
+    assert duplicate["id"] == first["id"]
+    assert storage.stats["uploads"] == 2
+    assert len(database.photos.documents) == 2
+
+
+async def test_file_repeated_in_batch_fails_with_its_first_copy(client, session_id, storage, monkeypatch):
+    import cloudinary.uploader
+
+    upload = cloudinary.uploader.upload
+
+    def flaky_upload(contents, **options):
+        if options["public_id"].endswith("_flaky"):
+            raise RuntimeError("storage unavailable")
+        return upload(contents, **options)
+
+    monkeypatch.setattr(cloudinary.uploader, "upload", flaky_upload)
+    photo = make_jpeg(400, 300)
+    files = [
+        ("files", ("good.jpg", make_jpeg(300, 200), "image/jpeg")),
+        ("files", ("flaky.jpg", photo, "image/jpeg")),
+        ("files", ("again.jpg", photo, "image/jpeg")),
+    ]
+
+    response = await client.post(f"/sessions/{session_id}/photos/batch", files=files)
+
+    assert response.status_code == 207
+    failed = {failure["filename"]: failure["detail"] for failure in response.json()["failed"]}
+    assert set(failed) == {"flaky.jpg", "again.jpg"}
+    assert "Repeated in batch" in failed["again.jpg"]
@@ -0,0 +1,65 @@
+"""Direct-to-storage uploads: confirmation retries and failed confirmations"""
+import httpx
+import pytest
+
+from benchmarks.fakes import make_jpeg
+
+pytestmark = pytest.mark.anyio
+
+OTHER_GUEST = {"User-Agent": "another-phone"}
+
+
+@pytest.fixture(autouse=True)
+def direct_uploads_enabled(app, monkeypatch):
+    import app.main
+
+    monkeypatch.setattr(app.main, "DIRECT_UPLOADS_ENABLED", True)
+
+
+async def create_ticket(client, session_id) -> dict:
+    photo = make_jpeg(400, 300)
+    response = await client.post(
+        f"/sessions/{session_id}/photos/direct",
+        json={"filename": "photo.jpg", "content_type": "image/jpeg", "size": len(photo)}
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+async def upload_directly(ticket: dict) -> dict:
+    async with httpx.AsyncClient() as storage_client:
+        response = await storage_client.post(
+            ticket["upload_url"], data=ticket["fields"],
+            files={"file": ("photo.jpg", make_jpeg(400, 300), "image/jpeg")}
+        )
+    assert response.status_code == 200
+    stored = response.json()
+    return {key: stored[key] for key in ("public_id", "version", "signature")}
+
+
+async def test_retried_confirmation_is_only_returned_to_the_uploader(client, session_id):
+    ticket = await create_ticket(client, session_id)
+    stored = await upload_directly(ticket)
+
+    confirmed = await client.post(ticket["confirm_url"], json=stored)
+    assert confirmed.status_code == 200
+
+    retry = await client.post(ticket["confirm_url"], json=stored)
+    assert retry.status_code == 200
+    assert retry.json()["duplicate"] is True
+
+    other = await client.post(ticket["confirm_url"], json=stored, headers=OTHER_GUEST)
+    assert other.status_code == 409
+    assert "photo" not in other.json()
+
+
+async def test_confirmation_without_stored_file_releases_the_ticket(client, session_id, storage, database):
+    ticket = await create_ticket(client, session_id)
+    public_id = ticket["fields"]["public_id"]
+    never_uploaded = {"public_id": public_id, "version": 1, "signature": storage.sign({"public_id": public_id, "version": 1})}
+
+    response = await client.post(ticket["confirm_url"], json=never_uploaded)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Upload not found in storage"
+    assert not database.upload_tickets.documents
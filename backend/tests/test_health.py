@@ -0,0 +1,43 @@
+"""Background health checks: slow-quota checks run less often than the refresh"""
+import pytest
+
+from app.utils.health import HealthMonitor
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_checks_with_their_own_interval_reuse_the_last_result():
+    calls = {"database": 0, "cloudinary": 0}
+
+    def counting(name):
+        async def check():
+            calls[name] += 1
+        return check
+
+    monitor = HealthMonitor(
+        checks={name: counting(name) for name in calls},
+        interval=15,
+        check_intervals={"cloudinary": 300}
+    )
+    for _ in range(3):
+        snapshot = await monitor.refresh()
+
+    assert calls == {"database": 3, "cloudinary": 1}
+    assert snapshot["services"]["cloudinary"]["status"] == "healthy"
+
+    # Once due, the check runs again
+    monitor.next_due["cloudinary"] = 0.0
+    await monitor.refresh()
+    assert calls["cloudinary"] == 2
+
+
+async def test_failed_check_is_reported_until_it_runs_again():
+    async def failing():
+        raise RuntimeError("storage unreachable")
+
+    monitor = HealthMonitor(checks={"cloudinary": failing}, check_intervals={"cloudinary": 300})
+    await monitor.refresh()
+    snapshot = await monitor.refresh()
+
+    assert snapshot["status"] == "degraded"
+    assert snapshot["services"]["cloudinary"]["error"] == "storage unreachable"
@@ -0,0 +1,111 @@
+"""Idempotency-Key handling: in-progress keys, replays and what gets cached"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.responses import Response
+
+from benchmarks.fakes import make_jpeg
+from app.utils.idempotency import REPLAYED_HEADER, MemoryIdempotencyStore, run_idempotent
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_key_in_progress_is_rejected_then_replayed():
+    store = MemoryIdempotencyStore()
+    release = asyncio.Event()
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        await release.wait()
+        return Response(b'{"ok": true}', status_code=200)
+
+    first = asyncio.create_task(run_idempotent(store, "key", handler))
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException) as error:
+        await run_idempotent(store, "key", handler)
+    assert error.value.status_code == 409
+
+    release.set()
+    assert (await first).status_code == 200
+    replay = await run_idempotent(store, "key", handler)
+    assert replay.headers[REPLAYED_HEADER] == "true"
+    assert replay.body == b'{"ok": true}'
+    assert len(calls) == 1
+
+
+async def test_failed_handler_releases_key():
+    store = MemoryIdempotencyStore()
+
+    async def failing():
+        raise HTTPException(status_code=500, detail="storage down")
+
+    with pytest.raises(HTTPException):
+        await run_idempotent(store, "key", failing)
+    assert await store.begin("key") is None
+
+
+async def test_retried_upload_is_replayed(client, session_id, storage, database):
+    headers = {"Idempotency-Key": "upload-1"}
+    files = {"file": ("photo.jpg", make_jpeg(400, 300), "image/jpeg")}
+
+    first = await client.post(f"/sessions/{session_id}/photos", files=files, headers=headers)
+    retry = await client.post(f"/sessions/{session_id}/photos", files=files, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert REPLAYED_HEADER not in first.headers
+    assert retry.headers[REPLAYED_HEADER] == "true"
+    assert retry.content == first.content
+    assert storage.stats["uploads"] == 1
+    assert len(database.photos.documents) == 1
+
+
+async def test_client_errors_are_not_cached(client, session_id, storage):
+    headers = {"Idempotency-Key": "upload-2"}
+
+    rejected = await client.post(
+        f"/sessions/{session_id}/photos",
+        files={"file": ("photo.exe", make_jpeg(400, 300), "image/jpeg")},
+        headers=headers
+    )
+    assert rejected.status_code == 400
+
+    retry = await client.post(
+        f"/sessions/{session_id}/photos",
+        files={"file": ("photo.jpg", make_jpeg(400, 300), "image/jpeg")},
+        headers=headers
+    )
+    assert retry.status_code == 200
+    assert REPLAYED_HEADER not in retry.headers
+    assert storage.stats["uploads"] == 1
+
+
+async def test_partially_failed_batch_is_not_cached(client, session_id, storage, monkeypatch):
+    import cloudinary.uploader
+
+    upload = cloudinary.uploader.upload
+    storage_down = {"flaky.jpg": True}
+
+    def flaky_upload(contents, **options):
+        if storage_down["flaky.jpg"] and options["public_id"].endswith("_flaky"):
+            raise RuntimeError("storage unavailable")
+        return upload(contents, **options)
+
+    monkeypatch.setattr(cloudinary.uploader, "upload", flaky_upload)
+    files = [
+        ("files", ("good.jpg", make_jpeg(400, 300), "image/jpeg")),
+        ("files", ("flaky.jpg", make_jpeg(300, 200), "image/jpeg")),
+    ]
+    headers = {"Idempotency-Key": "batch-1"}
+    url = f"/sessions/{session_id}/photos/batch"
+
+    partial = await client.post(url, files=files, headers=headers)
+    assert partial.status_code == 207
+    assert [failure["filename"] for failure in partial.json()["failed"]] == ["flaky.jpg"]
+
+    storage_down["flaky.jpg"] = False
+    retry = await client.post(url, files=files, headers=headers)
+    assert retry.status_code == 200
+    assert REPLAYED_HEADER not in retry.headers
+    assert retry.json()["failed"] == []
@@ -0,0 +1,42 @@
+"""Rate limit policy lookup and per-rule budgets"""
+import pytest
+
+from app.middleware.rate_limit_policy import DEFAULT_POLICY, DEFAULT_RULE, CompiledRateLimitPolicy
+from app.middleware.rate_limit_store import MemoryRateLimitStore
+from app.middleware.rate_limiter import RateLimiter
+
+pytestmark = pytest.mark.anyio
+
+ROUTES = [
+    ("/sessions/{session_id}/photos", ["GET", "POST"]),
+    ("/sessions/{session_id}/uploads", ["POST"]),
+    ("/sessions/{session_id}", ["GET"]),
+]
+
+
+def test_lookup_resolves_template_limits_and_rule():
+    policy = CompiledRateLimitPolicy(DEFAULT_POLICY, ROUTES)
+
+    assert policy.lookup("POST", "/sessions/abc/photos") == (
+        "/sessions/{session_id}/photos", (10, 600), "POST /sessions/{session_id}/photos"
+    )
+    assert policy.lookup("POST", "/sessions/abc/photos", is_authenticated=True)[1] == (20, 600)
+    # Repeated paths come from the path memo and resolve the same way
+    assert policy.lookup("POST", "/sessions/abc/photos")[2] == "POST /sessions/{session_id}/photos"
+    assert policy.lookup("GET", "/sessions/abc/photos") == ("/sessions/{session_id}/photos", (100, 3600), DEFAULT_RULE)
+    assert policy.lookup("GET", "/health") == ("/health", None, None)
+
+
+async def test_rules_with_the_same_window_have_separate_budgets():
+    policy = CompiledRateLimitPolicy(DEFAULT_POLICY, ROUTES)
+    limiter = RateLimiter(MemoryRateLimitStore())
+
+    async def hit(path):
+        _, (max_requests, window_seconds), rule = policy.lookup("POST", path)
+        allowed, _ = await limiter.is_allowed(None, max_requests, window_seconds, "guest", rule)
+        return allowed
+
+    assert all([await hit("/sessions/abc/photos") for _ in range(10)])
+    assert not await hit("/sessions/abc/photos")
+    # Same 10 per 600 s limit, but its own counter
+    assert await hit("/sessions/abc/uploads")
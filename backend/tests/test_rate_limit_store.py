@@ -0,0 +1,73 @@
+"""In-process GCRA rate limit store: limits, blocking, sweeping and the key cap"""
+import pytest
+
+from app.middleware.rate_limit_store import MemoryRateLimitStore
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_burst_up_to_the_limit_then_blocked():
+    store = MemoryRateLimitStore()
+
+    results = [await store.hit("client", 5, 10, now=100.0) for _ in range(5)]
+    assert [remaining for _, remaining, _ in results] == [4, 3, 2, 1, 0]
+    assert all(allowed for allowed, _, _ in results)
+
+    assert await store.hit("client", 5, 10, now=100.0) == (False, 0, 10)
+    # Blocked for the full window, even though budget drips back meanwhile
+    assert await store.hit("client", 5, 10, now=105.0) == (False, 0, 5)
+    allowed, _, _ = await store.hit("client", 5, 10, now=110.0)
+    assert allowed
+
+
+async def test_budget_refills_one_request_per_emission_interval():
+    store = MemoryRateLimitStore()
+    for _ in range(5):
+        await store.hit("client", 5, 10, now=100.0)
+
+    # 10 s / 5 requests: one request's budget returns every 2 s
+    allowed, remaining, _ = await store.hit("client", 5, 10, now=102.0)
+    assert allowed and remaining == 0
+
+
+async def test_keys_are_limited_separately_per_window():
+    store = MemoryRateLimitStore()
+    for _ in range(2):
+        await store.hit("client", 2, 10, now=100.0)
+
+    allowed, _, _ = await store.hit("client", 2, 60, now=100.0)
+    assert allowed
+    allowed, _, _ = await store.hit("other", 2, 10, now=100.0)
+    assert allowed
+
+
+async def test_sweep_drops_only_drained_keys():
+    store = MemoryRateLimitStore()
+    await store.hit("idle", 5, 10, now=100.0)
+    for _ in range(3):
+        await store.hit("blocked", 2, 60, now=100.0)
+
+    assert store.sweep(now=120.0) == 1
+    assert list(store.state) == ["blocked:60"]
+    assert store.sweep(now=200.0) == 1
+    assert store.state == {}
+
+
+async def test_new_keys_never_exceed_the_cap():
+    store = MemoryRateLimitStore(max_keys=10)
+    for index in range(50):
+        await store.hit(f"client-{index}", 5, 10, now=100.0 + index * 0.001)
+        assert len(store.state) <= 10
+
+
+async def test_cap_evicts_unblocked_keys_before_blocked_ones():
+    store = MemoryRateLimitStore(max_keys=10)
+    for index in range(3):
+        for _ in range(2):
+            await store.hit(f"abuser-{index}", 1, 60, now=100.0)
+    for index in range(20):
+        await store.hit(f"guest-{index}", 5, 10, now=100.0)
+
+    assert len(store.state) <= 10
+    for index in range(3):
+        assert await store.hit(f"abuser-{index}", 1, 60, now=101.0) == (False, 0, 59)
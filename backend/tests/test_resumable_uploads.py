@@ -0,0 +1,194 @@
+"""Resumable (tus) uploads: offsets, locking, length limits and completion"""
+import base64
+import os
+
+import httpx
+import pytest
+
+from benchmarks.fakes import make_jpeg
+from app.main import MAX_UPLOAD_FILE_SIZE
+from app.utils.resumable import WRITE_BUFFER_SIZE, resumable_upload_store
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+pytestmark = pytest.mark.anyio
+
+TUS_HEADERS = {"Tus-Resumable": "1.0.0"}
+PATCH_HEADERS = {**TUS_HEADERS, "Content-Type": "application/offset+octet-stream"}
+
+
+def metadata(filename: str, filetype: str) -> str:
+    return ",".join(
+        f"{key} {base64.b64encode(value.encode()).decode()}"
+        for key, value in (("filename", filename), ("filetype", filetype))
+    )
+
+
+async def create_upload(client, session_id: str, length: int) -> str:
+    response = await client.post(f"/sessions/{session_id}/uploads", headers={
+        "Upload-Length": str(length),
+        "Upload-Metadata": metadata("photo.jpg", "image/jpeg"),
+        "Tus-Resumable": "1.0.0",
+    })
+    assert response.status_code == 201
+    assert response.headers["upload-offset"] == "0"
+    return response.headers["location"]
+
+
+async def patch(client, location: str, offset: int, content) -> httpx.Response:
+    return await client.patch(location, content=content, headers={**PATCH_HEADERS, "Upload-Offset": str(offset)})
+
+
+async def current_offset(client, location: str) -> int:
+    response = await client.head(location, headers=TUS_HEADERS)
+    assert response.status_code == 200
+    return int(response.headers["upload-offset"])
+
+
+async def test_chunks_complete_into_a_stored_photo(client, session_id, storage, database):
+    photo = make_jpeg(400, 300)
+    location = await create_upload(client, session_id, len(photo))
+    upload_id = location.rsplit("/", 1)[-1]
+
+    response = await patch(client, location, 0, photo[:1000])
+    assert response.status_code == 204
+    assert response.headers["upload-offset"] == "1000"
+    assert await current_offset(client, location) == 1000
+
+    response = await patch(client, location, 1000, photo[1000:])
+    assert response.status_code == 200
+    assert response.json()["filename"].startswith(f"qr_sessions/{session_id}/")
+    assert storage.stats["uploads"] == 1
+    assert len(database.photos.documents) == 1
+    # The spooled bytes are gone and the upload can no longer be resumed
+    assert not os.path.exists(resumable_upload_store.part_path(upload_id))
+    assert (await client.head(location, headers=TUS_HEADERS)).status_code == 404
+
+
+async def test_options_advertises_protocol_and_extensions(client, session_id):
+    response = await client.options(f"/sessions/{session_id}/uploads")
+    assert response.status_code == 204
+    assert response.headers["tus-version"] == "1.0.0"
+    assert set(response.headers["tus-extension"].split(",")) == {"creation", "termination", "expiration"}
+    assert int(response.headers["tus-max-size"]) == MAX_UPLOAD_FILE_SIZE
+
+
+async def test_unsupported_protocol_version_is_rejected(client, session_id):
+    response = await client.post(f"/sessions/{session_id}/uploads", headers={
+        "Upload-Length": "100", "Tus-Resumable": "0.2.2"
+    })
+    assert response.status_code == 412
+    assert response.headers["tus-version"] == "1.0.0"
+
+    location = await create_upload(client, session_id, 100)
+    response = await client.patch(location, content=b"x" * 10, headers={
+        "Content-Type": "application/offset+octet-stream", "Upload-Offset": "0"
+    })
+    assert response.status_code == 412
+
+
+async def test_cancelled_upload_is_discarded(client, session_id):
+    location = await create_upload(client, session_id, 100)
+    upload_id = location.rsplit("/", 1)[-1]
+    assert (await patch(client, location, 0, b"x" * 10)).status_code == 204
+
+    response = await client.delete(location, headers=TUS_HEADERS)
+    assert response.status_code == 204
+    assert not os.path.exists(resumable_upload_store.part_path(upload_id))
+    assert (await client.head(location, headers=TUS_HEADERS)).status_code == 404
+
+
+async def test_offset_mismatch_is_rejected(client, session_id):
+    location = await create_upload(client, session_id, 100)
+    assert (await patch(client, location, 0, b"x" * 10)).status_code == 204
+
+    response = await patch(client, location, 5, b"y" * 10)
+    assert response.status_code == 409
+    assert await current_offset(client, location) == 10
+
+
+async def test_bytes_past_upload_length_are_rejected(client, session_id):
+    location = await create_upload(client, session_id, 100)
+    assert (await patch(client, location, 0, b"x" * 60)).status_code == 204
+
+    response = await patch(client, location, 60, b"y" * 50)
+    assert response.status_code == 413
+    # The overflowing request stores nothing
+    assert await current_offset(client, location) == 60
+
+
+async def test_overflow_discards_already_flushed_bytes(client, session_id):
+    length = WRITE_BUFFER_SIZE * 2
+    location = await create_upload(client, session_id, length)
+
+    async def oversized_body():
+        # More than one write buffer lands on disk before the overflow shows
+        for _ in range(3):
+            yield b"x" * WRITE_BUFFER_SIZE
+
+    response = await patch(client, location, 0, oversized_body())
+    assert response.status_code == 413
+    assert await current_offset(client, location) == 0
+
+
+@pytest.mark.skipif(fcntl is None, reason="uploads are only locked where fcntl is available")
+async def test_concurrent_write_is_locked(client, session_id):
+    location = await create_upload(client, session_id, 100)
+    upload_id = location.rsplit("/", 1)[-1]
+
+    # Stand in for another request still writing to the upload
+    with open(resumable_upload_store.part_path(upload_id), "r+b") as part:
+        fcntl.flock(part.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        response = await patch(client, location, 0, b"x" * 10)
+    assert response.status_code == 423
+
+    assert (await patch(client, location, 0, b"x" * 10)).status_code == 204
+
+
+async def patch_then_disconnect(app, location: str, offset: int, chunk: bytes) -> list:
+    """PATCH one chunk and drop the connection; returns the messages the app sent"""
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": True},
+        {"type": "http.disconnect"},
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    headers = {**PATCH_HEADERS, "Upload-Offset": str(offset), "Host": "test"}
+    await app({
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "PATCH",
+        "scheme": "http",
+        "path": location,
+        "raw_path": location.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80),
+    }, receive, send)
+    return sent
+
+
+async def test_disconnect_keeps_received_bytes_for_resume(app, client, session_id, storage):
+    photo = make_jpeg(400, 300)
+    location = await create_upload(client, session_id, len(photo))
+
+    sent = await patch_then_disconnect(app, location, 0, photo[:5000])
+    assert sent[0]["status"] == 204
+
+    offset = await current_offset(client, location)
+    assert offset == 5000
+    response = await patch(client, location, offset, photo[offset:])
+    assert response.status_code == 200
+    assert storage.stats["uploads"] == 1
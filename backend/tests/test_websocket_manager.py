@@ -0,0 +1,75 @@
+"""WebSocket send queues: a connection that cannot be written to is closed"""
+import asyncio
+import json
+
+import pytest
+
+from app import websocket_manager as websocket_module
+from app.websocket_manager import WebSocketManager
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeWebSocket:
+    def __init__(self, send_delay: float = 0.0, send_error: Exception = None):
+        self.send_delay = send_delay
+        self.send_error = send_error
+        self.sent = []
+        self.close_codes = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.send_delay)
+        if self.send_error is not None:
+            raise self.send_error
+        self.sent.append(text)
+
+    async def close(self, code: int = 1000, reason: str = None):
+        self.close_codes.append(code)
+
+
+async def drain(manager: WebSocketManager, websocket: FakeWebSocket):
+    writer = manager.connection_writers.get(websocket)
+    if writer is not None:
+        await asyncio.wait_for(asyncio.shield(writer), timeout=1)
+
+
+async def test_messages_are_written_in_order():
+    manager = WebSocketManager()
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, "session", "owner")
+
+    for index in range(3):
+        manager.enqueue({"type": "echo", "index": index}, websocket)
+    await asyncio.sleep(0.01)
+
+    assert [json.loads(message)["index"] for message in websocket.sent] == [0, 1, 2]
+    manager.disconnect(websocket)
+
+
+async def test_failed_write_closes_the_socket():
+    manager = WebSocketManager()
+    websocket = FakeWebSocket(send_error=RuntimeError("connection reset"))
+    await manager.connect(websocket, "session", "owner")
+
+    manager.enqueue({"type": "pong"}, websocket)
+    await drain(manager, websocket)
+
+    assert websocket.close_codes == [1011]
+    assert not manager.is_connected(websocket)
+    assert manager.get_session_connection_count("session") == 0
+
+
+async def test_stalled_write_closes_the_socket(monkeypatch):
+    monkeypatch.setattr(websocket_module, "WS_SEND_TIMEOUT_SECONDS", 0.05)
+    manager = WebSocketManager()
+    websocket = FakeWebSocket(send_delay=10)
+    await manager.connect(websocket, "session", "owner")
+
+    manager.enqueue({"type": "pong"}, websocket)
+    await drain(manager, websocket)
+
+    assert websocket.close_codes == [1001]
+    assert not manager.is_connected(websocket)
@@ -100,7 +100,7 @@ const NotificationToast = ({ notification, onClose }) => {
             {notification.data?.url && (
               <div className="mt-2">
                 <img 
-                  src={notification.data.url}
+                  src={notification.data.thumbnail_url || notification.data.url}
                   alt="Uploaded"
                   className="w-16 h-16 object-cover rounded-md"
                 />
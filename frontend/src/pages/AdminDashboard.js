@@ -3,6 +3,7 @@ import { useTranslation } from 'react-i18next';
 import { getUserSessions, deleteSession, getSessionPhotos } from '../services/api';
 import { useAuth } from '../contexts/AuthContext';
 import { formatDateOnly } from '../utils/i18nHelpers';
+import { placeholderStyle } from '../utils/helpers';
 import { logger } from '../utils/logger';
 
 const AdminDashboard = () => {
@@ -280,8 +281,11 @@ const AdminDashboard = () => {
                     {sessionPhotos.map((photo, index) => (
                       <div key={photo.id} className="aspect-square group relative overflow-hidden rounded-lg">
                         <img 
-                          src={photo.url} 
+                          src={photo.thumbnail_url || photo.url} 
                           alt={`${t('dashboard:photos.photo')} ${index + 1}`}
+                          loading="lazy"
+                          decoding="async"
+                          style={placeholderStyle(photo)}
                           className="w-full h-full object-cover transition-transform duration-200 group-hover:scale-110"
                         />
                         <div className="absolute inset-0 bg-black bg-opacity-0 group-hover:bg-opacity-20 transition-all duration-200 flex items-center justify-center">
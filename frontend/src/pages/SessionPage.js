@@ -1,10 +1,11 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useParams } from 'react-router-dom';
 import { useTranslation } from 'react-i18next';
-import { getSession, getSessionPhotos, getAllSessionPhotos, uploadPhoto, getMyUploadStats, downloadSessionPhotos, deletePhoto } from '../services/api';
+import { getSession, getSessionPhotos, getAllSessionPhotos, uploadPhoto, newIdempotencyKey, getMyUploadStats, downloadSessionPhotos, deletePhoto } from '../services/api';
 import { devLog, devWarn, devError } from '../utils/logger';
 import { useAuth } from '../contexts/AuthContext';
 import { formatDateOnly } from '../utils/i18nHelpers';
+import { placeholderStyle } from '../utils/helpers';
 import PCCamera from '../components/PCCamera';
 import MobileCamera from '../components/MobileCamera';
 import NotificationToast from '../components/NotificationToast';
@@ -19,6 +20,8 @@ const SessionPage = () => {
   const [photos, setPhotos] = useState([]);
   const [cameraActive, setCameraActive] = useState(false);
   const [capturedPhoto, setCapturedPhoto] = useState(null);
+  // One idempotency key per captured photo, reused by retries
+  const uploadKeyRef = useRef({ photo: null, key: null });
   const [uploading, setUploading] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
@@ -113,7 +116,10 @@ const SessionPage = () => {
       devLog('Uploading photo for session:', sessionId);
       devLog('File details - Name:', capturedPhoto.name, 'Size:', capturedPhoto.size, 'Type:', capturedPhoto.type);
       
-      const response = await uploadPhoto(sessionId, capturedPhoto);
+      if (uploadKeyRef.current.photo !== capturedPhoto) {
+        uploadKeyRef.current = { photo: capturedPhoto, key: newIdempotencyKey() };
+      }
+      const response = await uploadPhoto(sessionId, capturedPhoto, uploadKeyRef.current.key);
       devLog('Upload response:', response);
       setCapturedPhoto(null);
       await loadSessionData(); // Refresh photos with proper owner/user logic
@@ -462,8 +468,11 @@ const SessionPage = () => {
               {photos.map((photo, index) => (
                 <div key={photo.id} className="group relative aspect-square overflow-hidden rounded-lg sm:rounded-2xl bg-gradient-to-br from-gray-100 to-gray-200 dark:from-dark-600 dark:to-dark-700 shadow-lg hover:shadow-xl dark:shadow-dark-900/50 transition-all duration-300 transform hover:scale-105">
                   <img 
-                    src={photo.url} 
+                    src={photo.thumbnail_url || photo.url} 
                     alt={`Photo ${index + 1}`}
+                    loading="lazy"
+                    decoding="async"
+                    style={placeholderStyle(photo)}
                     className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-110"
                   />
                   
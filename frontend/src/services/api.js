@@ -169,14 +169,72 @@ export const getSession = async (sessionId) => {
 
 export const getQRCode = (sessionId) => api.get(`/sessions/${sessionId}/qr`);
 
-export const uploadPhoto = (sessionId, file) => {
+// Sent as Idempotency-Key; reuse it when retrying the same photo so the
+// server answers with the first upload's result instead of storing it again
+export const newIdempotencyKey = () => (
+  window.crypto?.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+);
+
+// The server sheds uploads with 503 + Retry-After when it is saturated;
+// wait as told (plus jitter so phones don't retry in lockstep) and try again
+const UPLOAD_BUSY_RETRIES = 3;
+
+const retryWhenBusy = async (send) => {
+  for (let attempt = 0; ; attempt += 1) {
+    try {
+      return await send();
+    } catch (error) {
+      if (error.response?.status !== 503 || attempt >= UPLOAD_BUSY_RETRIES) {
+        throw error;
+      }
+      const retryAfter = parseInt(error.response.headers['retry-after'] || '2', 10);
+      const delay = (retryAfter + Math.random() * retryAfter) * 1000;
+      logger.api.warn(`Server busy, retrying upload in ${Math.round(delay / 1000)}s`);
+      await new Promise((resolve) => setTimeout(resolve, delay));
+    }
+  }
+};
+
+export const uploadPhoto = (sessionId, file, idempotencyKey) => {
   const formData = new FormData();
   formData.append('file', file);
-  return api.post(`/sessions/${sessionId}/photos`, formData, {
+  return retryWhenBusy(() => api.post(`/sessions/${sessionId}/photos`, formData, {
     headers: {
       'Content-Type': 'multipart/form-data',
+      ...(idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}),
     },
+  }));
+};
+
+// Several photos in one request (up to the server's BATCH_UPLOAD_MAX_FILES).
+// Resolves with 207 when some files failed; those are listed in data.failed
+export const uploadPhotos = (sessionId, files, idempotencyKey) => {
+  const formData = new FormData();
+  files.forEach((file) => formData.append('files', file));
+  return retryWhenBusy(() => api.post(`/sessions/${sessionId}/photos/batch`, formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data',
+      ...(idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}),
+    },
+  }));
+};
+
+// Sends the file straight to storage with a signed ticket instead of through
+// the API (only when the server sets DIRECT_UPLOADS_ENABLED), then records it.
+// Resolves like uploadPhoto.
+export const uploadPhotoDirect = async (sessionId, file) => {
+  const { data: ticket } = await api.post(`/sessions/${sessionId}/photos/direct`, {
+    filename: file.name,
+    content_type: file.type,
+    size: file.size,
   });
+  const formData = new FormData();
+  Object.entries(ticket.fields).forEach(([name, value]) => formData.append(name, value));
+  formData.append('file', file);
+  const { data: stored } = await axios.post(ticket.upload_url, formData);
+  return api.post(ticket.confirm_url, stored);
 };
 
 export const getSessionPhotos = async (sessionId) => {
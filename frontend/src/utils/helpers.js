@@ -122,4 +122,12 @@ export const handleApiError = (error) => {
     // Something else happened
     return error.message || 'An unexpected error occurred';
   }
-};
\ No newline at end of file
+};
+
+// Inline style showing a photo's embedded placeholder behind its <img>
+// until the image itself has loaded
+export const placeholderStyle = (photo) => (
+  photo.placeholder
+    ? { backgroundImage: `url(${photo.placeholder})`, backgroundSize: 'cover', backgroundPosition: 'center' }
+    : undefined
+);